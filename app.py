@@ -1,17 +1,32 @@
 # app.py
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, Response, g, request, jsonify, render_template, send_from_directory
 from flask_cors import CORS
 import pandas as pd
 import os
 from pathlib import Path
 import logging
 import sys
-import io # For creating CSV string
 import csv # For writing to CSV string
-import json # For parsing shifts/tags if needed
+import hmac
+import time
+import itertools
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 try:
     from vendor_scrape import VendorMenuFastScraper
+    from async_scrape import get_async_engine
+    from response_cache import get_response_cache
+    from singleflight import SingleFlight
+    from menu_store import get_menu_store
+    from menu_payload import (MENU_FORMAT_CSV, MENU_FORMAT_INDEX, negotiate_menu_format,
+                              TOPPINGS_INLINE, TOPPINGS_CATALOG, negotiate_toppings_mode,
+                              columnar_menu_from_scrape_result, columnar_menu_from_frame)
+    from menu_pages import get_menu_page_store, paged_menu
+    from tf_store import VendorFrameIndex, TapsifoodInfo, load_tf_table
+    from data_reload import DataReloader, DataSource
+    from vendor_search import VendorSearchIndex
+    from upstream_guard import get_upstream_guard
+    import metrics
     import config # Import the updated config
 except ImportError as e:
     print(f"Could not import from vendor_scrape.py or config.py: {e}. Ensure they are accessible.")
@@ -42,68 +57,6 @@ if not app.logger.handlers and app.debug:
 
 
 # --- Data Loading & Preparation ---
-TF_MENU_DF = None
-TF_INFO_DF = None
-tf_to_sf_map = {}
-sf_to_tf_map = {}
-
-def load_tapsifood_data():
-    global TF_MENU_DF, TF_INFO_DF
-    try:
-        if config.TF_INFO_CSV_PATH.is_file():
-            TF_INFO_DF = pd.read_csv(config.TF_INFO_CSV_PATH, dtype=str)
-            if 'vendor_code' in TF_INFO_DF.columns:
-                 TF_INFO_DF['vendor_code'] = TF_INFO_DF['vendor_code'].str.strip()
-            else:
-                app.logger.error(f"'vendor_code' column missing in {config.TF_INFO_CSV_PATH}. Tapsifood info will be incomplete.")
-                TF_INFO_DF = pd.DataFrame()
-
-            app.logger.info(f"Loaded {len(TF_INFO_DF)} records from {config.TF_INFO_CSV_PATH}")
-        else:
-            app.logger.warning(f"{config.TF_INFO_CSV_PATH} not found. Tapsifood vendor info unavailable.")
-            TF_INFO_DF = pd.DataFrame()
-
-        if config.TF_MENU_CSV_PATH.is_file():
-            TF_MENU_DF = pd.read_csv(config.TF_MENU_CSV_PATH, dtype=str)
-            if 'tf_code' in TF_MENU_DF.columns: 
-                TF_MENU_DF.rename(columns={'tf_code': 'vendor_code'}, inplace=True)
-                TF_MENU_DF['vendor_code'] = TF_MENU_DF['vendor_code'].str.strip()
-            elif 'vendor_code' in TF_MENU_DF.columns: 
-                TF_MENU_DF['vendor_code'] = TF_MENU_DF['vendor_code'].str.strip()
-            else:
-                app.logger.error(f"Required vendor code column ('tf_code' or 'vendor_code') missing in {config.TF_MENU_CSV_PATH}.")
-                TF_MENU_DF = pd.DataFrame() 
-
-            app.logger.info(f"Loaded {len(TF_MENU_DF)} records from {config.TF_MENU_CSV_PATH}")
-        else:
-            app.logger.warning(f"{config.TF_MENU_CSV_PATH} not found. Tapsifood menu data unavailable.")
-            TF_MENU_DF = pd.DataFrame()
-
-    except Exception as e:
-        app.logger.error(f"Error loading Tapsifood data: {e}", exc_info=True)
-        TF_MENU_DF = pd.DataFrame()
-        TF_INFO_DF = pd.DataFrame()
-
-def load_matched_vendors():
-    global tf_to_sf_map, sf_to_tf_map
-    try:
-        if config.MATCHED_VENDORS_CSV_PATH.is_file():
-            df = pd.read_csv(config.MATCHED_VENDORS_CSV_PATH, dtype=str)
-            df.dropna(subset=['tf_code', 'sf_code'], inplace=True)
-            df['tf_code'] = df['tf_code'].str.strip()
-            df['sf_code'] = df['sf_code'].str.strip()
-            df = df[(df['tf_code'] != '') & (df['sf_code'] != '')]
-            tf_to_sf_map = pd.Series(df.sf_code.values, index=df.tf_code).to_dict()
-            sf_to_tf_map = pd.Series(df.tf_code.values, index=df.sf_code).to_dict()
-            app.logger.info(f"Loaded {len(tf_to_sf_map)} TapsiFood->SnappFood and {len(sf_to_tf_map)} SnappFood->TapsiFood mappings from {config.MATCHED_VENDORS_CSV_PATH}")
-        else:
-            app.logger.warning(f"MATCHED_VENDORS_CSV_PATH '{config.MATCHED_VENDORS_CSV_PATH}' not found. Vendor code mapping will be limited.")
-    except Exception as e:
-        app.logger.error(f"Error loading {config.MATCHED_VENDORS_CSV_PATH}: {e}", exc_info=True)
-
-load_tapsifood_data()
-load_matched_vendors()
-
 def get_default_vendor_info(vendor_code=""):
     info = {key: "" for key in config.EXPECTED_VENDOR_INFO_KEYS}
     info.update({
@@ -124,138 +77,243 @@ def get_default_menu_item_data(vendor_code=""):
     })
     return item_data
 
-
-def prepare_tapsifood_csv_data(tf_vendor_code_input):
-    if TF_MENU_DF is None or TF_INFO_DF is None: 
+# All file-backed data lives in one immutable DataSnapshot (see data_reload.py). Requests read
+# `data_reloader.snapshot` once; reloads build a new snapshot off-thread and swap it in.
+
+def load_tapsifood_info(path):
+    """Loads tf_info.csv into a TapsifoodInfo (empty if unavailable)."""
+    if not path.is_file():
+        app.logger.warning(f"{path} not found. Tapsifood vendor info unavailable.")
+        return TapsifoodInfo(VendorFrameIndex(pd.DataFrame()), get_default_vendor_info)
+    # Served from the columnar cache next to the CSV when it is fresh (vendor_code already stripped)
+    df = load_tf_table(path, config.TF_INFO_CATEGORY_COLS)
+    if 'vendor_code' not in df.columns:
+        app.logger.error(f"'vendor_code' column missing in {path}. Tapsifood info will be incomplete.")
+        df = pd.DataFrame()
+    app.logger.info(f"Loaded {len(df)} records from {path}")
+    # Index by vendor_code once so per-request lookups don't scan the full frame
+    index = VendorFrameIndex(df)
+    tf_info = TapsifoodInfo(index, get_default_vendor_info)
+    app.logger.info(f"Indexed {len(index)} Tapsifood info vendors and precomputed {len(tf_info)} vendor_info records.")
+    if tf_info.malformed_shifts:
+        examples = "; ".join(f"{code}: {problem}" for code, problem in list(tf_info.malformed_shifts.items())[:5])
+        app.logger.warning(f"{len(tf_info.malformed_shifts)} Tapsifood vendors in {path} have malformed shifts (defaulted/partial). e.g. {examples}")
+    return tf_info
+
+def load_tapsifood_menu(path):
+    """Loads tf_menu.csv into a VendorFrameIndex (empty index if unavailable)."""
+    if not path.is_file():
+        app.logger.warning(f"{path} not found. Tapsifood menu data unavailable.")
+        return VendorFrameIndex(pd.DataFrame())
+    df = load_tf_table(path, config.TF_MENU_CATEGORY_COLS) # 'tf_code' is renamed to 'vendor_code'
+    if 'vendor_code' not in df.columns:
+        app.logger.error(f"Required vendor code column ('tf_code' or 'vendor_code') missing in {path}.")
+        df = pd.DataFrame()
+    app.logger.info(f"Loaded {len(df)} records from {path}")
+    index = VendorFrameIndex(df)
+    app.logger.info(f"Indexed {len(index)} Tapsifood menu vendors.")
+    return index
+
+def load_matched_vendors(path):
+    """Returns (tf_to_sf_map, sf_to_tf_map, VendorSearchIndex) from matched_vendors.csv."""
+    if not path.is_file():
+        app.logger.warning(f"MATCHED_VENDORS_CSV_PATH '{path}' not found. Vendor code mapping will be limited.")
+        return {}, {}, VendorSearchIndex()
+    df = pd.read_csv(path, dtype=str)
+    df.dropna(subset=['tf_code', 'sf_code'], inplace=True)
+    df['tf_code'] = df['tf_code'].str.strip()
+    df['sf_code'] = df['sf_code'].str.strip()
+    df = df[(df['tf_code'] != '') & (df['sf_code'] != '')]
+    tf_to_sf_map = pd.Series(df.sf_code.values, index=df.tf_code).to_dict()
+    sf_to_tf_map = pd.Series(df.tf_code.values, index=df.sf_code).to_dict()
+    app.logger.info(f"Loaded {len(tf_to_sf_map)} TapsiFood->SnappFood and {len(sf_to_tf_map)} SnappFood->TapsiFood mappings from {path}")
+    started = time.perf_counter()
+    search_index = VendorSearchIndex(df)
+    app.logger.info(f"Built vendor search index over {len(search_index)} matched vendors in {time.perf_counter() - started:.2f}s")
+    return tf_to_sf_map, sf_to_tf_map, search_index
+
+data_reloader = DataReloader([
+    DataSource("tf_info", config.TF_INFO_CSV_PATH, load_tapsifood_info, lambda: TapsifoodInfo(VendorFrameIndex(pd.DataFrame()), get_default_vendor_info)),
+    DataSource("tf_menu", config.TF_MENU_CSV_PATH, load_tapsifood_menu, lambda: VendorFrameIndex(pd.DataFrame())),
+    DataSource("matched_vendors", config.MATCHED_VENDORS_CSV_PATH, load_matched_vendors, lambda: ({}, {}, VendorSearchIndex())),
+], logger=app.logger)
+data_reloader.load_initial()
+data_reloader.start_watcher(config.DATA_RELOAD_INTERVAL_SEC)
+
+# TF menu column feeding each merged item column; anything not listed keeps its default
+TF_MENU_TO_MERGED_COLS = {
+    "category_id": "category_id",
+    "category_name": "category_name",
+    "item_id": "item_id",
+    "item_title": "item_title",
+    "description": "item_description",
+    "price": "price",
+}
+
+def prepare_tapsifood_menu_frame(tf_vendor_code_input, snapshot=None):
+    """Returns (merged menu DataFrame or None, vendor_info dict or None) for a TF vendor."""
+    snapshot = snapshot or data_reloader.snapshot
+    if snapshot is None:
         app.logger.error("Tapsifood DFs are not initialized. Cannot prepare data.")
         return None, None
-    if TF_INFO_DF.empty:
+    tf_info, tf_menu_index = snapshot["tf_info"], snapshot["tf_menu"]
+    if tf_info.index.df.empty:
         app.logger.warning(f"Tapsifood TF_INFO_DF is empty. Cannot prepare vendor info for {tf_vendor_code_input}.")
         return None, get_default_vendor_info(tf_vendor_code_input)
 
     tf_vendor_code = str(tf_vendor_code_input).strip()
-    vendor_info_rows = TF_INFO_DF[TF_INFO_DF['vendor_code'] == tf_vendor_code]
-    if vendor_info_rows.empty:
+    # Built (shifts already transformed) for every vendor when tf_info was loaded
+    with metrics.timed("tf_lookup", "tf"):
+        tf_vendor_info_dict = tf_info.vendor_info(tf_vendor_code)
+    if tf_vendor_info_dict is None:
         app.logger.warning(f"No Tapsifood vendor info found for {tf_vendor_code} in TF_INFO_DF.")
         return None, get_default_vendor_info(tf_vendor_code) 
-    
-    vendor_info_series = vendor_info_rows.iloc[0]
-    tf_vendor_info_dict = get_default_vendor_info(tf_vendor_code)
-    
-    # --- SHIFTS TRANSFORMATION (FIXED) ---
-    shifts_value_from_series = vendor_info_series.get('shifts')
-    if pd.isna(shifts_value_from_series):
-        tf_shifts_raw_json_str = '[]'
-        app.logger.debug(f"Shifts for {tf_vendor_code} was NaN, defaulting to '[]'.")
-    else:
-        tf_shifts_raw_json_str = str(shifts_value_from_series)
-
-    if not tf_shifts_raw_json_str.strip():
-        tf_shifts_raw_json_str = '[]'
-        app.logger.debug(f"Shifts for {tf_vendor_code} was empty string, defaulting to '[]'.")
-
-    transformed_shifts_list = []
-    DAY_NAME_TO_SF_WEEKDAY = {
-        "Saturday": 1, "Sunday": 2, "Monday": 3, "Tuesday": 4,
-        "Wednesday": 5, "Thursday": 6, "Friday": 7
-    }
-    try:
-        tf_shifts_data_from_csv = json.loads(tf_shifts_raw_json_str)
-        if isinstance(tf_shifts_data_from_csv, list):
-            for day_schedule in tf_shifts_data_from_csv:
-                day_name = day_schedule.get("DayOfWeek")
-                weekday_num = DAY_NAME_TO_SF_WEEKDAY.get(day_name)
-                
-                if weekday_num is not None and isinstance(day_schedule.get("Shifts"), list):
-                    for shift_interval in day_schedule.get("Shifts", []): 
-                        start_time = shift_interval.get("StartTime")
-                        end_time = shift_interval.get("EndTime")
-                        if start_time and end_time:
-                            transformed_shifts_list.append({
-                                "weekday": weekday_num,
-                                "allDay": False, 
-                                "startHour": start_time,
-                                "stopHour": end_time
-                            })
-        elif tf_shifts_raw_json_str != '[]': 
-            app.logger.warning(f"Tapsifood shifts data for {tf_vendor_code} was valid JSON but not a list: {tf_shifts_raw_json_str}")
-
-    except json.JSONDecodeError:
-        app.logger.error(f"Could not decode Tapsifood shifts JSON for {tf_vendor_code}: '{tf_shifts_raw_json_str}'")
-    except Exception as e:
-        app.logger.error(f"Error transforming Tapsifood shifts for {tf_vendor_code}: {e}", exc_info=True)
-    # --- END SHIFTS TRANSFORMATION ---
-
-    tf_vendor_info_dict.update({
-        "vendor_code": tf_vendor_code,
-        "snappfood_vendor_id": vendor_info_series.get('id', ''), # Using 'id' from your SQL as the unique TF ID
-        "vendor_name": vendor_info_series.get('vendor_name', ''),
-        "business_line": vendor_info_series.get('business_line', ''), 
-        "marketing_area": vendor_info_series.get('marketing_area', ''),
-        "address": vendor_info_series.get('address', ''),
-        "min_order": str(vendor_info_series.get('min_order', '0')),
-        "latitude": str(vendor_info_series.get('latitude', '')),
-        "longitude": str(vendor_info_series.get('longitude', '')),
-        "shifts": json.dumps(transformed_shifts_list) 
-    })
     app.logger.debug(f"Prepared TF vendor_info_dict (with transformed shifts): {tf_vendor_info_dict}")
 
-    if TF_MENU_DF.empty:
+    if tf_menu_index.df.empty:
         app.logger.warning(f"Tapsifood TF_MENU_DF is empty. Cannot provide menu items for {tf_vendor_code}.")
         return None, tf_vendor_info_dict 
         
-    tf_menu_items_df = TF_MENU_DF[TF_MENU_DF['vendor_code'] == tf_vendor_code].copy()
-    if tf_menu_items_df.empty:
+    with metrics.timed("tf_lookup", "tf"):
+        tf_menu_items_df = tf_menu_index.get(tf_vendor_code)
+    if tf_menu_items_df is None or tf_menu_items_df.empty:
         app.logger.info(f"No Tapsifood menu items found for {tf_vendor_code} in TF_MENU_DF.")
         return None, tf_vendor_info_dict
 
-    full_menu_data_list = []
-    for _, item_row in tf_menu_items_df.iterrows():
-        merged_item = get_default_menu_item_data(tf_vendor_code) 
-        for key in config.EXPECTED_VENDOR_INFO_KEYS: 
+    # Column-wise assembly: every merged column is either a TF menu column (mapped by
+    # TF_MENU_TO_MERGED_COLS) or a scalar broadcast from the vendor info / item defaults.
+    with metrics.timed("tf_assembly", "tf"):
+        row_defaults = get_default_menu_item_data(tf_vendor_code)
+        for key in config.EXPECTED_VENDOR_INFO_KEYS:
             if key in tf_vendor_info_dict:
-                 merged_item[key] = tf_vendor_info_dict[key]
-        merged_item.update({
-            "category_id": item_row.get('category_id', ''),
-            "category_name": item_row.get('category_name', ''),
-            "item_id": item_row.get('item_id', ''),
-            "item_title": item_row.get('item_title', ''),
-            "description": item_row.get('item_description', ''), 
-            "price": str(item_row.get('price', '0')),
-            "product_toppings": "[]" 
-        })
-        full_menu_data_list.append(merged_item)
-
-    if not full_menu_data_list: 
-        return None, tf_vendor_info_dict
+                row_defaults[key] = tf_vendor_info_dict[key]
 
-    string_io = io.StringIO()
-    writer = csv.DictWriter(string_io, fieldnames=config.EXPECTED_MERGED_ITEM_DATA_COLS, quoting=csv.QUOTE_MINIMAL, extrasaction='ignore')
-    writer.writeheader()
-    writer.writerows(full_menu_data_list)
-    csv_content = '\ufeff' + string_io.getvalue()
-    string_io.close()
+        merged_columns = {}
+        for col in config.EXPECTED_MERGED_ITEM_DATA_COLS:
+            src_col = TF_MENU_TO_MERGED_COLS.get(col)
+            if src_col in tf_menu_items_df.columns:
+                merged_columns[col] = tf_menu_items_df[src_col].to_numpy(dtype=object)
+            else:
+                merged_columns[col] = row_defaults[col]
+        merged_df = pd.DataFrame(merged_columns, index=pd.RangeIndex(len(tf_menu_items_df)))
+    metrics.MENU_ITEMS.observe(len(merged_df), platform="tf")
+    return merged_df, tf_vendor_info_dict
+
+
+def prepare_tapsifood_csv_data(tf_vendor_code_input, snapshot=None):
+    merged_df, tf_vendor_info_dict = prepare_tapsifood_menu_frame(tf_vendor_code_input, snapshot)
+    if merged_df is None:
+        return None, tf_vendor_info_dict
+    # csv.DictWriter (the previous row-wise writer) emitted missing cells as 'nan' with CRLF
+    # line endings; keep that byte-for-byte so downloaded CSVs don't change.
+    with metrics.timed("csv_render", "tf"):
+        csv_content = '\ufeff' + merged_df.to_csv(index=False, quoting=csv.QUOTE_MINIMAL, lineterminator='\r\n', na_rep='nan')
     return csv_content, tf_vendor_info_dict
 
 
-# --- Routes ---
-@app.route('/')
-def index():
-    return render_template('menu_editor.html')
+def prepare_tapsifood_menu_data(tf_vendor_code_input, menu_format=MENU_FORMAT_CSV, snapshot=None):
+    """Returns (menu in the requested format or None, vendor_info) for a TF vendor."""
+    if menu_format == MENU_FORMAT_CSV:
+        return prepare_tapsifood_csv_data(tf_vendor_code_input, snapshot)
+    merged_df, tf_vendor_info_dict = prepare_tapsifood_menu_frame(tf_vendor_code_input, snapshot)
+    if merged_df is None:
+        return None, tf_vendor_info_dict
+    with metrics.timed("columnar_render", "tf"):
+        menu = columnar_menu_from_frame(merged_df)
+        if menu_format == MENU_FORMAT_INDEX:
+            menu = paged_menu("tapsifood", str(tf_vendor_code_input).strip(), menu)
+    return menu, tf_vendor_info_dict
+
+
+# --- Request coalescing ---
+# Concurrent /scrape calls for the same resolved code share one upstream fetch / TF preparation
+scrape_flights = SingleFlight()
+# Runs the (local) TapsiFood branch of /scrape while the request thread waits on SnappFood
+platform_executor = ThreadPoolExecutor(max_workers=config.MAX_WORKERS, thread_name_prefix="scrape-platform")
+# Runs whole identifiers for /scrape/batch; separate from platform_executor, whose tasks these wait on
+batch_executor = ThreadPoolExecutor(max_workers=max(1, config.BATCH_CONCURRENCY), thread_name_prefix="scrape-batch")
+
+def scrape_snappfood(sf_code, prefetched=None):
+    """Runs the Snappfood scraper once. Returns (ScrapeResult, None) or (None, error_message).
+
+    With the async engine (SF_ASYNC_ENGINE) the fetch runs on its event loop; `prefetched`
+    is an engine future already started for this code (see stream_batch_results).
+    """
+    engine = get_async_engine()
+    if prefetched is None and engine is not None:
+        prefetched = engine.scrape_future(sf_code)
+    if prefetched is not None:
+        sf_result, error_msg, _ = prefetched.result()
+    else:
+        scraper_instance = VendorMenuFastScraper(vendor_code=sf_code)
+        sf_result = scraper_instance.scrape()
+        error_msg = scraper_instance.last_error_message or f"Snappfood scraping failed for {sf_code}"
+    if sf_result is not None:
+        record_menu_snapshot(sf_result)
+        return sf_result, None
+    return None, error_msg
+
+def record_menu_snapshot(sf_result):
+    """Adds the scrape to the menu snapshot history (a no-op write when nothing changed).
+
+    Only with MENU_SNAPSHOTS_ON_REQUEST; bulk crawls and vendor_scrape runs record snapshots on their own.
+    """
+    store = get_menu_store() if config.MENU_SNAPSHOTS_ON_REQUEST else None
+    if store is None:
+        return
+    try:
+        snapshot = store.record(sf_result)
+        if snapshot["created"]:
+            app.logger.info(f"Menu snapshot #{snapshot['snapshot_id']} for {sf_result.vendor_code}: {snapshot['added']} added, "
+                            f"{snapshot['removed']} removed, {snapshot['price_changed']} price changes, {snapshot['modified']} modified.")
+    except Exception as e:
+        app.logger.error(f"Could not record menu snapshot for {sf_result.vendor_code}: {e}", exc_info=True)
+
+def coalesced_scrape_snappfood(sf_code, prefetched=None):
+    (sf_result, error_msg), shared = scrape_flights.do(("sf", sf_code), scrape_snappfood, sf_code, prefetched)
+    if shared:
+        app.logger.info(f"Reused in-flight SnappFood fetch for {sf_code}.")
+    return sf_result, error_msg
+
+def vendor_info_from_scrape_result(sf_code, sf_result):
+    """Maps the scraper's vendor_info onto the string-valued EXPECTED_VENDOR_INFO_KEYS dict."""
+    sf_vendor_info = get_default_vendor_info(sf_code)
+    for key in config.EXPECTED_VENDOR_INFO_KEYS:
+        value = sf_result.vendor_info.get(key)
+        if value is not None:
+            sf_vendor_info[key] = str(value)
+    return sf_vendor_info
+
+def set_platform_menu(platform_data, menu, menu_format):
+    """Stores a platform's menu under 'csv_data' (CSV format) or 'menu' (columnar/index format)."""
+    if menu_format != MENU_FORMAT_CSV:
+        platform_data["menu"] = menu
+    else:
+        platform_data["csv_data"] = menu
 
-@app.route('/static/<path:subfolder>/<path:filename>')
-def serve_static_in_subfolder(subfolder, filename):
-    return send_from_directory(os.path.join(app.static_folder, subfolder), filename)
+def menu_filename(prefix, vendor_code):
+    return f"{prefix}_{''.join(filter(str.isalnum, vendor_code))}_{time.strftime('%Y%m%d_%H%M%S')}.csv"
 
-@app.route('/scrape', methods=['POST'])
-def scrape_route():
-    data = request.get_json()
-    identifier = data.get('identifier', '').strip()
+def coalesced_prepare_tapsifood(tf_code, menu_format=MENU_FORMAT_CSV, snapshot=None):
+    snapshot = snapshot or data_reloader.snapshot
+    # The snapshot generation is part of the key so requests after a reload never join a stale run
+    key = ("tf", snapshot.generation, menu_format, str(tf_code).strip())
+    result, shared = scrape_flights.do(key, prepare_tapsifood_menu_data, tf_code, menu_format, snapshot)
+    if shared:
+        app.logger.info(f"Reused in-flight TapsiFood preparation for {tf_code}.")
+    return result
 
-    if not identifier:
-        return jsonify({"success": False, "error": "No identifier provided."}), 400
 
-    app.logger.info(f"Received /scrape request for identifier: {identifier}")
+def scrape_identifier(identifier, menu_format=MENU_FORMAT_CSV, snapshot=None, sf_prefetched=None,
+                      toppings_mode=TOPPINGS_INLINE):
+    """Resolves an SF or TF identifier through the matched-vendor maps and loads both platforms' menus.
+
+    Returns the /scrape response document for that identifier. sf_prefetched maps SF codes
+    to async engine scrapes already in flight. With toppings_mode TOPPINGS_CATALOG, SF rows
+    carry topping group IDs and the groups themselves come once in "topping_groups".
+    """
+    snapshot = snapshot or data_reloader.snapshot
+    tf_to_sf_map, sf_to_tf_map, _ = snapshot["matched_vendors"]
 
     sf_code_to_scrape = None
     tf_code_to_scrape = None
@@ -283,30 +341,41 @@ def scrape_route():
 
     response_data = {
         "success": True, 
-        "snappfood": {"data_loaded": False, "csv_data": None, "vendor_info": get_default_vendor_info(sf_code_to_scrape or identifier), "filename": None, "original_identifier": sf_code_to_scrape or identifier, "error": None},
-        "tapsifood": {"data_loaded": False, "csv_data": None, "vendor_info": get_default_vendor_info(tf_code_to_scrape or identifier), "filename": None, "original_identifier": tf_code_to_scrape or identifier, "error": None},
+        "snappfood": {"data_loaded": False, "csv_data": None, "menu": None, "vendor_info": get_default_vendor_info(sf_code_to_scrape or identifier), "filename": None, "original_identifier": sf_code_to_scrape or identifier, "error": None},
+        "tapsifood": {"data_loaded": False, "csv_data": None, "menu": None, "vendor_info": get_default_vendor_info(tf_code_to_scrape or identifier), "filename": None, "original_identifier": tf_code_to_scrape or identifier, "error": None},
         "query_identifier": identifier,
-        "query_platform_guess": query_platform_guess
+        "query_platform_guess": query_platform_guess,
+        "format": menu_format,
+        "toppings": toppings_mode
     }
 
+    # The platforms are independent: start TapsiFood preparation now so end-to-end latency
+    # is max(SF, TF) rather than their sum. Its result is merged below in the usual order.
+    tf_future = None
+    if tf_code_to_scrape:
+        tf_future = platform_executor.submit(coalesced_prepare_tapsifood, tf_code_to_scrape, menu_format, snapshot)
+
     if sf_code_to_scrape:
         app.logger.info(f"Processing SnappFood for code: {sf_code_to_scrape}")
         try:
-            scraper_instance = VendorMenuFastScraper(vendor_code=sf_code_to_scrape)
-            sf_csv_content = scraper_instance.run(return_content_as_string=True)
-            if isinstance(sf_csv_content, str):
+            sf_result, sf_error_msg = coalesced_scrape_snappfood(sf_code_to_scrape, (sf_prefetched or {}).get(sf_code_to_scrape))
+            if sf_result is not None:
                 response_data["snappfood"]["data_loaded"] = True
-                response_data["snappfood"]["csv_data"] = sf_csv_content
-                response_data["snappfood"]["filename"] = f"sf_menu_{''.join(filter(str.isalnum, sf_code_to_scrape))}_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.csv"
-                temp_df = pd.read_csv(io.StringIO(sf_csv_content))
-                if not temp_df.empty:
-                    first_row_dict = temp_df.iloc[0].astype(str).to_dict()
-                    sf_vendor_info_from_csv = get_default_vendor_info(sf_code_to_scrape)
-                    sf_vendor_info_from_csv.update({k: first_row_dict.get(k, sf_vendor_info_from_csv.get(k, '')) for k in config.EXPECTED_VENDOR_INFO_KEYS if k in first_row_dict})
-                    response_data["snappfood"]["vendor_info"] = sf_vendor_info_from_csv
+                if menu_format != MENU_FORMAT_CSV:
+                    with metrics.timed("columnar_render", "sf"):
+                        sf_menu = columnar_menu_from_scrape_result(sf_result, toppings_mode)
+                        if menu_format == MENU_FORMAT_INDEX:
+                            sf_menu = paged_menu("snappfood", sf_code_to_scrape, sf_menu, toppings_mode)
+                else:
+                    sf_menu = sf_result.to_csv_string(toppings_mode) # Timed as csv_render when first rendered
+                    if toppings_mode == TOPPINGS_CATALOG:
+                        response_data["snappfood"]["topping_groups"] = sf_result.topping_catalog()
+                set_platform_menu(response_data["snappfood"], sf_menu, menu_format)
+                response_data["snappfood"]["filename"] = menu_filename("sf_menu", sf_code_to_scrape)
+                response_data["snappfood"]["vendor_info"] = vendor_info_from_scrape_result(sf_code_to_scrape, sf_result)
                 app.logger.info(f"SnappFood data processed successfully for {sf_code_to_scrape}.")
             else: 
-                error_msg = scraper_instance.last_error_message or f"Snappfood scraping failed for {sf_code_to_scrape}"
+                error_msg = sf_error_msg
                 response_data["snappfood"]["error"] = error_msg
                 app.logger.error(f"SnappFood processing failed for {sf_code_to_scrape}: {error_msg}")
         except Exception as e:
@@ -318,13 +387,13 @@ def scrape_route():
     if tf_code_to_scrape:
         app.logger.info(f"Processing TapsiFood for code: {tf_code_to_scrape}")
         try:
-            tf_csv_data, tf_vendor_info_from_prep = prepare_tapsifood_csv_data(tf_code_to_scrape)
+            tf_csv_data, tf_vendor_info_from_prep = tf_future.result()
             if tf_vendor_info_from_prep: 
                 response_data["tapsifood"]["vendor_info"] = tf_vendor_info_from_prep # Always update vendor_info if processed
                 if tf_csv_data: 
                     response_data["tapsifood"]["data_loaded"] = True
-                    response_data["tapsifood"]["csv_data"] = tf_csv_data
-                    response_data["tapsifood"]["filename"] = f"tf_menu_{''.join(filter(str.isalnum, tf_code_to_scrape))}_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.csv"
+                    set_platform_menu(response_data["tapsifood"], tf_csv_data, menu_format)
+                    response_data["tapsifood"]["filename"] = menu_filename("tf_menu", tf_code_to_scrape)
                     app.logger.info(f"TapsiFood data and menu processed successfully for {tf_code_to_scrape}.")
                 else: # Vendor info exists, but no menu items
                     response_data["tapsifood"]["data_loaded"] = True 
@@ -347,13 +416,13 @@ def scrape_route():
             tf_code_to_try_again = identifier
             response_data["tapsifood"]["original_identifier"] = tf_code_to_try_again
             try:
-                tf_csv_data_retry, tf_vendor_info_retry = prepare_tapsifood_csv_data(tf_code_to_try_again)
+                tf_csv_data_retry, tf_vendor_info_retry = coalesced_prepare_tapsifood(tf_code_to_try_again, menu_format, snapshot)
                 if tf_vendor_info_retry:
                     response_data["tapsifood"]["vendor_info"] = tf_vendor_info_retry
                     if tf_csv_data_retry:
                         response_data["tapsifood"]["data_loaded"] = True
-                        response_data["tapsifood"]["csv_data"] = tf_csv_data_retry
-                        response_data["tapsifood"]["filename"] = f"tf_menu_{''.join(filter(str.isalnum, tf_code_to_try_again))}_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.csv"
+                        set_platform_menu(response_data["tapsifood"], tf_csv_data_retry, menu_format)
+                        response_data["tapsifood"]["filename"] = menu_filename("tf_menu", tf_code_to_try_again)
                         app.logger.info(f"TapsiFood data (retry) processed successfully for {tf_code_to_try_again}.")
                         response_data["query_platform_guess"] = "tapsifood_after_sf_fail"
                     else:
@@ -376,7 +445,208 @@ def scrape_route():
         if (sf_attempted and sf_had_error) or (tf_attempted and tf_had_error):
             response_data["success"] = False
 
-    return jsonify(response_data), 200
+    return response_data
+
+
+def stream_batch_results(identifiers, menu_format, snapshot, concurrency, toppings_mode=TOPPINGS_INLINE):
+    """Yields one NDJSON line per identifier as soon as it completes, then a summary line.
+
+    At most `concurrency` identifiers are in flight, so memory stays bounded by the
+    window rather than the batch size. Pending work is cancelled if the client goes away.
+    With the async engine, SnappFood fetches also start ASYNC_BATCH_LOOKAHEAD identifiers
+    ahead of the window, so they overlap on the event loop instead of waiting for a thread.
+    """
+    started = time.perf_counter()
+    summary = {"total": len(identifiers), "ok": 0, "failed": 0}
+    pending = iter(enumerate(identifiers))
+    in_flight = {}
+    engine = get_async_engine()
+    tf_to_sf_map = snapshot["matched_vendors"][0]
+    sf_code_of = lambda identifier: tf_to_sf_map.get(identifier, identifier) # scrape_identifier's SF resolution
+    prefetch_codes = iter(dict.fromkeys(map(sf_code_of, identifiers)) if engine is not None else ())
+    sf_prefetched = {}
+
+    def prefetch(count):
+        # Engine scrapes are shared with other callers of the same vendor, so they are never cancelled here
+        for sf_code in itertools.islice(prefetch_codes, count):
+            sf_prefetched[sf_code] = engine.scrape_future(sf_code)
+
+    def submit_next():
+        for index, identifier in pending:
+            future = batch_executor.submit(scrape_identifier, identifier, menu_format, snapshot, sf_prefetched, toppings_mode)
+            in_flight[future] = (index, identifier)
+            return
+
+    try:
+        prefetch(concurrency + config.ASYNC_BATCH_LOOKAHEAD)
+        for _ in range(concurrency):
+            submit_next()
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                index, identifier = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    app.logger.error(f"Exception during batch processing of {identifier}: {e}", exc_info=True)
+                    result = {"success": False, "error": f"Server error processing {identifier}: {str(e)}"}
+                summary["ok" if result.get("success") else "failed"] += 1
+                sf_prefetched.pop(sf_code_of(identifier), None)
+                prefetch(1)
+                submit_next()
+                yield app.json.dumps({"index": index, "identifier": identifier, **result}) + "\n"
+        summary["elapsed_sec"] = round(time.perf_counter() - started, 3)
+        app.logger.info(f"Batch of {summary['total']} identifiers finished: {summary['ok']} ok, {summary['failed']} failed in {summary['elapsed_sec']}s.")
+        yield app.json.dumps({"summary": summary}) + "\n"
+    finally:
+        for future in in_flight:
+            future.cancel() # Client disconnected: don't start work nobody will read
+
+
+# --- Request metrics ---
+@app.before_request
+def start_request_timer():
+    if metrics.enabled():
+        g.metrics_started = time.perf_counter()
+
+@app.after_request
+def observe_request_time(response):
+    started = g.get("metrics_started")
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched" # Templated, so label values stay bounded
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, route=route, method=request.method,
+                                        status=str(response.status_code))
+    return response
+
+
+# --- Routes ---
+@app.route('/')
+def index():
+    return render_template('menu_editor.html')
+
+@app.route('/static/<path:subfolder>/<path:filename>')
+def serve_static_in_subfolder(subfolder, filename):
+    return send_from_directory(os.path.join(app.static_folder, subfolder), filename)
+
+@app.route('/scrape', methods=['POST'])
+def scrape_route():
+    data = request.get_json()
+    identifier = data.get('identifier', '').strip()
+    menu_format = negotiate_menu_format(request, data)
+    toppings_mode = negotiate_toppings_mode(request, data)
+    snapshot = data_reloader.snapshot # One consistent view of the loaded data for this request
+
+    if not identifier:
+        return jsonify({"success": False, "error": "No identifier provided."}), 400
+
+    app.logger.info(f"Received /scrape request for identifier: {identifier}")
+    return jsonify(scrape_identifier(identifier, menu_format, snapshot, toppings_mode=toppings_mode)), 200
+
+@app.route('/menu/<menu_id>/categories/<int:position>', methods=['GET'])
+def menu_category_route(menu_id, position):
+    """One category's items from a menu /scrape sent as a category index (format=index)."""
+    page = get_menu_page_store().page(menu_id, position)
+    if page is None:
+        return jsonify({"success": False, "error": "Unknown or expired menu; scrape the vendor again."}), 404
+    return jsonify({"success": True, "menu_id": menu_id, "position": position, **page}), 200
+
+@app.route('/scrape/batch', methods=['POST'])
+def scrape_batch_route():
+    """Scrapes many SF/TF identifiers, streaming each /scrape-style result as an NDJSON line."""
+    data = request.get_json(silent=True) or {}
+    raw_identifiers = data.get('identifiers')
+    if not isinstance(raw_identifiers, list):
+        return jsonify({"success": False, "error": "'identifiers' must be a list."}), 400
+    # Duplicates would only repeat the same work; keep the first occurrence's position
+    identifiers = list(dict.fromkeys(str(i).strip() for i in raw_identifiers if str(i).strip()))
+    if not identifiers:
+        return jsonify({"success": False, "error": "No identifiers provided."}), 400
+    if len(identifiers) > config.BATCH_MAX_IDENTIFIERS:
+        return jsonify({"success": False, "error": f"Too many identifiers ({len(identifiers)}); the limit is {config.BATCH_MAX_IDENTIFIERS}."}), 400
+    try:
+        concurrency = int(data.get('concurrency') or config.BATCH_CONCURRENCY)
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "'concurrency' must be an integer."}), 400
+    concurrency = max(1, min(concurrency, config.BATCH_CONCURRENCY))
+
+    menu_format = negotiate_menu_format(request, data)
+    toppings_mode = negotiate_toppings_mode(request, data)
+    snapshot = data_reloader.snapshot # The whole batch resolves against one data snapshot
+    app.logger.info(f"Received /scrape/batch request for {len(identifiers)} identifiers (concurrency {concurrency}).")
+    response = Response(stream_batch_results(identifiers, menu_format, snapshot, concurrency, toppings_mode),
+                        mimetype="application/x-ndjson")
+    response.headers["X-Accel-Buffering"] = "no" # Ask reverse proxies not to buffer the stream
+    return response
+
+
+def admin_request_allowed():
+    """Admin actions need X-Admin-Token == ADMIN_TOKEN, or a localhost caller when no token is configured."""
+    if config.ADMIN_TOKEN:
+        return hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode('utf-8'),
+                                   config.ADMIN_TOKEN.encode('utf-8'))
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload_route():
+    """Rebuilds changed data files (all with ?force=1) on a worker thread; never blocks requests."""
+    if not admin_request_allowed():
+        app.logger.warning(f"Rejected /admin/reload from {request.remote_addr}.")
+        return jsonify({"success": False, "error": "Forbidden."}), 403
+    force = request.args.get('force', '').lower() in ('1', 'true', 'yes')
+    started = data_reloader.reload_in_background(force=force)
+    return jsonify({"started": started, **data_reloader.status()}), 202 if started else 409
+
+@app.route('/admin/reload', methods=['GET'])
+def admin_reload_status_route():
+    return jsonify(data_reloader.status()), 200
+
+@app.route('/admin/upstream', methods=['GET'])
+def admin_upstream_status_route():
+    """Snappfood rate limiter and circuit breaker state (upstream_guard)."""
+    return jsonify(get_upstream_guard().state()), 200
+
+@app.route('/vendors/search', methods=['GET'])
+def vendor_search_route():
+    """Typeahead over matched vendor names/codes: ?q=&limit=&city_id=&marketing_area=&business_line="""
+    started = time.perf_counter()
+    query = request.args.get('q', '')
+    limit = max(1, min(request.args.get('limit', default=10, type=int), 50))
+    filters = {field: request.args.get(field) for field in ("city_id", "marketing_area", "business_line")}
+    search_index = data_reloader.snapshot["matched_vendors"][2]
+    results = search_index.search(query, limit=limit, **filters)
+    return jsonify({"success": True, "query": query, "results": results,
+                    "took_ms": round((time.perf_counter() - started) * 1000, 3)}), 200
+
+@app.route('/snapshots/<vendor_code>', methods=['GET'])
+def snapshot_history_route(vendor_code):
+    store = get_menu_store()
+    if store is None:
+        return jsonify({"success": False, "error": "Menu snapshots are disabled."}), 404
+    limit = request.args.get('limit', default=50, type=int)
+    return jsonify({"success": True, "vendor_code": vendor_code, "snapshots": store.history(vendor_code, limit)}), 200
+
+@app.route('/snapshots/<vendor_code>/diff', methods=['GET'])
+def snapshot_diff_route(vendor_code):
+    """Added / removed / price_changed / modified items since ?since=<snapshot id> (default: previous snapshot)."""
+    store = get_menu_store()
+    if store is None:
+        return jsonify({"success": False, "error": "Menu snapshots are disabled."}), 404
+    since = request.args.get('since', type=int)
+    return jsonify({"success": True, **store.diff(vendor_code, since)}), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics_route():
+    """Prometheus text exposition of request, upstream (incl. rate limit / circuit), stage, cache and menu-size metrics."""
+    if not metrics.enabled():
+        return jsonify({"success": False, "error": "Metrics are disabled."}), 404
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats_route():
+    cache = get_response_cache()
+    if cache is None:
+        return jsonify({"enabled": False, "menu_pages": get_menu_page_store().stats()}), 200
+    return jsonify({"enabled": True, **cache.stats(), "menu_pages": get_menu_page_store().stats()}), 200
 
 if __name__ == '__main__':
     config.DATA_DIR.mkdir(parents=True, exist_ok=True)
@@ -387,4 +657,6 @@ if __name__ == '__main__':
     
     app.logger.info(f"Flask app starting on http://127.0.0.1:5001 (Debug mode: {app.debug})")
     app.logger.info(f"Ensure '{config.TF_INFO_CSV_PATH.name}', '{config.TF_MENU_CSV_PATH.name}', and '{config.MATCHED_VENDORS_CSV_PATH.name}' are present or configured.")
-    app.run(host="127.0.0.1", port=5001, debug=True, use_reloader=False) # use_reloader=False recommended with current data loading pattern
\ No newline at end of file
+    # Data files are hot-reloaded by data_reloader (watcher / POST /admin/reload); Flask's code
+    # reloader would restart the process and redo the full initial load, so keep it off.
+    app.run(host="127.0.0.1", port=5001, debug=True, use_reloader=False)
\ No newline at end of file
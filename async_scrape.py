@@ -0,0 +1,295 @@
+# async_scrape.py
+import asyncio
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import Future
+
+try:
+    import httpx # Optional: only the async engine needs it
+except ImportError:
+    httpx = None
+
+import config
+import metrics
+from upstream_guard import UpstreamUnavailable, get_upstream_guard, jittered_backoff
+from vendor_scrape import ScrapeResult, VendorMenuParser, decode_json
+
+RETRY_BACKOFF_MAX = 120.0 # Same cap urllib3's Retry applies
+RETRY_AFTER_STATUS_CODES = (413, 429, 503) # Statuses whose Retry-After header is honoured, as in urllib3
+
+
+class ShardedAsyncClient:
+    """A set of httpx.AsyncClient shards with requests spread round-robin.
+
+    httpcore's pool scans every connection on each request state change, so a
+    single client with hundreds of connections spends its time in pool
+    bookkeeping (measured: 300 concurrent slow requests took 6.5s on one client
+    vs 1.7s on shards of 16). Shards keep each pool small.
+    """
+
+    def __init__(self, max_connections: int, shard_size: int = config.ASYNC_CLIENT_SHARD_SIZE):
+        if httpx is None:
+            raise RuntimeError("The async scraper needs httpx (pip install httpx).")
+        shard_size = max(1, min(shard_size, max_connections))
+        shard_count = -(-max(1, max_connections) // shard_size)
+        limits = httpx.Limits(max_connections=shard_size, max_keepalive_connections=shard_size)
+        self.clients = [httpx.AsyncClient(headers=config.REQUEST_HEADERS, timeout=config.REQUEST_TIMEOUT, limits=limits)
+                        for _ in range(shard_count)]
+        self._next = itertools.count()
+
+    def get(self, url, **kwargs):
+        return self.clients[next(self._next) % len(self.clients)].get(url, **kwargs)
+
+    async def aclose(self):
+        for client in self.clients:
+            await client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+def build_async_client(max_connections: int | None = None) -> ShardedAsyncClient:
+    """Builds the pooled keep-alive async client (httpx shards) with the Snappfood headers."""
+    return ShardedAsyncClient(max_connections or config.ASYNC_MAX_CONNECTIONS)
+
+
+def _backoff_seconds(retry_number: int) -> float:
+    """Same jittered schedule as vendor_scrape.CountingRetry."""
+    if config.RETRY_BACKOFF_FACTOR <= 0:
+        return 0.0
+    return jittered_backoff(retry_number, config.RETRY_BACKOFF_FACTOR, RETRY_BACKOFF_MAX)
+
+
+def _retry_after_seconds(resp) -> float | None:
+    value = resp.headers.get("Retry-After") if resp.status_code in RETRY_AFTER_STATUS_CODES else None
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None # HTTP-date form; fall back to the backoff schedule
+
+
+class AsyncVendorMenuScraper(VendorMenuParser):
+    """asyncio counterpart of vendor_scrape.VendorMenuFastScraper, fetching through a shared ShardedAsyncClient.
+
+    Retries (MAX_RETRIES attempts for connection errors, timeouts and
+    RETRY_STATUS_CODES, jittered backoff, Retry-After, the upstream guard), the
+    response cache, 404 handling and last_error_message / last_error_kind
+    match the blocking scraper; settings and parsing come from the shared
+    VendorMenuParser. It has no run(): callers write the ScrapeResult themselves.
+    """
+
+    def __init__(self, vendor_code: str, client: ShardedAsyncClient, use_cache: bool = True):
+        self._configure(vendor_code, use_cache)
+        self.client = client
+
+    async def _upstream_get(self, params: dict, headers: dict):
+        """GET with retries, timed like the blocking scraper's call (urllib3 retries included).
+
+        Every attempt waits for the upstream guard and reports its outcome to it;
+        raises UpstreamUnavailable while the circuit is open.
+        """
+        guard = get_upstream_guard()
+        probe = await self._guard_wait(guard)
+        started = time.perf_counter()
+        status = "error"
+        try:
+            for attempt in range(1, max(1, self.max_retries) + 1):
+                is_last = attempt >= self.max_retries
+                if attempt > 1:
+                    probe = await self._guard_wait(guard)
+                try:
+                    resp = await self.client.get(self.base_url, params=params, headers=headers, timeout=self.timeout)
+                except (httpx.TimeoutException, httpx.TransportError) as e:
+                    guard.record(timed_out=isinstance(e, httpx.TimeoutException), probe=probe)
+                    if is_last:
+                        raise
+                    metrics.UPSTREAM_RETRIES.inc(reason=type(e).__name__)
+                    await asyncio.sleep(_backoff_seconds(attempt))
+                    continue
+                guard.record(resp.status_code, probe=probe)
+                if resp.status_code not in config.RETRY_STATUS_CODES or is_last:
+                    status = str(resp.status_code)
+                    return resp
+                metrics.UPSTREAM_RETRIES.inc(reason=str(resp.status_code))
+                retry_after = _retry_after_seconds(resp)
+                await resp.aclose()
+                await asyncio.sleep(retry_after if retry_after is not None else _backoff_seconds(attempt))
+        except UpstreamUnavailable:
+            status = "circuit_open"
+            raise
+        except Exception as e:
+            status = type(e).__name__
+            raise
+        finally:
+            metrics.UPSTREAM_SECONDS.observe(time.perf_counter() - started, status=status)
+
+    @staticmethod
+    async def _guard_wait(guard) -> int | None:
+        """Waits for the guard to admit one attempt; returns its circuit breaker probe token."""
+        probe = guard.before_call()
+        while (delay := guard.try_acquire()) > 0:
+            await asyncio.sleep(delay)
+        return probe
+
+    async def fetch_vendor_json(self, code: str) -> dict | None:
+        """Fetches the raw JSON data for the vendor from the API."""
+        self.last_error_message = None
+        self.last_error_kind = None
+        params = self.default_params.copy()
+        params["vendorCode"] = code
+
+        if not isinstance(self.headers, dict) or 'User-Agent' not in self.headers:
+            self.logger.error("Request headers are not configured correctly in config.py.")
+            self.last_error_message = "Request headers misconfiguration."
+            self.last_error_kind = "config_error"
+            return None
+
+        cached = self.cache.get(code) if self.cache else None
+        request_headers = self.headers
+        if cached is not None:
+            if cached.is_fresh(self.cache.ttl):
+                self.cache.record_hit()
+                metrics.CACHE_EVENTS.inc(result="hit")
+                self.logger.debug(f"Cache hit for vendor {code}.")
+                return cached.data
+            request_headers = {**self.headers, **cached.conditional_headers()}
+
+        resp = None
+        try:
+            resp = await self._upstream_get(params, request_headers)
+            if resp.status_code == 304 and cached is not None:
+                self.cache.mark_revalidated(code, cached)
+                metrics.CACHE_EVENTS.inc(result="revalidated")
+                self.logger.debug(f"Vendor {code} not modified upstream, reusing cached payload.")
+                return cached.data
+            resp.raise_for_status()
+            with metrics.timed("json_decode", "sf"):
+                data = decode_json(resp.content)
+            if self.cache:
+                self.cache.record_miss()
+                metrics.CACHE_EVENTS.inc(result="miss")
+                self.cache.put(code, data, resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+            return data
+
+        except httpx.HTTPStatusError as e:
+            status = resp.status_code if resp is not None else 'Unknown'
+            self.last_error_message = f"HTTPError for {code} (Status: {status}): {e}"
+            self.last_error_kind = "http_error"
+            if status in (400, 404):
+                self.last_error_kind = "not_found"
+                self.logger.warning(f"Vendor {code} invalid or not found (HTTP {status}), skipping.")
+                return None
+            self.logger.error(self.last_error_message)
+        except json.JSONDecodeError as e:
+            self.last_error_message = f"Failed to decode JSON response for {code}: {e}"
+            self.last_error_kind = "decode_error"
+            self.logger.error(self.last_error_message)
+            return None
+        except httpx.TimeoutException:
+            self.last_error_message = f"Timeout error for {code} after {self.max_retries} attempts."
+            self.last_error_kind = "timeout"
+            self.logger.warning(self.last_error_message)
+        except httpx.HTTPError as e:
+            self.last_error_message = f"Network error for {code}: {e!r}"
+            self.last_error_kind = "network_error"
+            self.logger.error(self.last_error_message)
+        except UpstreamUnavailable as e:
+            self.last_error_message = f"Skipped {code}: {e}"
+            self.last_error_kind = "circuit_open"
+            self.logger.warning(self.last_error_message)
+            return None
+        except Exception as e:
+            self.last_error_message = f"Unexpected error during fetch for {code}: {e}"
+            self.last_error_kind = "unexpected_error"
+            self.logger.error(self.last_error_message, exc_info=True)
+
+        self.logger.error(f"Failed to fetch data for {code} after {self.max_retries} attempts.")
+        if not self.last_error_message:
+            self.last_error_message = f"Failed to fetch data for {code} after multiple retries and no specific error captured."
+        self.last_error_kind = self.last_error_kind or "unexpected_error"
+        return None
+
+    async def scrape(self) -> ScrapeResult | None:
+        """Fetches and parses the vendor. Returns a ScrapeResult, or None (see last_error_message)."""
+        self.logger.info(f"Starting async scrape for vendor: {self.vendor_code}")
+        data = await self.fetch_vendor_json(self.vendor_code)
+        if data is None:
+            self.logger.error(f"Failed to fetch/decode data for {self.vendor_code}. Error: {self.last_error_message or 'Unknown fetch error'}")
+            return None
+        # Parsing is CPU work; run it off the loop so other vendors' I/O keeps moving
+        return self._checked_result(await asyncio.to_thread(self.parse_menu, data, self.vendor_code))
+
+
+class AsyncScrapeEngine:
+    """One background event loop with a shared async HTTP client, for thread-based callers.
+
+    scrape_future() schedules a vendor on the loop and returns a
+    concurrent.futures.Future of (ScrapeResult | None, error_message, error_kind).
+    At most max_concurrency vendors are in flight, and callers asking for a
+    vendor that is already in flight share that scrape.
+    """
+
+    def __init__(self, max_connections: int = config.ASYNC_MAX_CONNECTIONS,
+                 max_concurrency: int = config.ASYNC_MAX_CONCURRENCY):
+        self.client = build_async_client(max_connections)
+        self.max_concurrency = max(1, max_concurrency)
+        self._loop = asyncio.new_event_loop()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._inflight = {}
+        self._lock = threading.RLock() # A future that is already done runs its callback inside scrape_future
+        self._thread = threading.Thread(target=self._loop.run_forever, name="async-scrape", daemon=True)
+        self._thread.start()
+
+    async def _scrape(self, vendor_code: str, use_cache: bool) -> tuple:
+        async with self._semaphore:
+            scraper = AsyncVendorMenuScraper(vendor_code, self.client, use_cache)
+            result = await scraper.scrape()
+        if result is None:
+            return None, scraper.last_error_message or f"Snappfood scraping failed for {vendor_code}", scraper.last_error_kind
+        return result, None, None
+
+    def scrape_future(self, vendor_code: str, use_cache: bool = True) -> Future:
+        key = (vendor_code.strip(), use_cache)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = asyncio.run_coroutine_threadsafe(self._scrape(key[0], use_cache), self._loop)
+                self._inflight[key] = future
+                future.add_done_callback(lambda done, key=key: self._forget(key, done))
+        return future
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def scrape(self, vendor_code: str, use_cache: bool = True, timeout: float | None = None) -> tuple:
+        """Blocking helper: (ScrapeResult | None, error_message, error_kind)."""
+        return self.scrape_future(vendor_code, use_cache).result(timeout)
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.client.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+_async_engine = None
+_async_engine_lock = threading.Lock()
+
+
+def get_async_engine() -> AsyncScrapeEngine | None:
+    """Returns the process-wide engine, or None when SF_ASYNC_ENGINE is off or httpx is missing."""
+    global _async_engine
+    if not config.SF_ASYNC_ENGINE or httpx is None:
+        return None
+    if _async_engine is None:
+        with _async_engine_lock:
+            if _async_engine is None:
+                _async_engine = AsyncScrapeEngine()
+    return _async_engine
@@ -0,0 +1,659 @@
+# benchmark.py
+import argparse
+import inspect
+import json
+import logging
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+import config
+from upstream_guard import AdaptiveRateLimiter, CircuitBreaker, UpstreamGuard, set_upstream_guard
+from vendor_scrape import VendorMenuFastScraper, _synthetic_vendor_payload, configure_logging, decode_json
+
+# Scenario sizes. "quick" is for a local sanity run, "full" for numbers worth storing.
+PROFILES = {
+    "quick": {"sf_parse": {"products": 2000, "rounds": 5},
+              "sf_fetch": {"products": 500, "rounds": 20},
+              "scrape_endpoint": {"products": 500, "vendors": 200, "items_per_vendor": 150, "rounds": 20},
+              "bulk_crawl": {"products": 200, "vendors": 200, "workers": 16},
+              "tf_lookup": {"vendors": 2000, "items_per_vendor": 150, "rounds": 200},
+              "upstream_bursts": {"products": 50, "vendors": 400, "workers": 30, "throttle_rps": 25,
+                                  "burst_every_sec": 6, "burst_sec": 2},
+              "async_concurrency": {"products": 10, "vendors": 400, "workers": 16, "async_concurrency": 200,
+                                    "latency_ms": 250}},
+    "full": {"sf_parse": {"products": 5000, "rounds": 10},
+             "sf_fetch": {"products": 2000, "rounds": 50},
+             "scrape_endpoint": {"products": 2000, "vendors": 1000, "items_per_vendor": 150, "rounds": 50},
+             "bulk_crawl": {"products": 500, "vendors": 1000, "workers": 30},
+             "tf_lookup": {"vendors": 10000, "items_per_vendor": 150, "rounds": 1000},
+             "upstream_bursts": {"products": 200, "vendors": 1000, "workers": 30, "throttle_rps": 40,
+                                 "burst_every_sec": 10, "burst_sec": 3},
+             "async_concurrency": {"products": 20, "vendors": 2000, "workers": 30, "async_concurrency": 500,
+                                   "latency_ms": 250}},
+}
+
+# Metric compared across runs per scenario, and whether bigger is better
+HEADLINE_METRICS = {
+    "sf_parse": ("median_ms", False),
+    "sf_fetch": ("median_ms", False),
+    "scrape_endpoint": ("median_ms", False),
+    "bulk_crawl": ("vendors_per_sec", True),
+    "tf_lookup": ("median_ms", False),
+    "upstream_bursts": ("wasted_requests", False),
+    "async_concurrency": ("async_speedup", True),
+}
+
+
+# --- Fake Snappfood API ---
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024 # The default backlog of 5 drops connection bursts from load tests
+
+
+class FakeSnappfoodServer:
+    """Local stand-in for the Snappfood vendor details endpoint.
+
+    Serves the recorded payload <fixtures_dir>/<vendorCode>.json when present,
+    otherwise a synthetic menu of n_products (one encoded body shared by every
+    vendor code). Each request waits latency_ms (+ uniform jitter_ms) and fails
+    with error_status at error_rate. Error bursts fail every request: for
+    burst_sec out of every burst_every_sec, or on demand via inject_burst().
+    Above throttle_rps requests/sec it answers 429. The vendor code "missing"
+    always 404s. stats counts requests and the TCP connections they came on,
+    and peak_in_flight is the most requests it was answering at once.
+    """
+
+    def __init__(self, n_products: int = 500, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 503, fixtures_dir: Path | None = None,
+                 host: str = "127.0.0.1", port: int = 0, seed: int = 7, throttle_rps: float = 0.0,
+                 burst_every_sec: float = 0.0, burst_sec: float = 0.0):
+        self.n_products = n_products
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.fixtures_dir = Path(fixtures_dir) if fixtures_dir else None
+        self.throttle_rps = throttle_rps
+        self.burst_every_sec = burst_every_sec
+        self.burst_sec = burst_sec
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._bodies = {}
+        self._started = time.monotonic()
+        self._burst_until = 0.0
+        self._throttle_tokens, self._throttle_updated = throttle_rps, self._started # One second of burst allowance
+        self.stats = {"requests": 0, "connections": 0, "errors": 0, "not_found": 0, "throttled": 0,
+                      "in_flight": 0, "peak_in_flight": 0}
+        self._server = _StubHTTPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/mobile/v2/restaurant/details/dynamic"
+
+    def body_for(self, vendor_code: str) -> bytes | None:
+        fixture = self.fixtures_dir / f"{vendor_code}.json" if self.fixtures_dir else None
+        key = str(fixture) if fixture is not None and fixture.is_file() else None
+        with self._lock:
+            body = self._bodies.get(key)
+            if body is None:
+                body = fixture.read_bytes() if key else json.dumps(
+                    _synthetic_vendor_payload(self.n_products), ensure_ascii=False).encode("utf-8")
+                self._bodies[key] = body
+        return body
+
+    def inject_burst(self, seconds: float):
+        """Fails every request with error_status for the next `seconds`."""
+        with self._lock:
+            self._burst_until = time.monotonic() + seconds
+
+    def _in_burst(self, now: float) -> bool:
+        if now < self._burst_until:
+            return True
+        return self.burst_every_sec > 0 and (now - self._started) % self.burst_every_sec >= self.burst_every_sec - self.burst_sec
+
+    def _throttled(self, now: float) -> bool:
+        if self.throttle_rps <= 0:
+            return False
+        self._throttle_tokens = min(self.throttle_rps, self._throttle_tokens + (now - self._throttle_updated) * self.throttle_rps)
+        self._throttle_updated = now
+        if self._throttle_tokens < 1:
+            return True
+        self._throttle_tokens -= 1
+        return False
+
+    def _outcome(self) -> tuple[float, int | None]:
+        """(seconds to wait, error status to answer with or None) for one request."""
+        with self._lock:
+            now = time.monotonic()
+            self.stats["requests"] += 1
+            self.stats["in_flight"] += 1
+            self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.stats["in_flight"])
+            delay = (self.latency_ms + self._rng.uniform(0, self.jitter_ms)) / 1000
+            if self._throttled(now):
+                self.stats["throttled"] += 1
+                return 0.0, 429
+            failed = self._in_burst(now) or (self.error_rate > 0 and self._rng.random() < self.error_rate)
+            if failed:
+                self.stats["errors"] += 1
+        return delay, self.error_status if failed else None
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # Keep-alive, like the real API behind the pooled session
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup() # One handler per TCP connection; keep-alive requests reuse it
+                with server._lock:
+                    server.stats["connections"] += 1
+
+            def _send(self, status: int, body: bytes = b""):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass # Client gave up (timeout); nothing left to answer
+
+            def do_GET(self):
+                delay, error_status = server._outcome()
+                try:
+                    if delay:
+                        time.sleep(delay)
+                    vendor_code = parse_qs(urlparse(self.path).query).get("vendorCode", [""])[0]
+                    if error_status:
+                        self._send(error_status)
+                    elif not vendor_code or vendor_code == "missing":
+                        with server._lock:
+                            server.stats["not_found"] += 1
+                        self._send(404)
+                    else:
+                        self._send(200, server.body_for(vendor_code))
+                finally:
+                    with server._lock:
+                        server.stats["in_flight"] -= 1
+
+        return Handler
+
+    def start(self) -> "FakeSnappfoodServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-snappfood", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class use_base_url:
+    """Points config.BASE_URL (read by every new scraper and crawler) at the stub for a block."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+
+    def __enter__(self):
+        self.previous = config.BASE_URL
+        config.BASE_URL = self.base_url
+
+    def __exit__(self, *exc):
+        config.BASE_URL = self.previous
+
+
+class use_upstream_guard:
+    """Installs `guard` as the process-wide Snappfood upstream guard for a block."""
+
+    def __init__(self, guard: UpstreamGuard):
+        self.guard = guard
+
+    def __enter__(self):
+        self.previous = set_upstream_guard(self.guard)
+        return self.guard
+
+    def __exit__(self, *exc):
+        set_upstream_guard(self.previous)
+
+
+def unguarded() -> UpstreamGuard:
+    """A guard with the rate limiter and circuit breaker both off."""
+    return UpstreamGuard(AdaptiveRateLimiter(max_rate=0), CircuitBreaker(failure_ratio=0))
+
+
+# --- Synthetic TapsiFood data ---
+def synthetic_tf_frames(n_vendors: int, items_per_vendor: int = 150, seed: int = 42) -> dict[str, pd.DataFrame]:
+    """tf_menu / tf_info / matched_vendors frames in the column layout of the real exports.
+
+    TapsiFood vendor i is "tf<i>" and is matched to Snappfood vendor "sf<i>".
+    """
+    rng = np.random.default_rng(seed)
+    tf_codes = np.array([f"tf{i:06d}" for i in range(n_vendors)])
+    sf_codes = np.array([f"sf{i:06d}" for i in range(n_vendors)])
+    n_rows = n_vendors * items_per_vendor
+    vendor_ids = rng.integers(0, n_vendors, size=n_rows)
+    category_ids = rng.integers(1, 21, size=n_rows)
+    menu = pd.DataFrame({
+        "tf_code": tf_codes[vendor_ids],
+        "category_id": category_ids.astype(str),
+        "category_name": [f"category {c}" for c in category_ids],
+        "item_id": np.arange(n_rows).astype(str),
+        "item_title": [f"item {i}" for i in range(n_rows)],
+        "item_description": np.where(np.arange(n_rows) % 4 == 0, "", "description of the item"),
+        "price": (rng.integers(10, 900, size=n_rows) * 1000).astype(str),
+    })
+    shifts = json.dumps([{"DayOfWeek": day, "Shifts": [{"StartTime": "08:00", "EndTime": "23:00"}]}
+                         for day in ("Saturday", "Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday")])
+    info = pd.DataFrame({
+        "id": np.arange(n_vendors).astype(str),
+        "vendor_code": tf_codes,
+        "vendor_name": [f"vendor {i}" for i in range(n_vendors)],
+        "business_line": rng.choice(["Restaurant", "Cafe", "Confectionery"], size=n_vendors),
+        "marketing_area": [f"area {a}" for a in rng.integers(0, 50, size=n_vendors)],
+        "address": "address",
+        "min_order": "50000",
+        "latitude": "35.7",
+        "longitude": "51.4",
+        "shifts": shifts,
+    })
+    matched = pd.DataFrame({
+        "sf_code": sf_codes, "sf_name": info["vendor_name"], "tf_code": tf_codes, "tf_name": info["vendor_name"],
+        "city_id": rng.integers(1, 5, size=n_vendors).astype(str), "marketing_area": info["marketing_area"],
+        "business_line": info["business_line"],
+    })
+    return {"tf_menu": menu, "tf_info": info, "matched_vendors": matched}
+
+
+def write_synthetic_tf_data(out_dir: Path, n_vendors: int, items_per_vendor: int = 150, seed: int = 42) -> dict[str, Path]:
+    """Writes tf_menu.csv, tf_info.csv and matched_vendors.csv to out_dir; returns their paths."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = {}
+    for name, df in synthetic_tf_frames(n_vendors, items_per_vendor, seed).items():
+        paths[name] = out_dir / f"{name}.csv"
+        df.to_csv(paths[name], index=False)
+    return paths
+
+
+def synthetic_data_reloader(paths: dict[str, Path]):
+    """A DataReloader over the app's own loaders, reading the given synthetic files."""
+    import app as web_app # Deferred: importing the app loads the configured data files
+    from data_reload import DataReloader, DataSource
+    reloader = DataReloader([DataSource(source.name, paths[source.name], source.loader, source.empty_factory)
+                             for source in web_app.data_reloader.sources], logger=web_app.app.logger)
+    reloader.load_initial()
+    return web_app, reloader
+
+
+# --- Measurement ---
+def summarize_timings(timings: list[float]) -> dict:
+    """pytest-benchmark style statistics for per-round timings given in seconds."""
+    ms = sorted(t * 1000 for t in timings)
+    q1, _, q3 = statistics.quantiles(ms, n=4) if len(ms) > 1 else (ms[0], None, ms[0])
+    return {
+        "rounds": len(ms),
+        "min_ms": round(ms[0], 3),
+        "max_ms": round(ms[-1], 3),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "stddev_ms": round(statistics.stdev(ms), 3) if len(ms) > 1 else 0.0,
+        "median_ms": round(statistics.median(ms), 3),
+        "iqr_ms": round(q3 - q1, 3),
+        "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 3),
+        "ops": round(1000 / statistics.fmean(ms), 2) if statistics.fmean(ms) else None,
+    }
+
+
+def time_rounds(fn, rounds: int, warmup: int = 1) -> list[float]:
+    """Calls fn(round_index) warmup + rounds times; returns the timed rounds' seconds."""
+    for i in range(warmup):
+        fn(-1 - i)
+    timings = []
+    for i in range(rounds):
+        started = time.perf_counter()
+        fn(i)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+# --- Scenarios ---
+def scenario_sf_parse(products: int, rounds: int, **_) -> dict:
+    """Decode + parse + CSV render of one Snappfood payload, no network."""
+    body = json.dumps(_synthetic_vendor_payload(products), ensure_ascii=False).encode("utf-8")
+    scraper = VendorMenuFastScraper("bench", use_cache=False)
+    timings = time_rounds(lambda _: scraper.parse_menu(decode_json(body), "bench").to_csv_string(), rounds)
+    return {**summarize_timings(timings), "payload_mb": round(len(body) / 1e6, 2)}
+
+
+def scenario_sf_fetch(products: int, rounds: int, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                      error_rate: float = 0.0, fixtures_dir: Path | None = None, **_) -> dict:
+    """Single-vendor fetch_vendor_json + parse_menu against the fake API (cache off)."""
+    failures = 0
+    with FakeSnappfoodServer(products, latency_ms, jitter_ms, error_rate, fixtures_dir=fixtures_dir) as server, \
+            use_base_url(server.base_url):
+        def one(i):
+            nonlocal failures
+            scraper = VendorMenuFastScraper(f"sf{i % 1000000:06d}", use_cache=False)
+            data = scraper.fetch_vendor_json(scraper.vendor_code)
+            if data is None:
+                failures += 1
+            else:
+                scraper.parse_menu(data, scraper.vendor_code)
+
+        timings = time_rounds(one, rounds)
+    return {**summarize_timings(timings), "failures": failures, "stub": server.stats}
+
+
+def scenario_scrape_endpoint(products: int, vendors: int, items_per_vendor: int, rounds: int,
+                             latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                             fixtures_dir: Path | None = None, work_dir: Path | None = None, **_) -> dict:
+    """POST /scrape end to end (both platforms, JSON format) on synthetic TF data and the fake API."""
+    paths = write_synthetic_tf_data(Path(work_dir) / "tf_data", vendors, items_per_vendor)
+    web_app, reloader = synthetic_data_reloader(paths)
+    client = web_app.app.test_client()
+    previous_reloader = web_app.data_reloader
+    statuses = {}
+    with FakeSnappfoodServer(products, latency_ms, jitter_ms, error_rate, fixtures_dir=fixtures_dir) as server, \
+            use_base_url(server.base_url):
+        web_app.data_reloader = reloader # Routes read the module-level reloader at request time
+        try:
+            def one(i):
+                # A different vendor each round so the response cache never short-circuits the fetch
+                response = client.post("/scrape", json={"identifier": f"sf{i % vendors:06d}", "format": "json"})
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+            timings = time_rounds(one, rounds)
+        finally:
+            web_app.data_reloader = previous_reloader
+    return {**summarize_timings(timings), "statuses": {str(k): v for k, v in statuses.items()}}
+
+
+def scenario_bulk_crawl(products: int, vendors: int, workers: int, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                        error_rate: float = 0.0, fixtures_dir: Path | None = None, work_dir: Path | None = None, **_) -> dict:
+    """BulkMenuCrawler throughput (rate limit off) against the fake API."""
+    from bulk_crawl import BulkMenuCrawler
+    with FakeSnappfoodServer(products, latency_ms, jitter_ms, error_rate, fixtures_dir=fixtures_dir) as server, \
+            use_base_url(server.base_url):
+        crawler = BulkMenuCrawler([f"sf{i:06d}" for i in range(vendors)], Path(work_dir) / "bulk_crawl.csv",
+                                  max_workers=workers, rate_per_sec=0)
+        stats = crawler.run()
+    return {"elapsed_sec": stats.get("elapsed_sec"), "vendors_per_sec": stats.get("vendors_per_sec"),
+            **{key: stats.get(key) for key in ("ok", "empty", "failed", "items")}, "stub": server.stats}
+
+
+def scenario_tf_lookup(vendors: int, items_per_vendor: int, rounds: int, work_dir: Path | None = None, **_) -> dict:
+    """TapsiFood menu assembly (prepare_tapsifood_csv_data) for random vendors at scale."""
+    paths = write_synthetic_tf_data(Path(work_dir) / "tf_data", vendors, items_per_vendor)
+    started = time.perf_counter()
+    web_app, reloader = synthetic_data_reloader(paths)
+    load_sec = time.perf_counter() - started
+    snapshot = reloader.snapshot
+    rng = random.Random(1)
+    codes = [f"tf{rng.randrange(vendors):06d}" for _ in range(rounds + 1)]
+    timings = time_rounds(lambda i: web_app.prepare_tapsifood_csv_data(codes[i], snapshot), rounds)
+    return {**summarize_timings(timings), "rows": vendors * items_per_vendor, "load_sec": round(load_sec, 2)}
+
+
+def scenario_upstream_bursts(products: int, vendors: int, workers: int, throttle_rps: float, burst_every_sec: float,
+                             burst_sec: float, latency_ms: float = 50.0, jitter_ms: float = 0.0, rate_limit: float = 100.0,
+                             breaker_open_sec: float = 1.0, work_dir: Path | None = None, **_) -> dict:
+    """BulkMenuCrawler against a fake API that throttles above throttle_rps and has periodic 503 bursts.
+
+    Runs with an upstream guard (adaptive limiter from rate_limit, short-window
+    breaker); wasted_requests counts the 429/503 answers the crawl provoked.
+    """
+    from bulk_crawl import BulkMenuCrawler
+    guard = UpstreamGuard(AdaptiveRateLimiter(max_rate=rate_limit),
+                          CircuitBreaker(window_sec=5, min_calls=10, open_sec=breaker_open_sec, max_open_sec=breaker_open_sec * 8))
+    with FakeSnappfoodServer(products, latency_ms, jitter_ms, throttle_rps=throttle_rps, burst_every_sec=burst_every_sec,
+                             burst_sec=burst_sec) as server, use_base_url(server.base_url), use_upstream_guard(guard):
+        crawler = BulkMenuCrawler([f"sf{i:06d}" for i in range(vendors)], Path(work_dir) / "upstream_bursts.csv",
+                                  max_workers=workers, rate_per_sec=0, circuit_max_wait=burst_every_sec * 4)
+        stats = crawler.run()
+    upstream = guard.state()
+    return {"elapsed_sec": stats.get("elapsed_sec"), "vendors_per_sec": stats.get("vendors_per_sec"),
+            **{key: stats.get(key) for key in ("ok", "failed")},
+            "wasted_requests": server.stats["errors"] + server.stats["throttled"], "stub": server.stats,
+            "final_rate_per_sec": upstream["rate_limiter"]["rate_per_sec"],
+            "rate_decreases": upstream["rate_limiter"]["decreases"],
+            "breaker_opened": upstream["circuit_breaker"]["opened"],
+            "breaker_rejected": upstream["circuit_breaker"]["rejected"]}
+
+
+def scenario_async_concurrency(products: int, vendors: int, workers: int, async_concurrency: int,
+                               latency_ms: float = 250.0, jitter_ms: float = 0.0, work_dir: Path | None = None, **_) -> dict:
+    """The same vendors through BulkMenuCrawler, AsyncBulkMenuCrawler and AsyncScrapeEngine on a slow fake API.
+
+    With latency_ms dominating, throughput follows how many requests each path
+    keeps in flight; peak_in_flight is that number as the fake API saw it. The
+    fake API shares this process (and its GIL), so small latencies measure CPU
+    contention rather than concurrency.
+    """
+    from async_scrape import AsyncScrapeEngine
+    from bulk_crawl import AsyncBulkMenuCrawler, BulkMenuCrawler
+    codes = [f"sf{i:06d}" for i in range(vendors)]
+
+    def crawl(crawler_class, max_workers: int, name: str) -> dict:
+        with FakeSnappfoodServer(products, latency_ms, jitter_ms) as server, use_base_url(server.base_url):
+            stats = crawler_class(codes, Path(work_dir) / f"async_concurrency_{name}.csv",
+                                  max_workers=max_workers, rate_per_sec=0).run()
+        return {"elapsed_sec": stats.get("elapsed_sec"), "vendors_per_sec": stats.get("vendors_per_sec"),
+                "ok": stats.get("ok"), "peak_in_flight": server.stats["peak_in_flight"]}
+
+    results = {"threads": crawl(BulkMenuCrawler, workers, "threads"),
+               "async_crawler": crawl(AsyncBulkMenuCrawler, async_concurrency, "async")}
+    with FakeSnappfoodServer(products, latency_ms, jitter_ms) as server, use_base_url(server.base_url):
+        engine = AsyncScrapeEngine(max_connections=async_concurrency, max_concurrency=async_concurrency)
+        try:
+            started = time.perf_counter()
+            futures = [engine.scrape_future(code, use_cache=False) for code in codes]
+            ok = sum(future.result()[0] is not None for future in futures)
+            elapsed = time.perf_counter() - started
+        finally:
+            engine.close()
+    results["async_engine"] = {"elapsed_sec": round(elapsed, 2), "vendors_per_sec": round(vendors / elapsed, 2),
+                               "ok": ok, "peak_in_flight": server.stats["peak_in_flight"]}
+    threaded = results["threads"]["vendors_per_sec"]
+    return {**results, "async_speedup": round(results["async_crawler"]["vendors_per_sec"] / threaded, 2) if threaded else None}
+
+
+SCENARIOS = {
+    "sf_parse": scenario_sf_parse,
+    "sf_fetch": scenario_sf_fetch,
+    "scrape_endpoint": scenario_scrape_endpoint,
+    "bulk_crawl": scenario_bulk_crawl,
+    "tf_lookup": scenario_tf_lookup,
+    "upstream_bursts": scenario_upstream_bursts,
+    "async_concurrency": scenario_async_concurrency,
+}
+
+
+# --- Stored results ---
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=Path(__file__).resolve().parent, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def run_benchmarks(scenarios=None, profile: str = "quick", **overrides) -> dict:
+    """Runs the named scenarios (default: all) and returns one run record.
+
+    overrides (latency_ms, jitter_ms, error_rate, fixtures_dir) go to every scenario that takes them.
+    """
+    logger = configure_logging()
+    logger.setLevel(logging.WARNING) # Per-request scraper logs would dominate the timings
+    logging.getLogger("app").setLevel(logging.WARNING)
+    overrides = {key: value for key, value in overrides.items() if value is not None}
+    run = {"run_id": time.strftime("%Y%m%dT%H%M%S"), "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+           "git_commit": _git_commit(), "profile": profile, "python": platform.python_version(),
+           "machine": platform.platform(), "results": {}}
+    previous_db = config.MENU_SNAPSHOT_DB
+    # Throughput scenarios measure the code, not the politeness limits; upstream_bursts installs its own guard
+    with tempfile.TemporaryDirectory(prefix="sf_tf_bench_") as work_dir, use_upstream_guard(unguarded()):
+        # Bulk crawls (and /scrape with MENU_SNAPSHOTS_ON_REQUEST) record menu snapshots; keep them out of the real store
+        config.MENU_SNAPSHOT_DB = Path(work_dir) / "menu_snapshots.sqlite"
+        try:
+            for name in scenarios or SCENARIOS:
+                accepted = inspect.signature(SCENARIOS[name]).parameters
+                params = {**PROFILES[profile][name], **{k: v for k, v in overrides.items() if k in accepted}}
+                print(f"Running {name} {json.dumps({k: str(v) for k, v in params.items()})} ...", file=sys.stderr)
+                result = SCENARIOS[name](**params, work_dir=work_dir)
+                run["results"][name] = {"params": {k: str(v) if isinstance(v, Path) else v for k, v in params.items()},
+                                        **result}
+        finally:
+            config.MENU_SNAPSHOT_DB = previous_db
+    return run
+
+
+def save_run(run: dict, results_path: Path = config.BENCHMARK_RESULTS_PATH):
+    results_path = Path(results_path)
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(results_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(run, ensure_ascii=False) + "\n")
+
+
+def load_runs(results_path: Path = config.BENCHMARK_RESULTS_PATH) -> list[dict]:
+    results_path = Path(results_path)
+    if not results_path.is_file():
+        return []
+    with open(results_path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare_runs(baseline: dict, current: dict, threshold: float = 0.10) -> list[dict]:
+    """Headline metric of every scenario in both runs; "regression" when worse by more than threshold.
+
+    Scenarios that ran with different parameters (sizes, stub latency...) are not comparable and are skipped.
+    """
+    rows = []
+    for name, (metric, higher_is_better) in HEADLINE_METRICS.items():
+        old_result, new_result = baseline["results"].get(name, {}), current["results"].get(name, {})
+        old, new = old_result.get(metric), new_result.get(metric)
+        if not old or new is None or old_result.get("params") != new_result.get("params"):
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        rows.append({"scenario": name, "metric": metric, "baseline": old, "current": new,
+                     "change_pct": round(change * 100, 1), "regression": worse > threshold})
+    return rows
+
+
+def print_comparison(rows: list[dict], baseline: dict, current: dict):
+    print(f"baseline {baseline['run_id']} ({baseline.get('git_commit')}) -> current {current['run_id']} ({current.get('git_commit')})")
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else ""
+        print(f"{row['scenario']:<16} {row['metric']:<16} {row['baseline']:>12} -> {row['current']:>12} "
+              f"({row['change_pct']:+.1f}%) {flag}")
+
+
+def _find_run(runs: list[dict], run_id: str | None, default_index: int) -> dict | None:
+    if run_id is None:
+        return runs[default_index] if len(runs) >= abs(default_index) else None
+    return next((run for run in runs if run["run_id"] == run_id), None)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmarks against a local fake Snappfood API.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    stub_options = argparse.ArgumentParser(add_help=False)
+    stub_options.add_argument("--latency-ms", type=float, default=None, help="Fake API delay per request.")
+    stub_options.add_argument("--jitter-ms", type=float, default=None, help="Extra uniform random delay per request.")
+    stub_options.add_argument("--error-rate", type=float, default=None, help="Fraction of requests answered with 503.")
+    stub_options.add_argument("--fixtures", type=Path, default=None,
+                              help="Directory of recorded <vendorCode>.json payloads to replay.")
+
+    p_run = sub.add_parser("run", parents=[stub_options], help="Run scenarios and store the results.")
+    p_run.add_argument("scenarios", nargs="*", help=f"Any of {', '.join(SCENARIOS)} (default: all).")
+    p_run.add_argument("--profile", choices=list(PROFILES), default="quick")
+    p_run.add_argument("--no-save", action="store_true", help=f"Don't append to {config.BENCHMARK_RESULTS_PATH}.")
+    p_run.add_argument("--threshold", type=float, default=0.10, help="Regression threshold vs the previous run.")
+
+    p_compare = sub.add_parser("compare", help="Compare two stored runs (default: the last two).")
+    p_compare.add_argument("--baseline", help="run_id of the baseline run.")
+    p_compare.add_argument("--current", help="run_id of the run to check.")
+    p_compare.add_argument("--threshold", type=float, default=0.10)
+
+    p_serve = sub.add_parser("serve", parents=[stub_options],
+                             help="Run the fake Snappfood API in the foreground (point SNAPPFOOD_BASE_URL at it).")
+    p_serve.add_argument("--port", type=int, default=8765)
+    p_serve.add_argument("--products", type=int, default=500)
+    p_serve.add_argument("--throttle-rps", type=float, default=0.0, help="Answer 429 above this many requests/sec.")
+    p_serve.add_argument("--burst-every", type=float, default=0.0, help="Seconds between 503 bursts.")
+    p_serve.add_argument("--burst-sec", type=float, default=0.0, help="Length of each 503 burst.")
+
+    p_gen = sub.add_parser("gen-tf", help="Write synthetic tf_menu.csv / tf_info.csv / matched_vendors.csv.")
+    p_gen.add_argument("out_dir", type=Path)
+    p_gen.add_argument("--vendors", type=int, default=2000)
+    p_gen.add_argument("--items-per-vendor", type=int, default=150)
+    args = parser.parse_args(argv)
+    if args.command == "run" and set(args.scenarios) - set(SCENARIOS):
+        parser.error(f"unknown scenario(s): {', '.join(sorted(set(args.scenarios) - set(SCENARIOS)))}")
+
+    if args.command == "serve":
+        server = FakeSnappfoodServer(args.products, args.latency_ms or 0.0, args.jitter_ms or 0.0, args.error_rate or 0.0,
+                                     fixtures_dir=args.fixtures, port=args.port, throttle_rps=args.throttle_rps,
+                                     burst_every_sec=args.burst_every, burst_sec=args.burst_sec)
+        print(f"Fake Snappfood API at {server.base_url} (Ctrl+C to stop)")
+        try:
+            server._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server._server.server_close()
+        return 0
+
+    if args.command == "gen-tf":
+        for name, path in write_synthetic_tf_data(args.out_dir, args.vendors, args.items_per_vendor).items():
+            print(f"{name}: {path}")
+        return 0
+
+    runs = load_runs()
+    if args.command == "compare":
+        baseline, current = _find_run(runs, args.baseline, -2), _find_run(runs, args.current, -1)
+        if baseline is None or current is None:
+            print("Need two stored runs to compare.", file=sys.stderr)
+            return 2
+        rows = compare_runs(baseline, current, args.threshold)
+        print_comparison(rows, baseline, current)
+        return 1 if any(row["regression"] for row in rows) else 0
+
+    run = run_benchmarks(args.scenarios, args.profile, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                         error_rate=args.error_rate, fixtures_dir=args.fixtures)
+    print(json.dumps(run, indent=2, ensure_ascii=False))
+    if not args.no_save:
+        save_run(run)
+    baseline = next((previous for previous in reversed(runs) if previous.get("profile") == args.profile), None)
+    rows = compare_runs(baseline, run, args.threshold) if baseline is not None else []
+    if rows:
+        print_comparison(rows, baseline, run)
+        return 1 if any(row["regression"] for row in rows) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
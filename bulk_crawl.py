@@ -0,0 +1,375 @@
+# bulk_crawl.py
+import argparse
+import asyncio
+import contextlib
+import csv
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+from urllib.parse import urlparse
+
+import config
+from async_scrape import AsyncVendorMenuScraper, build_async_client
+from crawl_journal import CrawlJournal
+from menu_payload import TOPPINGS_INLINE, TOPPINGS_CATALOG
+from menu_sinks import SINK_TYPES, MenuSink, build_sinks
+from menu_store import MenuSnapshotStore, get_menu_store
+from upstream_guard import get_upstream_guard
+from vendor_scrape import ScrapeResult, VendorMenuFastScraper, configure_logging
+
+
+class HostRateLimiter:
+    """Thread-safe per-host limiter spacing request starts at least 1/rate seconds apart.
+
+    This is the crawl's own fixed ceiling (--rate); the process-wide adaptive
+    limit and circuit breaker live in upstream_guard.
+    """
+
+    def __init__(self, rate_per_sec: float):
+        self.interval = 1.0 / rate_per_sec if rate_per_sec and rate_per_sec > 0 else 0.0
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, host: str) -> float:
+        """Claims the host's next start slot; returns the seconds to wait for it."""
+        if not self.interval:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        return slot - now
+
+    def acquire(self, host: str):
+        delay = self.reserve(host)
+        if delay > 0:
+            time.sleep(delay)
+
+
+def load_sf_codes(mapping_path: Path = config.MATCHED_VENDORS_CSV_PATH) -> list[str]:
+    """Reads the unique, non-empty sf_code values from matched_vendors.csv (file order)."""
+    codes = {}
+    with open(mapping_path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            code = (row.get("sf_code") or "").strip()
+            if code:
+                codes.setdefault(code, None)
+    return list(codes)
+
+
+class BulkMenuCrawler:
+    """Crawls many Snappfood vendors concurrently, streaming parsed rows to one CSV.
+
+    With a journal, every vendor outcome is appended to it as it completes; with
+    resume=True, vendors the journal already marks as finished are skipped and the
+    output CSV is appended to instead of overwritten. Vendors refused by the open
+    circuit breaker are retried once it lets calls through again, for up to
+    circuit_max_wait seconds each, rather than failing the rest of the list.
+
+    With toppings_mode TOPPINGS_CATALOG, product_toppings holds group IDs and
+    each vendor's distinct groups go once to a <output>.toppings.jsonl sidecar
+    as {"vendor_code", "topping_groups": {group ID: group}} lines.
+
+    Each parsed vendor is also written to the given menu_sinks outputs (Parquet,
+    SQLite); they buffer at most MENU_SINK_BATCH_ROWS rows and are flushed and
+    closed when the crawl ends. A batch still buffered when a crawl crashes is
+    missing from them, while the journal already counts those vendors as done.
+    """
+    def __init__(self, vendor_codes, output_path: Path, max_workers: int = config.MAX_WORKERS,
+                 rate_per_sec: float = config.CRAWL_RATE_PER_HOST, session=None,
+                 journal: CrawlJournal | None = None, resume: bool = False,
+                 snapshot_store: MenuSnapshotStore | None = None,
+                 circuit_max_wait: float = config.CRAWL_CIRCUIT_MAX_WAIT_SEC,
+                 toppings_mode: str = TOPPINGS_INLINE, sinks: list[MenuSink] | None = None):
+        all_codes = list(vendor_codes)
+        self.journal = journal
+        self.snapshot_store = snapshot_store
+        self.resume = resume and journal is not None
+        self.vendor_codes = journal.pending(all_codes) if self.resume else all_codes
+        self.output_path = Path(output_path)
+        self.toppings_mode = toppings_mode
+        self.catalog_path = self.output_path.with_suffix(".toppings.jsonl")
+        self._catalog_file = None
+        self.sinks = list(sinks or [])
+        self.max_workers = max(1, max_workers)
+        self.session = session # None: each scraper uses the shared session, created on first threaded fetch
+        self.rate_limiter = HostRateLimiter(rate_per_sec)
+        self.guard = get_upstream_guard()
+        self.circuit_max_wait = circuit_max_wait
+        self.host = urlparse(config.BASE_URL).netloc
+        self.logger = configure_logging()
+        self.stats = {"total": len(self.vendor_codes), "ok": 0, "empty": 0, "failed": 0, "items": 0}
+        if snapshot_store is not None:
+            self.stats["menus_changed"] = 0
+        if self.resume:
+            self.stats["skipped"] = len(set(all_codes)) - len(self.vendor_codes)
+
+    def crawl_one(self, code: str) -> tuple[str, str, ScrapeResult | None, str | None]:
+        """Fetches and parses one vendor. Returns (code, status, result, error).
+
+        status is 'ok', 'empty', or the scraper's last_error_kind / 'parse_error'.
+        """
+        # Crawls want fresh data and would only churn the interactive cache
+        scraper = VendorMenuFastScraper(vendor_code=code, session=self.session, use_cache=False)
+        self.rate_limiter.acquire(self.host)
+        data = scraper.fetch_vendor_json(scraper.vendor_code)
+        waited = 0.0
+        while data is None and scraper.last_error_kind == "circuit_open":
+            pause = self.circuit_pause(waited)
+            if pause is None:
+                break
+            time.sleep(pause)
+            waited += pause
+            data = scraper.fetch_vendor_json(scraper.vendor_code)
+        if data is None:
+            return code, scraper.last_error_kind or "failed", None, scraper.last_error_message
+        try:
+            result = scraper.parse_menu(data, scraper.vendor_code)
+        except Exception as e:
+            return code, "parse_error", None, f"Failed to parse menu for {code}: {e}"
+        return code, ("ok" if result else "empty"), result, None
+
+    def circuit_pause(self, waited: float) -> float | None:
+        """Seconds to sleep before retrying a vendor the open circuit refused, or None once circuit_max_wait is spent."""
+        if waited >= self.circuit_max_wait:
+            return None
+        # Jittered so waiting workers don't all return at the moment the circuit half-opens
+        pause = max(self.guard.breaker.retry_in(), 0.5) + random.uniform(0, 1.0)
+        return min(pause, self.circuit_max_wait - waited)
+
+    def record_snapshot(self, result: ScrapeResult):
+        try:
+            if self.snapshot_store.record(result)["created"]:
+                self.stats["menus_changed"] += 1
+        except Exception as e:
+            self.logger.error(f"Could not record menu snapshot for {result.vendor_code}: {e}", exc_info=True)
+
+    def _open_output(self):
+        """Opens the output CSV (appending on resume) and returns (file, csv writer)."""
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        append = self.resume and self.output_path.is_file() and self.output_path.stat().st_size > 0
+        f = open(self.output_path, "a" if append else "w", newline="", encoding="utf-8" if append else "utf-8-sig")
+        # Rows are written straight from each ScrapeResult's shared vendor_info + item rows
+        writer = csv.writer(f, quoting=csv.QUOTE_MINIMAL)
+        if not append:
+            writer.writerow(config.EXPECTED_MERGED_ITEM_DATA_COLS)
+        return f, writer
+
+    def _open_catalog(self):
+        """Opens the topping catalog sidecar in catalog mode; returns a context manager that closes it."""
+        if self.toppings_mode != TOPPINGS_CATALOG:
+            return contextlib.nullcontext()
+        append = self.resume and self.catalog_path.is_file()
+        self._catalog_file = open(self.catalog_path, "a" if append else "w", encoding="utf-8")
+        return self._catalog_file
+
+    def _open_sinks(self):
+        """Context manager that writes the sinks' last batches and closes them when the crawl ends."""
+        stack = contextlib.ExitStack()
+        for sink in self.sinks:
+            stack.enter_context(sink)
+        return stack
+
+    def write_sinks(self, result: ScrapeResult):
+        for sink in self.sinks:
+            try:
+                sink.write(result)
+            except Exception as e:
+                self.logger.error(f"Could not write {result.vendor_code} to {type(sink).__name__}: {e}", exc_info=True)
+
+    def write_catalog(self, result: ScrapeResult):
+        # Group bodies are already compact JSON, so the line is spliced rather than re-encoded
+        groups = ",".join(f'"{group_id}":{body}' for group_id, body in result.topping_groups.items())
+        self._catalog_file.write(f'{{"vendor_code":{json.dumps(result.vendor_code, ensure_ascii=False)},'
+                                 f'"topping_groups":{{{groups}}}}}\n')
+        self._catalog_file.flush()
+
+    def handle_outcome(self, f, writer, code: str, status: str, result: ScrapeResult | None, error: str | None):
+        """Counts one vendor outcome, streams its rows, then snapshots and journals it."""
+        if status in ("ok", "empty"):
+            self.stats[status] += 1
+        else:
+            self.stats["failed"] += 1
+        item_count = len(result) if result is not None else 0
+        if item_count:
+            if self._catalog_file is not None and result.topping_groups:
+                self.write_catalog(result)
+            writer.writerows(result.iter_values(config.EXPECTED_MERGED_ITEM_DATA_COLS, self.toppings_mode))
+            f.flush()
+            self.stats["items"] += item_count
+        elif error:
+            self.logger.warning(f"Vendor {code} failed ({status}): {error}")
+        if result is not None and self.sinks:
+            self.write_sinks(result)
+        if result is not None and self.snapshot_store is not None:
+            self.record_snapshot(result)
+        # Journal only after the rows are flushed, so 'ok' always means 'on disk'
+        if self.journal is not None:
+            self.journal.record(code, status, item_count=item_count, error=error)
+
+        self._done += 1
+        if self._done % 100 == 0:
+            elapsed = time.perf_counter() - self._started
+            self.logger.info(f"Progress: {self._done}/{self.stats['total']} vendors ({self._done / elapsed:.1f} vendors/s, "
+                             f"upstream limit {self.guard.limiter.rate:.1f} req/s, circuit {self.guard.breaker.status})")
+
+    def _finish(self) -> dict:
+        elapsed = time.perf_counter() - self._started
+        self.stats["elapsed_sec"] = round(elapsed, 2)
+        self.stats["vendors_per_sec"] = round(self._done / elapsed, 2) if elapsed else 0.0
+        self.stats["upstream"] = self.guard.state()
+        if self.sinks:
+            self.stats["sinks"] = {type(sink).__name__: dict(sink.stats) for sink in self.sinks}
+        self.logger.info(f"✅ Bulk crawl finished: {self.stats}")
+        return self.stats
+
+    def run(self) -> dict:
+        """Runs the crawl and returns summary stats, including vendors/sec throughput."""
+        self.logger.info(f"Bulk crawl of {len(self.vendor_codes)} vendors with {self.max_workers} workers -> {self.output_path}")
+        self._started = time.perf_counter()
+        self._done = 0
+        pending_codes = iter(self.vendor_codes)
+
+        f, writer = self._open_output()
+        with f, self._open_catalog(), self._open_sinks(), ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            # Keep a bounded window of in-flight vendors so results never pile up in memory
+            in_flight = set()
+            future_codes = {}
+            for code in pending_codes:
+                future = pool.submit(self.crawl_one, code)
+                future_codes[future] = code
+                in_flight.add(future)
+                if len(in_flight) >= self.max_workers * 2:
+                    break
+
+            while in_flight:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    try:
+                        code, status, result, error = future.result()
+                    except Exception as e:
+                        self.logger.error(f"Unexpected crawler error: {e}", exc_info=True)
+                        code, status, result, error = future_codes[future], "unexpected_error", None, str(e)
+                    future_codes.pop(future, None)
+                    self.handle_outcome(f, writer, code, status, result, error)
+
+                    next_code = next(pending_codes, None)
+                    if next_code is not None:
+                        future = pool.submit(self.crawl_one, next_code)
+                        future_codes[future] = next_code
+                        in_flight.add(future)
+
+        return self._finish()
+
+
+class AsyncBulkMenuCrawler(BulkMenuCrawler):
+    """BulkMenuCrawler on asyncio/httpx: max_workers vendors in flight on one event loop, no thread each.
+
+    Output, journal, snapshots and stats are identical to the threaded crawler.
+    """
+
+    def __init__(self, vendor_codes, output_path: Path, max_workers: int = config.ASYNC_MAX_CONCURRENCY, **kwargs):
+        super().__init__(vendor_codes, output_path, max_workers=max_workers, **kwargs)
+
+    async def crawl_one_async(self, client, code: str) -> tuple[str, str, ScrapeResult | None, str | None]:
+        """Async crawl_one: same statuses and errors."""
+        scraper = AsyncVendorMenuScraper(vendor_code=code, client=client, use_cache=False)
+        delay = self.rate_limiter.reserve(self.host)
+        if delay:
+            await asyncio.sleep(delay)
+        data = await scraper.fetch_vendor_json(scraper.vendor_code)
+        waited = 0.0
+        while data is None and scraper.last_error_kind == "circuit_open":
+            pause = self.circuit_pause(waited)
+            if pause is None:
+                break
+            await asyncio.sleep(pause)
+            waited += pause
+            data = await scraper.fetch_vendor_json(scraper.vendor_code)
+        if data is None:
+            return code, scraper.last_error_kind or "failed", None, scraper.last_error_message
+        try:
+            result = await asyncio.to_thread(scraper.parse_menu, data, scraper.vendor_code)
+        except Exception as e:
+            return code, "parse_error", None, f"Failed to parse menu for {code}: {e}"
+        return code, ("ok" if result else "empty"), result, None
+
+    async def _run_async(self):
+        pending_codes = iter(self.vendor_codes)
+        f, writer = self._open_output()
+        async with build_async_client(self.max_workers) as client:
+            with f, self._open_catalog(), self._open_sinks():
+                tasks = {}
+                for code in itertools.islice(pending_codes, self.max_workers):
+                    tasks[asyncio.create_task(self.crawl_one_async(client, code))] = code
+                while tasks:
+                    finished, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    for task in finished:
+                        code = tasks.pop(task)
+                        try:
+                            code, status, result, error = task.result()
+                        except Exception as e:
+                            self.logger.error(f"Unexpected crawler error: {e}", exc_info=True)
+                            status, result, error = "unexpected_error", None, str(e)
+                        self.handle_outcome(f, writer, code, status, result, error)
+                        next_code = next(pending_codes, None)
+                        if next_code is not None:
+                            tasks[asyncio.create_task(self.crawl_one_async(client, next_code))] = next_code
+
+    def run(self) -> dict:
+        """Runs the crawl on a fresh event loop and returns the same summary stats as BulkMenuCrawler."""
+        self.logger.info(f"Async bulk crawl of {len(self.vendor_codes)} vendors, {self.max_workers} in flight -> {self.output_path}")
+        self._started = time.perf_counter()
+        self._done = 0
+        asyncio.run(self._run_async())
+        return self._finish()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-crawl Snappfood menus for every sf_code in matched_vendors.csv.")
+    parser.add_argument("--mapping", type=Path, default=config.MATCHED_VENDORS_CSV_PATH, help="CSV with an sf_code column.")
+    parser.add_argument("--output", type=Path, default=None, help="Output CSV (default: OUTPUT_DIR_MENU_SCRAPER/bulk_menu.csv).")
+    parser.add_argument("--workers", type=int, default=None,
+                        help=f"Maximum concurrent vendor fetches (default: {config.MAX_WORKERS}, or {config.ASYNC_MAX_CONCURRENCY} with --async).")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Crawl on the asyncio/httpx engine instead of a thread per in-flight vendor.")
+    parser.add_argument("--rate", type=float, default=config.CRAWL_RATE_PER_HOST, help="Maximum requests per second per host (0 = unlimited).")
+    parser.add_argument("--limit", type=int, default=None, help="Only crawl the first N codes.")
+    parser.add_argument("--journal", type=Path, default=config.CRAWL_JOURNAL_PATH,
+                        help="JSONL journal of per-vendor status; restarted (previous run kept as <journal>.prev) unless --resume.")
+    parser.add_argument("--resume", action="store_true", help="Skip vendors the journal marks as finished; retry only failures.")
+    parser.add_argument("--no-snapshots", action="store_true", help="Don't record menus in the snapshot store (MENU_SNAPSHOT_DB).")
+    parser.add_argument("--toppings", choices=[TOPPINGS_INLINE, TOPPINGS_CATALOG], default=config.MENU_TOPPINGS_MODE,
+                        help="'catalog' writes topping group IDs per row and each vendor's groups once to <output>.toppings.jsonl.")
+    parser.add_argument("--sink", dest="sinks", action="append", choices=list(SINK_TYPES), default=None,
+                        help="Also write menus to this analytics sink; repeatable (default: MENU_SINKS).")
+    parser.add_argument("--parquet-dir", type=Path, default=config.MENU_SINK_PARQUET_DIR, help="Root of the partitioned Parquet dataset.")
+    parser.add_argument("--sqlite-db", type=Path, default=config.MENU_SINK_SQLITE_DB, help="SQLite database for the sqlite sink.")
+    args = parser.parse_args(argv)
+
+    codes = load_sf_codes(args.mapping)
+    if args.limit:
+        codes = codes[:args.limit]
+    # A fresh crawl truncates the output, so it starts a fresh journal too (the old one is kept as .prev)
+    journal = CrawlJournal(args.journal, fresh=not args.resume)
+    if args.resume:
+        configure_logging().info(f"Resuming from {args.journal}: {journal.summary()}")
+    # A fixed default name lets a --resume run append to the file the crashed run left behind
+    output_path = args.output or config.OUTPUT_DIR_MENU_SCRAPER / "bulk_menu.csv"
+    crawler_class = AsyncBulkMenuCrawler if args.use_async else BulkMenuCrawler
+    sinks = build_sinks(config.MENU_SINKS if args.sinks is None else args.sinks,
+                        parquet_dir=args.parquet_dir, sqlite_db=args.sqlite_db)
+    workers = args.workers or (config.ASYNC_MAX_CONCURRENCY if args.use_async else config.MAX_WORKERS)
+    stats = crawler_class(codes, output_path, max_workers=workers, rate_per_sec=args.rate,
+                          journal=journal, resume=args.resume, toppings_mode=args.toppings, sinks=sinks,
+                          snapshot_store=None if args.no_snapshots else get_menu_store()).run()
+    return 0 if stats["ok"] or not stats["total"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,10 +12,84 @@ OUTPUT_DIR_MENU_SCRAPER = Path(os.getenv("OUTPUT_DIR_MENU_SCRAPER", "./output"))
 
 # Retry and concurrency settings
 MAX_RETRIES = int(os.getenv("MAX_RETRIES", "3"))
-MAX_WORKERS = int(os.getenv("MAX_WORKERS", "30")) # Not actively used in current single scrape version
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", "30")) # Sizes the shared HTTP connection pool
+RETRY_BACKOFF_FACTOR = float(os.getenv("RETRY_BACKOFF_FACTOR", "1.5")) # urllib3 exponential backoff factor (seconds)
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504) # Upstream statuses worth retrying
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "20")) # Per-attempt timeout (seconds)
+
+# Connection pooling for the shared keep-alive session (Snappfood)
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", str(MAX_WORKERS)))
+
+# Snappfood API protection (upstream_guard.py): process-wide adaptive token bucket and circuit breaker,
+# applied to every attempt (retries included) from the app, the async engine and bulk crawls
+SF_RATE_LIMIT_PER_SEC = float(os.getenv("SF_RATE_LIMIT_PER_SEC", "20")) # Rate the limiter starts at and recovers to, 0 disables it
+SF_RATE_LIMIT_MIN_PER_SEC = float(os.getenv("SF_RATE_LIMIT_MIN_PER_SEC", "1")) # Floor it backs off to under 429s/5xx/timeouts
+SF_RATE_LIMIT_BURST = float(os.getenv("SF_RATE_LIMIT_BURST", "10")) # Bucket size (requests allowed back to back)
+SF_RATE_LIMIT_ERROR_RATIO = float(os.getenv("SF_RATE_LIMIT_ERROR_RATIO", "0.2")) # 5xx/timeout share of recent attempts that cuts the rate
+SF_BREAKER_FAILURE_RATIO = float(os.getenv("SF_BREAKER_FAILURE_RATIO", "0.5")) # 5xx/timeout share that opens the circuit, 0 disables it
+SF_BREAKER_MIN_CALLS = int(os.getenv("SF_BREAKER_MIN_CALLS", "20")) # Attempts in the window before the ratio counts
+SF_BREAKER_WINDOW_SEC = float(os.getenv("SF_BREAKER_WINDOW_SEC", "30"))
+SF_BREAKER_OPEN_SEC = float(os.getenv("SF_BREAKER_OPEN_SEC", "10")) # First open period; doubles (jittered) per consecutive trip
+SF_BREAKER_MAX_OPEN_SEC = float(os.getenv("SF_BREAKER_MAX_OPEN_SEC", "300"))
+
+# Snappfood vendor JSON cache (response_cache.py)
+SF_CACHE_TTL_SEC = float(os.getenv("SF_CACHE_TTL_SEC", "120")) # Seconds a payload is served without revalidation, 0 disables the cache
+SF_CACHE_MAX_ENTRIES = int(os.getenv("SF_CACHE_MAX_ENTRIES", "256")) # In-memory LRU size (vendors)
+SF_CACHE_DISK_ENABLED = os.getenv("SF_CACHE_DISK_ENABLED", "0").lower() in ("1", "true", "yes")
+SF_CACHE_DIR = Path(os.getenv("SF_CACHE_DIR", str(DATA_DIR / "sf_cache")))
+
+# Vendor JSON decoder: "auto" uses orjson when installed, "json" forces the stdlib decoder
+SF_JSON_BACKEND = os.getenv("SF_JSON_BACKEND", "auto").lower()
+
+# Bulk crawl (bulk_crawl.py) politeness limit
+CRAWL_RATE_PER_HOST = float(os.getenv("CRAWL_RATE_PER_HOST", "10")) # Max requests/sec per host, 0 disables
+CRAWL_CIRCUIT_MAX_WAIT_SEC = float(os.getenv("CRAWL_CIRCUIT_MAX_WAIT_SEC", "900")) # How long a crawl waits out an open circuit per vendor before failing it
+CRAWL_JOURNAL_PATH = Path(os.getenv("CRAWL_JOURNAL_PATH", str(OUTPUT_DIR_MENU_SCRAPER / "crawl_journal.jsonl"))) # Per-vendor status log for --resume
+
+# Async scrape engine (async_scrape.py, needs httpx): SF fetches for /scrape and /scrape/batch run on one event loop
+SF_ASYNC_ENGINE = os.getenv("SF_ASYNC_ENGINE", "0").lower() in ("1", "true", "yes")
+ASYNC_MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", "200")) # httpx pool size
+ASYNC_CLIENT_SHARD_SIZE = int(os.getenv("ASYNC_CLIENT_SHARD_SIZE", "16")) # Connections per httpx client shard
+ASYNC_MAX_CONCURRENCY = int(os.getenv("ASYNC_MAX_CONCURRENCY", "200")) # Vendors in flight on the engine (and default for bulk_crawl --async)
+ASYNC_BATCH_LOOKAHEAD = int(os.getenv("ASYNC_BATCH_LOOKAHEAD", "64")) # /scrape/batch identifiers whose SF fetch starts ahead of processing
+
+# Menu snapshot store (menu_store.py): content-addressed history of scraped menus for change diffs
+MENU_SNAPSHOTS_ENABLED = os.getenv("MENU_SNAPSHOTS_ENABLED", "1").lower() in ("1", "true", "yes")
+MENU_SNAPSHOT_DB = Path(os.getenv("MENU_SNAPSHOT_DB", str(OUTPUT_DIR_MENU_SCRAPER / "menu_snapshots.sqlite")))
+# Also snapshot menus fetched by /scrape. Off by default: each fetch then hashes every item and runs a
+# SQLite write transaction (serialized across requests) before the response is sent
+MENU_SNAPSHOTS_ON_REQUEST = os.getenv("MENU_SNAPSHOTS_ON_REQUEST", "0").lower() in ("1", "true", "yes")
+
+# Analytics sinks (menu_sinks.py) fed by vendor_scrape runs and bulk crawls next to the CSV output:
+# comma-separated "parquet" (needs pyarrow) and/or "sqlite", empty for none
+MENU_SINKS = [name.strip().lower() for name in os.getenv("MENU_SINKS", "").split(",") if name.strip()]
+MENU_SINK_PARQUET_DIR = Path(os.getenv("MENU_SINK_PARQUET_DIR", str(OUTPUT_DIR_MENU_SCRAPER / "menus_parquet"))) # Partitioned by crawl_date/business_line
+MENU_SINK_SQLITE_DB = Path(os.getenv("MENU_SINK_SQLITE_DB", str(OUTPUT_DIR_MENU_SCRAPER / "menus.sqlite")))
+MENU_SINK_BATCH_ROWS = int(os.getenv("MENU_SINK_BATCH_ROWS", "50000")) # Rows a sink buffers before writing a batch
+
+# Prometheus-style /metrics and per-stage timings (metrics.py); when off, instrumentation calls return immediately
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+
+# Offline benchmark suite (benchmark.py): one JSON line per run, compared against earlier runs
+BENCHMARK_RESULTS_PATH = Path(os.getenv("BENCHMARK_RESULTS_PATH", str(OUTPUT_DIR_MENU_SCRAPER / "benchmarks.jsonl")))
+
+# Topping groups in menu output: "inline" repeats each group's JSON in every row's product_toppings,
+# "catalog" stores each distinct group once per vendor (keyed by content hash) and rows list group IDs
+MENU_TOPPINGS_MODE = os.getenv("MENU_TOPPINGS_MODE", "inline").lower()
+
+# Category-paged menus (/scrape format=index, menu_pages.py): menus with more than MENU_PAGE_MIN_ITEMS items
+# are sent as a category index and each category's items are fetched from /menu/<menu_id>/categories/<position>
+MENU_PAGE_MIN_ITEMS = int(os.getenv("MENU_PAGE_MIN_ITEMS", "300")) # Smaller menus come back whole, as in format=json
+MENU_PAGE_CACHE_ENTRIES = int(os.getenv("MENU_PAGE_CACHE_ENTRIES", "64")) # Paged menus kept for category fetches (LRU)
+MENU_PAGE_CACHE_MAX_ITEMS = int(os.getenv("MENU_PAGE_CACHE_MAX_ITEMS", "100000")) # ...and at most this many items across them
+MENU_PAGE_TTL_SEC = float(os.getenv("MENU_PAGE_TTL_SEC", "3600")) # How long a menu_id stays valid
+
+# /scrape/batch (NDJSON streaming) limits
+BATCH_MAX_IDENTIFIERS = int(os.getenv("BATCH_MAX_IDENTIFIERS", "500")) # Identifiers accepted per request
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8")) # Vendors in flight per batch (and batch worker threads)
 
 # API endpoint for dynamic restaurant details (Snappfood)
-BASE_URL = "https://snappfood.ir/mobile/v2/restaurant/details/dynamic"
+BASE_URL = os.getenv("SNAPPFOOD_BASE_URL", "https://snappfood.ir/mobile/v2/restaurant/details/dynamic") # Override to point at a local stub
 
 # Default geographic/location constants (use environment variables to override)
 DEFAULT_LAT = os.getenv("DEFAULT_LAT", "35.6892")      # default to Tehran latitude
@@ -62,6 +136,22 @@ TF_MENU_CSV_PATH = Path(os.getenv("TF_MENU_CSV_PATH", "./tf_menu.csv"))
 TF_INFO_CSV_PATH = Path(os.getenv("TF_INFO_CSV_PATH", "./tf_info.csv"))
 MATCHED_VENDORS_CSV_PATH = Path(os.getenv("MATCHED_VENDORS_CSV_PATH", "./matched_vendors.csv"))
 
+# Columnar (Feather) cache of the TapsiFood CSVs, written next to them (needs pyarrow)
+TF_COLUMNAR_CACHE_ENABLED = os.getenv("TF_COLUMNAR_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+TF_MENU_CATEGORY_COLS = ["vendor_code", "category_id", "category_name"] # Highly repeated columns stored as categories
+TF_INFO_CATEGORY_COLS = ["business_line", "marketing_area"]
+
+# Cross-platform price comparison (price_compare.py)
+PRICE_COMPARISON_DB = Path(os.getenv("PRICE_COMPARISON_DB", str(OUTPUT_DIR_MENU_SCRAPER / "price_comparison.sqlite")))
+PRICE_MATCH_MIN_SIMILARITY = float(os.getenv("PRICE_MATCH_MIN_SIMILARITY", "0.6")) # Trigram Jaccard for fuzzy item matches
+PRICE_MATCH_MAX_BLOCK_PAIRS = int(os.getenv("PRICE_MATCH_MAX_BLOCK_PAIRS", "2500")) # Skip blocks whose SF x TF candidates exceed this
+
+# Hot reload of tf_menu/tf_info/matched_vendors: seconds between file change checks, 0 disables the watcher
+DATA_RELOAD_INTERVAL_SEC = float(os.getenv("DATA_RELOAD_INTERVAL_SEC", "30"))
+# POST /admin/reload requires this value in the X-Admin-Token header; when empty, only localhost may call it
+# (set a token when running behind a reverse proxy, where every request looks local)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
 
 # Define expected columns for consistency for the frontend (merged CSV item rows).
 # We'll try to make Tapsifood data conform to this.
@@ -83,6 +173,13 @@ EXPECTED_MERGED_ITEM_DATA_COLS = [
     "product_toppings"
 ]
 
+# Per-item columns of a menu row; every other merged column is vendor-level and identical
+# across a vendor's rows, so the columnar /scrape format sends those once per vendor.
+MENU_ITEM_COLS = [
+    "category_id", "category_name", "item_id", "item_title", "product_title",
+    "item_variation", "description", "price", "rating", "product_toppings"
+]
+
 # Define expected keys for the `vendor_info` object passed to frontend
 # This is usually the first row of the platform's CSV.
 EXPECTED_VENDOR_INFO_KEYS = [
@@ -0,0 +1,86 @@
+# crawl_journal.py
+import json
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+# Statuses that end a vendor's crawl: a --resume run skips them. Everything else
+# (timeout, http_error, network_error, decode_error, parse_error, ...) is retried.
+TERMINAL_STATUSES = {"ok", "empty", "not_found"}
+
+
+class CrawlJournal:
+    """Append-only JSONL journal of per-vendor crawl outcomes.
+
+    Each line is one attempt: {"vendor_code", "status", "attempt", "item_count",
+    "error", "ts", "last_success"}. Replaying the file gives the latest state per
+    vendor, so a crashed crawl can resume without redoing finished vendors.
+
+    The journal describes one crawl and the output it wrote. A fresh (non-resume)
+    crawl opens it with fresh=True: an earlier run's file is moved to
+    <name>.prev so its 'ok' entries can't make a later --resume skip vendors
+    whose rows are no longer in the output.
+    """
+
+    def __init__(self, path: Path, fresh: bool = False):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        if fresh:
+            self._rotate()
+        self.state = self._replay()
+
+    def _rotate(self):
+        if self.path.is_file():
+            self.path.replace(self.path.with_name(self.path.name + ".prev"))
+
+    def _replay(self) -> dict[str, dict]:
+        state = {}
+        if not self.path.is_file():
+            return state
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash mid-write can leave a torn last line; skip it
+                    continue
+                code = entry.get("vendor_code")
+                if code:
+                    state[code] = entry
+        return state
+
+    def record(self, vendor_code: str, status: str, item_count: int = 0, error: str | None = None) -> dict:
+        """Appends one attempt for vendor_code and returns the new journal entry."""
+        with self._lock:
+            previous = self.state.get(vendor_code, {})
+            now = time.strftime("%Y-%m-%dT%H:%M:%S")
+            entry = {
+                "vendor_code": vendor_code,
+                "status": status,
+                "attempt": previous.get("attempt", 0) + 1,
+                "item_count": item_count,
+                "error": error,
+                "ts": now,
+                "last_success": now if status in ("ok", "empty") else previous.get("last_success"),
+            }
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.state[vendor_code] = entry
+            return entry
+
+    def completed_codes(self) -> set[str]:
+        return {code for code, entry in self.state.items() if entry.get("status") in TERMINAL_STATUSES}
+
+    def pending(self, vendor_codes) -> list[str]:
+        """Filters vendor_codes down to those without a terminal status (order kept)."""
+        completed = self.completed_codes()
+        return [code for code in vendor_codes if code not in completed]
+
+    def summary(self) -> dict[str, int]:
+        """Counts vendors by their latest status."""
+        return dict(Counter(entry.get("status", "unknown") for entry in self.state.values()))
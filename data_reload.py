@@ -0,0 +1,203 @@
+# data_reload.py
+import logging
+import threading
+import time
+from pathlib import Path
+
+
+class DataSource:
+    """A file-backed dataset: loader(path) -> value, and the value to use if nothing ever loaded."""
+
+    def __init__(self, name: str, path: Path, loader, empty_factory):
+        self.name = name
+        self.path = Path(path)
+        self.loader = loader
+        self.empty_factory = empty_factory
+
+    def stamp(self):
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+
+
+class DataSnapshot:
+    """Immutable bundle of every loaded dataset.
+
+    Requests grab the current snapshot once and read only from it, so a reload
+    (which builds a new snapshot and swaps one reference) can never expose a
+    half-loaded state.
+    """
+
+    __slots__ = ("parts", "stamps", "generation", "loaded_at")
+
+    def __init__(self, parts: dict, stamps: dict, generation: int):
+        self.parts = parts
+        self.stamps = stamps
+        self.generation = generation
+        self.loaded_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+    def __getitem__(self, name):
+        return self.parts[name]
+
+
+class DataReloader:
+    """Owns the current DataSnapshot and rebuilds it off the request path.
+
+    Reloads are incremental per source: only files whose size/mtime changed are
+    re-read, unchanged parts are carried over from the previous snapshot. A
+    failed load keeps the previous value and remembers the file's stamp, so that
+    version is not retried (or logged again) until the file changes once more or
+    a forced reload asks for it. At most one rebuild runs at a time.
+
+    The watcher only reloads a file once its stamp has settled, i.e. it is the
+    same on two consecutive polls, so a file that is still being copied in is
+    not loaded half-written.
+    """
+
+    def __init__(self, sources: list[DataSource], logger: logging.Logger | None = None):
+        self.sources = sources
+        self.logger = logger or logging.getLogger(__name__)
+        self._snapshot = None
+        self._rebuild_lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
+        self._failed_stamps = {} # source name -> stamp whose load failed
+        self._seen_stamps = {} # source name -> changed stamp seen on the watcher's previous poll
+        self.last_reload = {"status": "never", "changed": [], "seconds": 0.0, "finished_at": None}
+
+    @property
+    def snapshot(self) -> DataSnapshot:
+        return self._snapshot
+
+    def load_initial(self) -> DataSnapshot:
+        return self.reload(force=True)
+
+    def changed_sources(self) -> list[str]:
+        """Sources whose file differs from the loaded one, excluding versions that already failed to load."""
+        previous = self._snapshot
+        if previous is None:
+            return [source.name for source in self.sources]
+        return [name for name, _ in self._changed_stamps(previous)]
+
+    def settled_changes(self) -> list[str]:
+        """Changed sources whose stamp is the same as on the previous call (the watcher's settle check)."""
+        previous = self._snapshot
+        if previous is None:
+            return [source.name for source in self.sources]
+        current = dict(self._changed_stamps(previous))
+        settled = [name for name, stamp in current.items() if self._seen_stamps.get(name) == stamp]
+        self._seen_stamps = current
+        return settled
+
+    def _changed_stamps(self, previous: DataSnapshot) -> list[tuple]:
+        changed = []
+        for source in self.sources:
+            stamp = source.stamp()
+            if stamp != previous.stamps.get(source.name) and stamp != self._failed_stamps.get(source.name, ()):
+                changed.append((source.name, stamp))
+        return changed
+
+    def reload(self, force: bool = False, only: list[str] | None = None) -> DataSnapshot:
+        """Rebuilds changed sources (all of them if force) and swaps the new snapshot in.
+
+        With `only`, other sources keep their current value even if their files changed.
+        """
+        with self._rebuild_lock:
+            return self._rebuild(force, only)
+
+    def _rebuild(self, force: bool, only: list[str] | None) -> DataSnapshot:
+        """reload() with _rebuild_lock already held."""
+        started = time.perf_counter()
+        previous = self._snapshot
+        parts, stamps, changed = {}, {}, []
+        for source in self.sources:
+            stamp = source.stamp()
+            if previous is not None and (
+                    (only is not None and source.name not in only)
+                    or (not force and stamp in (previous.stamps.get(source.name), self._failed_stamps.get(source.name, ())))):
+                parts[source.name] = previous.parts[source.name]
+                stamps[source.name] = previous.stamps.get(source.name)
+                continue
+            try:
+                parts[source.name] = source.loader(source.path)
+                if source.stamp() != stamp:
+                    raise RuntimeError("file changed while it was being read")
+                stamps[source.name] = stamp
+                changed.append(source.name)
+                self._failed_stamps.pop(source.name, None)
+            except Exception as e:
+                self.logger.error(f"Reload of '{source.name}' from {source.path} failed: {e}", exc_info=True)
+                self._failed_stamps[source.name] = stamp
+                if previous is not None:
+                    parts[source.name] = previous.parts[source.name]
+                    stamps[source.name] = previous.stamps.get(source.name)
+                else:
+                    parts[source.name] = source.empty_factory()
+                    stamps[source.name] = None
+
+        if previous is not None and not changed:
+            self.last_reload = {"status": "unchanged", "changed": [], "seconds": round(time.perf_counter() - started, 3),
+                                "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+            return previous
+
+        snapshot = DataSnapshot(parts, stamps, (previous.generation + 1) if previous else 1)
+        self._snapshot = snapshot # Single reference assignment: the atomic swap
+        elapsed = time.perf_counter() - started
+        self.last_reload = {"status": "ok", "changed": changed, "seconds": round(elapsed, 3),
+                            "finished_at": snapshot.loaded_at}
+        self.logger.info(f"Data snapshot #{snapshot.generation} ready in {elapsed:.2f}s (reloaded: {', '.join(changed)}).")
+        return snapshot
+
+    def reload_in_background(self, force: bool = False) -> bool:
+        """Starts a rebuild on a worker thread. Returns False if one is already running."""
+        # Taking the lock here, not in the worker, means concurrent callers can't both start a rebuild
+        if not self._rebuild_lock.acquire(blocking=False):
+            return False
+
+        def rebuild():
+            try:
+                self._rebuild(force, None)
+            except Exception as e:
+                self.logger.error(f"Background data reload failed: {e}", exc_info=True)
+            finally:
+                self._rebuild_lock.release()
+
+        try:
+            threading.Thread(target=rebuild, name="data-reload", daemon=True).start()
+        except BaseException:
+            self._rebuild_lock.release()
+            raise
+        return True
+
+    def start_watcher(self, interval_sec: float):
+        """Polls the source files every interval_sec and reloads the ones that changed and have settled."""
+        if interval_sec <= 0 or self._watcher is not None:
+            return
+
+        def watch():
+            while not self._stop.wait(interval_sec):
+                try:
+                    settled = self.settled_changes()
+                    if settled:
+                        self.reload(only=settled)
+                except Exception as e:
+                    self.logger.error(f"Data watcher error: {e}", exc_info=True)
+
+        self._watcher = threading.Thread(target=watch, name="data-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
+
+    def status(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "generation": snapshot.generation if snapshot else 0,
+            "loaded_at": snapshot.loaded_at if snapshot else None,
+            "reloading": self._rebuild_lock.locked(),
+            "last_reload": self.last_reload,
+            "failed": {name: list(stamp) if stamp else None for name, stamp in self._failed_stamps.items()},
+            "sources": {source.name: str(source.path) for source in self.sources},
+        }
@@ -0,0 +1,114 @@
+# menu_pages.py
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import config
+from menu_payload import TOPPINGS_INLINE, split_menu_by_category
+
+
+class MenuPageStore:
+    """Thread-safe LRU + TTL store of menus split into per-category pages.
+
+    /scrape with format=index answers large menus with put()'s category index;
+    the editor then fetches each category's items by position with page().
+    The store is bounded by entry count and by the total items held. Earlier
+    menu_ids of a vendor stay servable until those bounds or the TTL drop them,
+    since another editor may still be paging through one; storing the same
+    pages again for a (platform, vendor, toppings mode) reuses its menu_id.
+    """
+
+    def __init__(self, max_entries: int = config.MENU_PAGE_CACHE_ENTRIES, ttl: float = config.MENU_PAGE_TTL_SEC,
+                 max_items: int = config.MENU_PAGE_CACHE_MAX_ITEMS):
+        self.max_entries = max(1, max_entries)
+        self.max_items = max(1, max_items)
+        self.ttl = ttl
+        self._entries = OrderedDict() # menu_id -> (stored_at, pages, item_count, key)
+        self._menu_ids = {} # (platform, vendor_code, toppings_mode) -> latest menu_id
+        self._items = 0
+        self._lock = threading.Lock()
+        self.counters = {"stores": 0, "reused": 0, "page_hits": 0, "page_misses": 0, "evictions": 0}
+
+    def put(self, platform: str, vendor_code: str, menu: dict, toppings_mode: str = TOPPINGS_INLINE) -> dict:
+        """Stores the menu's category pages and returns the index payload sent in its place."""
+        categories, pages = split_menu_by_category(menu)
+        key = (platform, vendor_code, toppings_mode) # Only format=index menus are stored
+        with self._lock:
+            now = time.monotonic()
+            menu_id = self._menu_ids.get(key)
+            entry = self._entries.get(menu_id) if menu_id is not None else None
+            if entry is not None and now - entry[0] < self.ttl and entry[1] == pages:
+                # Unchanged menu: keep serving the id earlier responses handed out
+                self._entries[menu_id] = (now, entry[1], entry[2], key)
+                self._entries.move_to_end(menu_id)
+                self.counters["reused"] += 1
+            else:
+                menu_id = uuid.uuid4().hex
+                self._entries[menu_id] = (now, pages, menu["item_count"], key)
+                self._menu_ids[key] = menu_id
+                self._items += menu["item_count"]
+                self.counters["stores"] += 1
+                # The newest menu always stays, even if it alone is over max_items
+                while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._items > self.max_items):
+                    self._remove(next(iter(self._entries)))
+                    self.counters["evictions"] += 1
+        return {
+            "vendor": menu["vendor"],
+            "headers": menu["headers"],
+            "item_count": menu["item_count"],
+            "menu_id": menu_id,
+            "platform": platform,
+            "vendor_code": vendor_code,
+            "categories": [{**category, "position": pos} for pos, category in enumerate(categories)],
+            "expires_in_sec": self.ttl,
+        }
+
+    def page(self, menu_id: str, position: int) -> dict | None:
+        """One category's page, or None if the menu is unknown/expired or the position is out of range."""
+        with self._lock:
+            entry = self._entries.get(menu_id)
+            if entry is not None and time.monotonic() - entry[0] >= self.ttl:
+                self._remove(menu_id)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(menu_id)
+            pages = entry[1] if entry is not None else None
+            found = pages is not None and 0 <= position < len(pages)
+            self.counters["page_hits" if found else "page_misses"] += 1
+        return pages[position] if found else None
+
+    def _remove(self, menu_id: str) -> bool:
+        entry = self._entries.pop(menu_id, None)
+        if entry is None:
+            return False
+        self._items -= entry[2]
+        if self._menu_ids.get(entry[3]) == menu_id:
+            del self._menu_ids[entry[3]]
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries, "items": self._items,
+                    "max_items": self.max_items, "ttl_sec": self.ttl, **self.counters}
+
+
+_menu_page_store = None
+_menu_page_store_lock = threading.Lock()
+
+
+def get_menu_page_store() -> MenuPageStore:
+    """Returns the process-wide menu page store, creating it on first use."""
+    global _menu_page_store
+    if _menu_page_store is None:
+        with _menu_page_store_lock:
+            if _menu_page_store is None:
+                _menu_page_store = MenuPageStore()
+    return _menu_page_store
+
+
+def paged_menu(platform: str, vendor_code: str, menu: dict, toppings_mode: str = TOPPINGS_INLINE) -> dict:
+    """The category index for menus above MENU_PAGE_MIN_ITEMS items; smaller menus are returned whole."""
+    if menu["item_count"] <= config.MENU_PAGE_MIN_ITEMS:
+        return menu
+    return get_menu_page_store().put(platform, vendor_code, menu, toppings_mode)
@@ -0,0 +1,123 @@
+# menu_payload.py
+import hashlib
+import json
+
+import config
+
+# Response formats understood by /scrape
+MENU_FORMAT_CSV = "csv"         # BOM-prefixed CSV string per platform (original format)
+MENU_FORMAT_COLUMNAR = "json"   # Column-oriented JSON, vendor block sent once
+MENU_FORMAT_INDEX = "index"     # Columnar, but large menus send a category index and items per category (menu_pages.py)
+MENU_FORMAT_MEDIA_TYPE = "application/vnd.menu.columnar+json"
+
+# How topping groups are carried (see config.MENU_TOPPINGS_MODE)
+TOPPINGS_INLINE = "inline"      # Full group JSON in every row's product_toppings (original format)
+TOPPINGS_CATALOG = "catalog"    # Rows hold group IDs; each distinct group is sent once in topping_groups
+
+
+def negotiate_menu_format(req, body: dict | None = None) -> str:
+    """Picks the /scrape menu format from ?format=, the JSON body's "format", or the Accept header."""
+    requested = (req.args.get("format") or (body or {}).get("format") or "").strip().lower()
+    if requested in (MENU_FORMAT_CSV, MENU_FORMAT_COLUMNAR, MENU_FORMAT_INDEX):
+        return requested
+    if MENU_FORMAT_MEDIA_TYPE in (req.headers.get("Accept") or ""):
+        return MENU_FORMAT_COLUMNAR
+    return MENU_FORMAT_CSV
+
+
+def negotiate_toppings_mode(req, body: dict | None = None) -> str:
+    """Picks the topping layout from ?toppings= or the JSON body's "toppings", else config.MENU_TOPPINGS_MODE."""
+    requested = (req.args.get("toppings") or (body or {}).get("toppings") or config.MENU_TOPPINGS_MODE).strip().lower()
+    return TOPPINGS_CATALOG if requested == TOPPINGS_CATALOG else TOPPINGS_INLINE
+
+
+def topping_group_id(group_json: str) -> str:
+    """Content hash of one topping group's compact JSON: identical groups get the same ID in every vendor and run."""
+    return hashlib.blake2b(group_json.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _decode_toppings(value, memo: dict):
+    """product_toppings JSON string -> list of group objects; identical strings are decoded once."""
+    if not isinstance(value, str):
+        return value if isinstance(value, list) else []
+    decoded = memo.get(value)
+    if decoded is None:
+        try:
+            decoded = json.loads(value) if value.strip() else []
+        except ValueError:
+            decoded = []
+        memo[value] = decoded
+    return decoded
+
+
+def _payload(vendor: dict, headers: list[str], item_columns: dict[str, list], item_count: int,
+             topping_groups: dict | None = None) -> dict:
+    payload = {
+        "vendor": vendor,           # Vendor-level columns, identical for every row
+        "headers": headers,         # Full original column order (for CSV export in the editor)
+        "items": item_columns,      # {column: [value per item]}
+        "item_count": item_count,
+    }
+    if topping_groups is not None:
+        payload["topping_groups"] = topping_groups # {group ID: group}; items.product_toppings then lists IDs
+    return payload
+
+
+def columnar_menu_from_scrape_result(result, toppings: str = TOPPINGS_INLINE) -> dict:
+    """Builds the columnar payload from a vendor_scrape.ScrapeResult (vendor_info + item-only rows)."""
+    headers = result.fieldnames
+    rows = result.item_rows
+    item_cols = [col for col in headers if col in config.MENU_ITEM_COLS]
+    vendor = {col: result.vendor_info.get(col) for col in headers if col not in config.MENU_ITEM_COLS}
+    item_columns = {col: [row.get(col) for row in rows] for col in item_cols}
+    if toppings == TOPPINGS_CATALOG and result.topping_refs is not None:
+        if "product_toppings" in item_columns:
+            item_columns["product_toppings"] = [list(refs) for refs in result.topping_refs]
+        return _payload(vendor, headers, item_columns, len(rows), result.topping_catalog())
+    if "product_toppings" in item_columns:
+        memo = {}
+        item_columns["product_toppings"] = [_decode_toppings(v, memo) for v in item_columns["product_toppings"]]
+    return _payload(vendor, headers, item_columns, len(rows))
+
+
+def split_menu_by_category(menu: dict) -> tuple[list[dict], list[dict]]:
+    """Splits a columnar payload into (category index, per-category pages), categories in first-seen order.
+
+    Each index entry is {"name", "category_id", "item_count", "first_index"}, where
+    first_index is the menu position of the category's first item. Pages hold that
+    category's item columns, plus the topping groups they use in catalog mode, and
+    "source_index", each item's position in the menu: a name that appears in several
+    places (e.g. a promo section) gets one page, and source_index lets the client
+    put its items back where they were.
+    """
+    columns = menu["items"]
+    names = columns.get("category_name") or [""] * menu["item_count"]
+    category_ids = columns.get("category_id") or [None] * menu["item_count"]
+    rows_by_name = {}
+    for idx, name in enumerate(names):
+        rows_by_name.setdefault(name, []).append(idx)
+    catalog = menu.get("topping_groups")
+    index, pages = [], []
+    for name, rows in rows_by_name.items():
+        page_items = {col: [values[idx] for idx in rows] for col, values in columns.items()}
+        page = {"category": name, "items": page_items, "item_count": len(rows), "first_index": rows[0],
+                "source_index": rows}
+        if catalog is not None:
+            used = dict.fromkeys(group_id for refs in page_items.get("product_toppings", ()) for group_id in refs)
+            page["topping_groups"] = {group_id: catalog[group_id] for group_id in used if group_id in catalog}
+        index.append({"name": name, "category_id": category_ids[rows[0]], "item_count": len(rows), "first_index": rows[0]})
+        pages.append(page)
+    return index, pages
+
+
+def columnar_menu_from_frame(df) -> dict:
+    """Builds the columnar payload from a merged menu DataFrame (EXPECTED_MERGED_ITEM_DATA_COLS)."""
+    headers = list(df.columns)
+    # NaN is not valid JSON; send missing cells as null
+    df = df.astype(object).where(df.notna(), None)
+    vendor = {col: df[col].iat[0] for col in headers if col not in config.MENU_ITEM_COLS} if len(df) else {}
+    item_columns = {col: df[col].tolist() for col in headers if col in config.MENU_ITEM_COLS}
+    if "product_toppings" in item_columns:
+        memo = {}
+        item_columns["product_toppings"] = [_decode_toppings(v, memo) for v in item_columns["product_toppings"]]
+    return _payload(vendor, headers, item_columns, len(df))
@@ -0,0 +1,332 @@
+# menu_sinks.py
+import abc
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+try:
+    import pyarrow as pa # Optional: only the Parquet sink needs it
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pc = pq = None
+
+import config
+
+# Typed export columns. vendor_info's "rating" is the vendor's score and is exported as
+# vendor_rating, so it no longer shadows the item rating as it does in the CSV.
+VENDOR_COLUMNS = [
+    ("vendor_code", "str"), ("snappfood_vendor_id", "int"), ("vendor_name", "str"), ("vendor_branch", "str"),
+    ("vendor_chain", "str"), ("business_line", "str"), ("marketing_area", "str"), ("address", "str"),
+    ("min_order", "int"), ("latitude", "float"), ("longitude", "float"), ("vendor_rating", "float"),
+    ("comment_count", "int"), ("shifts", "str"), ("tag_names", "str"),
+    ("is_express", "bool"), ("is_pro", "bool"), ("is_economical", "bool"),
+]
+ITEM_COLUMNS = [
+    ("category_id", "int"), ("category_name", "str"), ("item_id", "int"), ("item_title", "str"),
+    ("product_title", "str"), ("item_variation", "str"), ("description", "str"),
+    ("price", "int"), ("rating", "float"), ("product_toppings", "str"),
+]
+PARTITION_COLS = ["crawl_date", "business_line"]
+UNKNOWN_BUSINESS_LINE = "Unknown" # Partition value for vendors without a business line
+
+
+def _as_int(value):
+    if value is None or value == "":
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        try:
+            return int(round(float(value))) # "125000.0" and 125000.0 both become 125000
+        except (TypeError, ValueError, OverflowError):
+            return None
+
+
+def _as_float(value):
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _as_bool(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes")
+    return bool(value)
+
+
+def _as_str(value):
+    return value if value is None or isinstance(value, str) else str(value)
+
+
+CONVERTERS = {"int": _as_int, "float": _as_float, "bool": _as_bool, "str": _as_str}
+
+
+def typed_vendor_values(vendor_info: dict) -> list:
+    """vendor_info -> values in VENDOR_COLUMNS order, converted to their export types."""
+    source = {**vendor_info, "vendor_rating": vendor_info.get("rating")}
+    return [CONVERTERS[kind](source.get(col)) for col, kind in VENDOR_COLUMNS]
+
+
+def typed_item_values(item: dict, product_toppings=None) -> list:
+    """One item row -> values in ITEM_COLUMNS order; product_toppings overrides the row's own JSON."""
+    source = item if product_toppings is None else {**item, "product_toppings": product_toppings}
+    return [CONVERTERS[kind](source.get(col)) for col, kind in ITEM_COLUMNS]
+
+
+class MenuSink(abc.ABC):
+    """Base class for analytics outputs fed one vendor_scrape.ScrapeResult at a time.
+
+    Rows are buffered and written in batches: once batch_rows are buffered
+    (vendor rows included) they are written out, so memory stays bounded
+    however many vendors a crawl covers. crawl_date is fixed when the sink is
+    created, so a run that passes midnight stays in one partition.
+    Call close() (or use the sink as a context manager) to write the last batch.
+    """
+
+    def __init__(self, batch_rows: int = config.MENU_SINK_BATCH_ROWS, crawl_date: str | None = None):
+        self.batch_rows = max(1, batch_rows)
+        self.crawl_date = crawl_date or time.strftime("%Y-%m-%d")
+        self._buffered = 0
+        self._lock = threading.Lock()
+        self.stats = {"vendors": 0, "rows": 0, "batches": 0}
+
+    def write(self, result):
+        """Buffers one vendor's rows, writing a batch whenever batch_rows are buffered."""
+        with self._lock:
+            vendor_values = self._add_vendor(result)
+            self.stats["vendors"] += 1
+            self._count_buffered(1)
+            for position, item in enumerate(result.item_rows):
+                self._add_item(result, vendor_values, position, item)
+                self.stats["rows"] += 1
+                self._count_buffered(1)
+
+    def _count_buffered(self, rows: int):
+        self._buffered += rows
+        if self._buffered >= self.batch_rows:
+            self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._buffered:
+            self._write_batch()
+            self.stats["batches"] += 1
+            self._buffered = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- Implemented by each sink ---
+    def _add_vendor(self, result) -> list:
+        """Buffers what the sink keeps per vendor; returns the typed vendor values for _add_item."""
+        return typed_vendor_values(result.vendor_info)
+
+    @abc.abstractmethod
+    def _add_item(self, result, vendor_values: list, position: int, item: dict):
+        """Buffers one item row."""
+
+    @abc.abstractmethod
+    def _write_batch(self):
+        """Writes out and clears everything buffered."""
+
+
+class ParquetMenuSink(MenuSink):
+    """Hive-partitioned Parquet dataset: <root>/crawl_date=YYYY-MM-DD/business_line=<line>/part-*.parquet.
+
+    Every row carries the vendor and item columns (typed, see VENDOR_COLUMNS /
+    ITEM_COLUMNS); Parquet's dictionary encoding keeps the repeated vendor and
+    inline topping JSON values small. Each batch adds new part files, so
+    several runs (or a resumed one) can write to the same dataset.
+
+    Like the SQLite sink, re-crawling a vendor on the same date replaces its
+    rows: close() rewrites the date's part files from earlier runs without the
+    vendors this run wrote. Runs writing the same date must not overlap.
+    """
+
+    ARROW_TYPES = {"int": "int64", "float": "float64", "bool": "bool_", "str": "string"}
+
+    def __init__(self, root: Path = config.MENU_SINK_PARQUET_DIR, **kwargs):
+        if pa is None:
+            raise RuntimeError("The Parquet menu sink needs pyarrow (pip install pyarrow).")
+        super().__init__(**kwargs)
+        self.root = Path(root)
+        self._run_id = uuid.uuid4().hex[:12] # Part file names never collide with earlier runs
+        self.schema = pa.schema([("crawl_date", pa.string())] + [
+            (col, getattr(pa, self.ARROW_TYPES[kind])()) for col, kind in VENDOR_COLUMNS + ITEM_COLUMNS])
+        self._vendor_names = [col for col, _ in VENDOR_COLUMNS]
+        self._item_names = [col for col, _ in ITEM_COLUMNS]
+        self._columns = {name: [] for name in self.schema.names}
+        self._vendor_codes = set() # Vendors written by this run, whose rows from earlier runs close() drops
+
+    def _add_vendor(self, result) -> list:
+        values = typed_vendor_values(result.vendor_info)
+        self._vendor_codes.add(values[0])
+        line_pos = self._vendor_names.index("business_line")
+        values[line_pos] = values[line_pos] or UNKNOWN_BUSINESS_LINE # Empty partition values read back as null
+        return values
+
+    def _add_item(self, result, vendor_values: list, position: int, item: dict):
+        columns = self._columns
+        columns["crawl_date"].append(self.crawl_date)
+        for name, value in zip(self._vendor_names, vendor_values):
+            columns[name].append(value)
+        for name, value in zip(self._item_names, typed_item_values(item)):
+            columns[name].append(value)
+
+    def _write_batch(self):
+        if not self._columns["crawl_date"]:
+            return # Only empty menus were buffered
+        table = pa.table(self._columns, schema=self.schema)
+        self.root.mkdir(parents=True, exist_ok=True)
+        pq.write_to_dataset(table, str(self.root), partition_cols=PARTITION_COLS,
+                            basename_template=f"part-{self._run_id}-{self.stats['batches']:05d}-{{i}}.parquet",
+                            existing_data_behavior="overwrite_or_ignore")
+        self._columns = {name: [] for name in self.schema.names}
+
+    def close(self):
+        super().close()
+        with self._lock:
+            if self._vendor_codes:
+                self._drop_superseded_rows()
+                self._vendor_codes = set()
+
+    def _drop_superseded_rows(self):
+        """Removes this run's vendors from the crawl date's part files written by earlier runs."""
+        date_dir = self.root / f"crawl_date={self.crawl_date}"
+        own_prefix = f"part-{self._run_id}-"
+        rewritten = pa.array(sorted(self._vendor_codes), type=pa.string())
+        for path in sorted(date_dir.glob("*/*.parquet")):
+            if path.name.startswith(own_prefix):
+                continue
+            table = pq.ParquetFile(path).read() # The file alone: partition columns live in the path
+            keep = pc.invert(pc.is_in(table["vendor_code"], value_set=rewritten))
+            kept = table.filter(keep)
+            if kept.num_rows == table.num_rows:
+                continue
+            if kept.num_rows == 0:
+                path.unlink()
+                continue
+            tmp_path = path.with_name(f"{path.stem}.{self._run_id}.tmp")
+            pq.write_table(kept, tmp_path)
+            os.replace(tmp_path, path) # Readers see the old or the new file, never a partial one
+
+
+SQL_TYPES = {"int": "INTEGER", "float": "REAL", "bool": "INTEGER", "str": "TEXT"}
+
+
+def _column_ddl(columns) -> str:
+    return ",\n    ".join(f"{col} {SQL_TYPES[kind]}" for col, kind in columns)
+
+
+SQLITE_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS vendors (
+    crawl_date  TEXT NOT NULL,
+    {_column_ddl(VENDOR_COLUMNS)},
+    item_count  INTEGER NOT NULL,
+    crawled_at  TEXT NOT NULL,
+    PRIMARY KEY (vendor_code, crawl_date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_vendors_business_line ON vendors (business_line, crawl_date);
+CREATE INDEX IF NOT EXISTS idx_vendors_date ON vendors (crawl_date);
+CREATE TABLE IF NOT EXISTS items (
+    vendor_code TEXT NOT NULL,
+    crawl_date  TEXT NOT NULL,
+    position    INTEGER NOT NULL,
+    {_column_ddl(ITEM_COLUMNS)},
+    PRIMARY KEY (vendor_code, crawl_date, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_items_item ON items (item_id, crawl_date);
+CREATE INDEX IF NOT EXISTS idx_items_category ON items (vendor_code, category_id);
+CREATE TABLE IF NOT EXISTS topping_groups (
+    group_id    TEXT PRIMARY KEY,
+    body        TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class SqliteMenuSink(MenuSink):
+    """SQLite database with a vendors table (one row per vendor and crawl date) and an items table.
+
+    items.product_toppings holds a JSON list of topping group IDs; each
+    distinct group is stored once in topping_groups (see menu_payload
+    TOPPINGS_CATALOG). Re-crawling a vendor on the same date replaces its rows.
+    """
+
+    def __init__(self, db_path: Path = config.MENU_SINK_SQLITE_DB, **kwargs):
+        super().__init__(**kwargs)
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SQLITE_SCHEMA)
+        self._vendor_rows = []
+        self._item_rows = []
+        self._groups = {}
+        self._toppings = None # Group ID lists of the vendor being added
+        vendor_cols = ["crawl_date"] + [col for col, _ in VENDOR_COLUMNS] + ["item_count", "crawled_at"]
+        item_cols = ["vendor_code", "crawl_date", "position"] + [col for col, _ in ITEM_COLUMNS]
+        self._insert_vendor = f"INSERT OR REPLACE INTO vendors ({', '.join(vendor_cols)}) VALUES ({', '.join('?' * len(vendor_cols))})"
+        self._insert_item = f"INSERT INTO items ({', '.join(item_cols)}) VALUES ({', '.join('?' * len(item_cols))})"
+
+    def _add_vendor(self, result) -> list:
+        values = typed_vendor_values(result.vendor_info)
+        # The vendor row goes into the same batch as its first items, so a re-crawl's old items are deleted before any new ones land
+        self._vendor_rows.append([self.crawl_date] + values + [len(result), time.strftime("%Y-%m-%dT%H:%M:%S")])
+        self._groups.update(result.topping_groups)
+        self._toppings = None
+        if result.topping_refs is not None:
+            self._toppings = [json.dumps(list(refs), separators=(',', ':')) for refs in result.topping_refs]
+        return values
+
+    def _add_item(self, result, vendor_values: list, position: int, item: dict):
+        toppings = self._toppings[position] if self._toppings is not None else None
+        self._item_rows.append([vendor_values[0], self.crawl_date, position] + typed_item_values(item, toppings))
+
+    def _write_batch(self):
+        with self._conn:
+            self._conn.executemany("DELETE FROM items WHERE vendor_code = ? AND crawl_date = ?",
+                                   [(row[1], row[0]) for row in self._vendor_rows])
+            self._conn.executemany(self._insert_vendor, self._vendor_rows)
+            self._conn.executemany("INSERT OR IGNORE INTO topping_groups (group_id, body) VALUES (?, ?)",
+                                   self._groups.items())
+            self._conn.executemany(self._insert_item, self._item_rows)
+        self._vendor_rows, self._item_rows, self._groups = [], [], {}
+
+    def close(self):
+        super().close()
+        with self._lock:
+            self._conn.close()
+
+
+SINK_TYPES = {"parquet": ParquetMenuSink, "sqlite": SqliteMenuSink}
+
+
+def build_sinks(names, parquet_dir: Path = config.MENU_SINK_PARQUET_DIR,
+                sqlite_db: Path = config.MENU_SINK_SQLITE_DB, **kwargs) -> list[MenuSink]:
+    """Creates the named sinks ("parquet", "sqlite"); kwargs (batch_rows, crawl_date) go to each."""
+    names = list(dict.fromkeys(name.strip().lower() for name in names or () if name.strip()))
+    unknown = [name for name in names if name not in SINK_TYPES]
+    if unknown:
+        raise ValueError(f"Unknown menu sink(s): {', '.join(unknown)}; choose from {', '.join(SINK_TYPES)}.")
+    paths = {"parquet": parquet_dir, "sqlite": sqlite_db}
+    return [SINK_TYPES[name](paths[name], **kwargs) for name in names]
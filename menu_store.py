@@ -0,0 +1,234 @@
+# menu_store.py
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash        TEXT PRIMARY KEY,
+    body        TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS snapshots (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    vendor_code   TEXT NOT NULL,
+    created_at    TEXT NOT NULL,
+    checked_at    TEXT NOT NULL,
+    vendor_hash   TEXT NOT NULL,
+    menu_hash     TEXT NOT NULL,
+    item_count    INTEGER NOT NULL,
+    added         INTEGER NOT NULL,
+    removed       INTEGER NOT NULL,
+    price_changed INTEGER NOT NULL,
+    modified      INTEGER NOT NULL,
+    csv_path      TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_vendor ON snapshots (vendor_code, id);
+CREATE TABLE IF NOT EXISTS vendor_items (
+    vendor_code TEXT NOT NULL,
+    item_key    TEXT NOT NULL,
+    item_hash   TEXT NOT NULL,
+    price,
+    PRIMARY KEY (vendor_code, item_key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS changes (
+    vendor_code TEXT NOT NULL,
+    snapshot_id INTEGER NOT NULL,
+    item_key    TEXT NOT NULL,
+    old_hash    TEXT,
+    new_hash    TEXT,
+    old_price,
+    new_price
+);
+CREATE INDEX IF NOT EXISTS idx_changes_vendor ON changes (vendor_code, snapshot_id);
+"""
+
+CHANGE_KINDS = ("added", "removed", "price_changed", "modified")
+SQL_MAX_PARAMS = 500 # Bound parameter lists well below SQLite's SQLITE_MAX_VARIABLE_NUMBER (999 on older builds)
+
+
+def _canonical_json(value) -> str:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def item_key(item: dict) -> str:
+    """Stable identity of a menu item within its vendor: the Snappfood item_id when present."""
+    if item.get("item_id") is not None:
+        return str(item["item_id"])
+    return f"title:{item.get('item_title', '')}|{item.get('item_variation', '')}"
+
+
+def _change_kind(old_hash, new_hash, old_price, new_price) -> str | None:
+    if old_hash == new_hash:
+        return None
+    if old_hash is None:
+        return "added"
+    if new_hash is None:
+        return "removed"
+    return "price_changed" if old_price != new_price else "modified"
+
+
+class MenuSnapshotStore:
+    """Content-addressed SQLite store of vendor menus with per-item change tracking.
+
+    Item rows are stored once per distinct content hash (blobs); vendor_items
+    holds each vendor's current item_key -> hash map, and every snapshot logs
+    only the items that were added, removed or changed. Re-recording an
+    unchanged menu writes nothing but the snapshot's checked_at time.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # --- Recording ---
+    def record(self, result) -> dict:
+        """Records a vendor_scrape.ScrapeResult; returns the snapshot summary.
+
+        The summary has "snapshot_id", "created" (False when the menu was
+        unchanged and the latest snapshot was just re-confirmed) and the change counts.
+        """
+        vendor_code = result.vendor_code
+        vendor_body = _canonical_json(result.vendor_info)
+        vendor_hash = _hash(vendor_body)
+        items = {}
+        for item in result.item_rows:
+            key = item_key(item)
+            if key not in items: # Items listed under several categories keep their first placement
+                body = _canonical_json(item)
+                items[key] = (_hash(body), item.get("price"), body)
+        menu_hash = _hash(_canonical_json(sorted((key, entry[0]) for key, entry in items.items())))
+        now = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+        with self._lock, self._conn:
+            latest = self._conn.execute(
+                "SELECT * FROM snapshots WHERE vendor_code = ? ORDER BY id DESC LIMIT 1", (vendor_code,)).fetchone()
+            if latest is not None and latest["menu_hash"] == menu_hash and latest["vendor_hash"] == vendor_hash:
+                self._conn.execute("UPDATE snapshots SET checked_at = ? WHERE id = ?", (now, latest["id"]))
+                return {"snapshot_id": latest["id"], "created": False, "item_count": len(items),
+                        **{kind: 0 for kind in CHANGE_KINDS}}
+
+            current = {row["item_key"]: (row["item_hash"], row["price"]) for row in self._conn.execute(
+                "SELECT item_key, item_hash, price FROM vendor_items WHERE vendor_code = ?", (vendor_code,))}
+            changes = []
+            for key, (new_hash, new_price, _) in items.items():
+                old_hash, old_price = current.get(key, (None, None))
+                if old_hash != new_hash:
+                    changes.append((key, old_hash, new_hash, old_price, new_price))
+            changes.extend((key, old_hash, None, old_price, None)
+                           for key, (old_hash, old_price) in current.items() if key not in items)
+            counts = {kind: 0 for kind in CHANGE_KINDS}
+            for change in changes:
+                counts[_change_kind(*change[1:])] += 1
+
+            self._conn.execute("INSERT OR IGNORE INTO blobs (hash, body) VALUES (?, ?)", (vendor_hash, vendor_body))
+            cursor = self._conn.execute(
+                "INSERT INTO snapshots (vendor_code, created_at, checked_at, vendor_hash, menu_hash, item_count,"
+                " added, removed, price_changed, modified) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (vendor_code, now, now, vendor_hash, menu_hash, len(items),
+                 counts["added"], counts["removed"], counts["price_changed"], counts["modified"]))
+            snapshot_id = cursor.lastrowid
+            # Only changed items touch the item tables
+            self._conn.executemany("INSERT OR IGNORE INTO blobs (hash, body) VALUES (?, ?)",
+                                   [(new_hash, items[key][2]) for key, _, new_hash, _, _ in changes if new_hash])
+            self._conn.executemany(
+                "INSERT INTO changes (vendor_code, snapshot_id, item_key, old_hash, new_hash, old_price, new_price)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)", [(vendor_code, snapshot_id, *change) for change in changes])
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vendor_items (vendor_code, item_key, item_hash, price) VALUES (?, ?, ?, ?)",
+                [(vendor_code, key, new_hash, new_price) for key, _, new_hash, _, new_price in changes if new_hash])
+            self._conn.executemany("DELETE FROM vendor_items WHERE vendor_code = ? AND item_key = ?",
+                                   [(vendor_code, key) for key, _, new_hash, _, _ in changes if new_hash is None])
+        return {"snapshot_id": snapshot_id, "created": True, "item_count": len(items), **counts}
+
+    def attach_csv(self, snapshot_id: int, csv_path: Path):
+        """Remembers the CSV written for a snapshot so unchanged re-runs can reuse it."""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE snapshots SET csv_path = ? WHERE id = ?", (str(csv_path), snapshot_id))
+
+    def snapshot_csv(self, snapshot_id: int) -> Path | None:
+        with self._lock:
+            row = self._conn.execute("SELECT csv_path FROM snapshots WHERE id = ?", (snapshot_id,)).fetchone()
+        return Path(row["csv_path"]) if row and row["csv_path"] else None
+
+    # --- Queries ---
+    def history(self, vendor_code: str, limit: int = 50) -> list[dict]:
+        """Most recent snapshots of a vendor, newest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, created_at, checked_at, item_count, added, removed, price_changed, modified"
+                " FROM snapshots WHERE vendor_code = ? ORDER BY id DESC LIMIT ?", (vendor_code, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def diff(self, vendor_code: str, since: int | None = None) -> dict:
+        """Net item changes after snapshot `since` (default: the one before the latest).
+
+        Cost is proportional to the number of logged changes, not the menu size.
+        """
+        with self._lock:
+            recent = [row["id"] for row in self._conn.execute(
+                "SELECT id FROM snapshots WHERE vendor_code = ? ORDER BY id DESC LIMIT 2", (vendor_code,))]
+            if not recent:
+                return {"vendor_code": vendor_code, "from_snapshot": since, "to_snapshot": None,
+                        **{kind: [] for kind in CHANGE_KINDS}}
+            if since is None:
+                since = recent[1] if len(recent) > 1 else 0
+            net = {} # item_key -> [first old_hash, first old_price, last new_hash, last new_price]
+            for row in self._conn.execute(
+                    "SELECT item_key, old_hash, new_hash, old_price, new_price FROM changes"
+                    " WHERE vendor_code = ? AND snapshot_id > ? ORDER BY snapshot_id", (vendor_code, since)):
+                entry = net.setdefault(row["item_key"], [row["old_hash"], row["old_price"], None, None])
+                entry[2], entry[3] = row["new_hash"], row["new_price"]
+            hashes = sorted({h for entry in net.values() for h in (entry[0], entry[2]) if h})
+            bodies = {}
+            for start in range(0, len(hashes), SQL_MAX_PARAMS):
+                chunk = hashes[start:start + SQL_MAX_PARAMS]
+                for row in self._conn.execute(
+                        f"SELECT hash, body FROM blobs WHERE hash IN ({','.join('?' * len(chunk))})", chunk):
+                    bodies[row["hash"]] = json.loads(row["body"])
+
+        report = {"vendor_code": vendor_code, "from_snapshot": since, "to_snapshot": recent[0],
+                  **{kind: [] for kind in CHANGE_KINDS}}
+        for key, (old_hash, old_price, new_hash, new_price) in net.items():
+            kind = _change_kind(old_hash, new_hash, old_price, new_price)
+            if kind is None:
+                continue # Changed and changed back
+            item = bodies.get(new_hash or old_hash, {})
+            report[kind].append({"item_key": key, "item_title": item.get("item_title"),
+                                 "category_name": item.get("category_name"),
+                                 "old_price": old_price, "new_price": new_price})
+        return report
+
+
+_menu_store = None
+_menu_store_lock = threading.Lock()
+
+
+def get_menu_store() -> MenuSnapshotStore | None:
+    """Returns the process-wide snapshot store, or None when MENU_SNAPSHOTS_ENABLED is off."""
+    global _menu_store
+    if not config.MENU_SNAPSHOTS_ENABLED:
+        return None
+    if _menu_store is None:
+        with _menu_store_lock:
+            if _menu_store is None:
+                _menu_store = MenuSnapshotStore(config.MENU_SNAPSHOT_DB)
+    return _menu_store
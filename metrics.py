@@ -0,0 +1,223 @@
+# metrics.py
+import bisect
+import threading
+import time
+from functools import wraps
+
+import config
+
+# Checked first by every recording call, so disabled instrumentation is a global lookup and a return
+_enabled = config.METRICS_ENABLED
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+ITEM_COUNT_BUCKETS = (0, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+REGISTRY = []
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(flag: bool):
+    """Turns recording on or off process-wide (METRICS_ENABLED sets the initial state)."""
+    global _enabled
+    _enabled = bool(flag)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {} # Label values tuple -> state
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _label_text(self, key: tuple, extra: str = "") -> str:
+        parts = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values = {key: (list(state) if isinstance(state, list) else state) for key, state in self._values.items()}
+        for key in sorted(values):
+            lines.extend(self._sample_lines(key, values[key]))
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        if not _enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _sample_lines(self, key, value):
+        return [f"{self.name}{self._label_text(key)} {_format_value(value)}"]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        if not _enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _sample_lines(self, key, value):
+        return [f"{self.name}{self._label_text(key)} {_format_value(value)}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        if not _enabled:
+            return
+        key = self._key(labels)
+        slot = bisect.bisect_left(self.buckets, value) # First bucket with le >= value; len(buckets) is +Inf
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0] # bucket counts, sum, count
+            state[slot] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[-1] if state else 0
+
+    def _sample_lines(self, key, state):
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), state[:-2]):
+            cumulative += bucket_count
+            le = 'le="' + _format_value(bound) + '"'
+            lines.append(f"{self.name}_bucket{self._label_text(key, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{self._label_text(key)} {_format_value(state[-2])}")
+        lines.append(f"{self.name}_count{self._label_text(key)} {state[-1]}")
+        return lines
+
+
+# --- The app's metrics ---
+REQUEST_SECONDS = Histogram("sf_tf_request_seconds", "Total Flask request time (to the first byte for streams).",
+                            ("route", "method", "status"))
+UPSTREAM_SECONDS = Histogram("sf_tf_upstream_request_seconds",
+                             "Snappfood API call latency including urllib3 retries, by final status or error class.",
+                             ("status",))
+UPSTREAM_RETRIES = Counter("sf_tf_upstream_retries_total", "Snappfood API retries made by urllib3, by reason.", ("reason",))
+STAGE_SECONDS = Histogram("sf_tf_stage_seconds", "Time spent in one processing stage of a menu.",
+                          ("stage", "platform"), STAGE_BUCKETS)
+CACHE_EVENTS = Counter("sf_tf_cache_events_total", "Snappfood vendor JSON cache lookups by result.", ("result",))
+UPSTREAM_RATE_LIMIT = Gauge("sf_tf_upstream_rate_limit", "Current adaptive Snappfood request rate limit (requests/sec).")
+UPSTREAM_BREAKER_STATE = Gauge("sf_tf_upstream_breaker_state", "Snappfood circuit breaker state: 0 closed, 1 half-open, 2 open.")
+UPSTREAM_BREAKER_REJECTIONS = Counter("sf_tf_upstream_breaker_rejections_total",
+                                      "Snappfood calls refused without a request while the circuit was open.")
+MENU_ITEMS = Histogram("sf_tf_menu_items", "Menu items per vendor.", ("platform",), ITEM_COUNT_BUCKETS)
+
+
+# --- Instrumentation API ---
+class _StageTimer:
+    __slots__ = ("labels", "started")
+
+    def __init__(self, labels: dict):
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        STAGE_SECONDS.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timed(stage: str, platform: str = ""):
+    """Context manager recording the block's duration into sf_tf_stage_seconds{stage, platform}.
+
+    Returns a shared no-op object while metrics are disabled.
+    """
+    if not _enabled:
+        return _NULL_TIMER
+    return _StageTimer({"stage": stage, "platform": platform})
+
+
+def instrumented(stage: str, platform: str = ""):
+    """Decorator form of timed()."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _StageTimer({"stage": stage, "platform": platform}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    for metric in REGISTRY:
+        metric.reset()
@@ -0,0 +1,43 @@
+# persian_text.py
+import unicodedata
+
+import pandas as pd
+
+
+def _build_char_map() -> dict:
+    """str.translate table for the normalizers below (no regex classes: pandas may run those on RE2, which is ASCII-only for \\w)."""
+    table = {}
+    for code_point in range(0x10000):
+        category = unicodedata.category(chr(code_point))
+        if category[0] in "PS" or category in ("Zs", "Cc"): # Punctuation, symbols, odd spaces, tabs/newlines
+            table[code_point] = " "
+        elif category == "Mn" and 0x064B <= code_point <= 0x0670: # Arabic diacritics (harakat, superscript alef)
+            table[code_point] = None
+    # Arabic code points and digits that Persian text mixes in freely
+    table.update(str.maketrans({
+        "ي": "ی", "ى": "ی", "ئ": "ی", "ك": "ک", "ة": "ه", "ۀ": "ه", "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا", "ؤ": "و",
+        "\u200c": " ", "\u200d": "", "\u0640": "", # ZWNJ is a word joiner in practice, tatweel is decoration
+        **{digit: str(i) for i, digit in enumerate("۰۱۲۳۴۵۶۷۸۹")},
+        **{digit: str(i) for i, digit in enumerate("٠١٢٣٤٥٦٧٨٩")},
+    }))
+    return table
+
+
+_PERSIAN_CHAR_MAP = _build_char_map()
+
+
+def normalize_persian_text(text) -> str:
+    """Normalizes one string for matching: unified Persian letters and digits, no diacritics/punctuation, single spaces."""
+    if not isinstance(text, str):
+        return ""
+    return " ".join(text.translate(_PERSIAN_CHAR_MAP).lower().split())
+
+
+def normalize_persian(values: pd.Series) -> pd.Series:
+    """normalize_persian_text over a Series.
+
+    Menus and vendor lists repeat the same strings a lot, so only distinct values are normalized.
+    """
+    codes, uniques = pd.factorize(values.fillna("").astype(str))
+    normalized = pd.array([normalize_persian_text(value) for value in uniques], dtype=object)
+    return pd.Series(normalized[codes] if len(codes) else [], index=values.index, dtype=object)
@@ -0,0 +1,241 @@
+# price_compare.py
+import argparse
+import logging
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import config
+from persian_text import normalize_persian
+from tf_store import load_tf_table
+
+logger = logging.getLogger(__name__)
+
+# Match types in the output table, strongest first
+MATCH_EXACT = "exact"       # Same normalized title
+MATCH_COMPACT = "compact"   # Same title once spaces/punctuation are ignored
+MATCH_FUZZY = "fuzzy"       # Trigram similarity within a blocking key
+SF_ONLY = "sf_only"         # Coverage gaps: item only on one platform
+TF_ONLY = "tf_only"
+MATCH_TYPES = [MATCH_EXACT, MATCH_COMPACT, MATCH_FUZZY, SF_ONLY, TF_ONLY]
+
+
+def load_pairs(path: Path) -> pd.DataFrame:
+    """matched_vendors.csv -> DataFrame(pair_id, sf_code, tf_code)."""
+    df = pd.read_csv(path, dtype=str, usecols=["sf_code", "tf_code"], encoding="utf-8-sig")
+    df["sf_code"] = df["sf_code"].str.strip()
+    df["tf_code"] = df["tf_code"].str.strip()
+    df = df[(df["sf_code"].fillna("") != "") & (df["tf_code"].fillna("") != "")].drop_duplicates()
+    return df.reset_index(drop=True).rename_axis("pair_id").reset_index()
+
+
+def _prepare_side(items: pd.DataFrame, pairs: pd.DataFrame, code_col: str) -> pd.DataFrame:
+    """Keeps one row per (pair, item_id) of matched vendors and adds the normalized matching keys."""
+    df = items.merge(pairs[["pair_id", code_col]], left_on="vendor_code", right_on=code_col, how="inner")
+    df = df.drop_duplicates(["pair_id", "item_id"]) # SF repeats items under promo categories
+    df = df.reset_index(drop=True)
+    if "item_variation" not in df.columns: # The TF export has no variation column
+        df["item_variation"] = ""
+    df["item_variation"] = df["item_variation"].fillna("")
+    # Variants share a title ("Pizza" small/large), so the variation is part of the matching title
+    # unless the title already ends with it
+    df["title_norm"] = [f"{title} {variation}" if variation and not title.endswith(variation) else title
+                        for title, variation in zip(normalize_persian(df["item_title"]), normalize_persian(df["item_variation"]))]
+    df["title_compact"] = df["title_norm"].str.replace(" ", "", regex=False)
+    df["category_norm"] = normalize_persian(df["category_name"])
+    df["first_token"] = df["title_norm"].str.extract(r"^(\S*)", expand=False)
+    df["price"] = pd.to_numeric(df["price"], errors="coerce")
+    return df
+
+
+def _match_on_key(sf: pd.DataFrame, tf: pd.DataFrame, sf_free: np.ndarray, tf_free: np.ndarray,
+                  key: str, match_type: str) -> pd.DataFrame:
+    """One-to-one hash join of still-unmatched rows on (pair_id, key).
+
+    Where a key repeats (variants the key can't tell apart), rows are paired by
+    closest price rather than all but the first going unmatched.
+    """
+    cols = ["pair_id", key, "price"]
+    left = sf.loc[sf_free & (sf[key] != "").to_numpy(), cols].reset_index(names="sf_row")
+    right = tf.loc[tf_free & (tf[key] != "").to_numpy(), cols].reset_index(names="tf_row")
+    candidates = left.merge(right, on=["pair_id", key], suffixes=("_sf", "_tf"))
+    candidates["gap"] = (candidates["price_sf"] - candidates["price_tf"]).abs().fillna(np.inf)
+    matched = _assign_closest(candidates[["sf_row", "tf_row", "gap"]])
+    return matched[["sf_row", "tf_row"]].assign(match_type=match_type, score=1.0)
+
+
+def _assign_closest(candidates: pd.DataFrame) -> pd.DataFrame:
+    """Greedy one-to-one assignment by smallest gap.
+
+    Each round keeps the pairs that are each other's best remaining candidate and
+    drops every other candidate of their rows; keys that are unique on both sides
+    all settle in the first round.
+    """
+    candidates = candidates.sort_values(["gap", "sf_row", "tf_row"], kind="stable")
+    chosen = []
+    while not candidates.empty:
+        mutual = candidates.drop_duplicates("sf_row").index.intersection(candidates.drop_duplicates("tf_row").index)
+        picked = candidates.loc[mutual]
+        chosen.append(picked)
+        candidates = candidates[~candidates["sf_row"].isin(picked["sf_row"]) & ~candidates["tf_row"].isin(picked["tf_row"])]
+    return pd.concat(chosen) if chosen else candidates
+
+
+def _trigrams(text: str) -> frozenset:
+    return frozenset(text[i:i + 3] for i in range(len(text) - 2)) if len(text) > 3 else frozenset((text,))
+
+
+def _fuzzy_matches(sf: pd.DataFrame, tf: pd.DataFrame, sf_free: np.ndarray, tf_free: np.ndarray,
+                   min_similarity: float, max_block_pairs: int) -> pd.DataFrame:
+    """Scores unmatched rows only against candidates sharing a blocking key, then assigns greedily."""
+    left = sf.loc[sf_free, ["pair_id", "category_norm", "first_token", "title_compact"]].reset_index(names="sf_row")
+    right = tf.loc[tf_free, ["pair_id", "category_norm", "first_token", "title_compact"]].reset_index(names="tf_row")
+    candidates = []
+    for block_col in ("category_norm", "first_token"):
+        keys = ["pair_id", block_col]
+        l_blocks, r_blocks = left[left[block_col] != ""], right[right[block_col] != ""]
+        # Oversized blocks (a 500-item "menu" category) would reintroduce the quadratic blowup; skip them
+        sizes = l_blocks.groupby(keys).size().to_frame("n_sf").join(r_blocks.groupby(keys).size().rename("n_tf"), how="inner")
+        ok_blocks = sizes[sizes["n_sf"] * sizes["n_tf"] <= max_block_pairs].index
+        l_blocks = l_blocks.set_index(keys).loc[lambda d: d.index.isin(ok_blocks)].reset_index()
+        candidates.append(l_blocks[keys + ["sf_row", "title_compact"]].merge(
+            r_blocks[keys + ["tf_row", "title_compact"]], on=keys, suffixes=("_sf", "_tf"))[
+            ["sf_row", "tf_row", "title_compact_sf", "title_compact_tf"]])
+    pairs = pd.concat(candidates, ignore_index=True).drop_duplicates(["sf_row", "tf_row"])
+    if pairs.empty:
+        return pd.DataFrame(columns=["sf_row", "tf_row", "match_type", "score"])
+
+    grams = {}
+    for text in pd.unique(pd.concat([pairs["title_compact_sf"], pairs["title_compact_tf"]])):
+        grams[text] = _trigrams(text)
+    scores = np.fromiter(((len(grams[a] & grams[b]) / len(grams[a] | grams[b])) if a and b else 0.0
+                          for a, b in zip(pairs["title_compact_sf"], pairs["title_compact_tf"])),
+                         dtype=float, count=len(pairs))
+    pairs = pairs.assign(score=scores)
+    pairs = pairs[pairs["score"] >= min_similarity].sort_values("score", ascending=False, kind="stable")
+    pairs = pairs.drop_duplicates("sf_row").drop_duplicates("tf_row")
+    return pairs[["sf_row", "tf_row"]].assign(match_type=MATCH_FUZZY, score=pairs["score"].round(3))
+
+
+def compare_menus(sf_items: pd.DataFrame, tf_items: pd.DataFrame, pairs: pd.DataFrame,
+                  min_similarity: float = config.PRICE_MATCH_MIN_SIMILARITY,
+                  max_block_pairs: int = config.PRICE_MATCH_MAX_BLOCK_PAIRS) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Aligns SF and TF items of every matched vendor pair.
+
+    sf_items / tf_items need vendor_code, category_name, item_id, item_title and
+    price; an item_variation column, where present, tells same-title variants apart. Returns (item_matches, pair_summary): one row per matched item pair or
+    one-sided item, and one row per vendor pair with coverage and price deltas.
+    """
+    sf = _prepare_side(sf_items, pairs, "sf_code")
+    tf = _prepare_side(tf_items, pairs, "tf_code")
+    sf_free = np.ones(len(sf), dtype=bool)
+    tf_free = np.ones(len(tf), dtype=bool)
+
+    stages = []
+    for key, match_type in (("title_norm", MATCH_EXACT), ("title_compact", MATCH_COMPACT)):
+        matched = _match_on_key(sf, tf, sf_free, tf_free, key, match_type)
+        sf_free[matched["sf_row"].to_numpy()] = False
+        tf_free[matched["tf_row"].to_numpy()] = False
+        stages.append(matched)
+    if min_similarity < 1.0:
+        matched = _fuzzy_matches(sf, tf, sf_free, tf_free, min_similarity, max_block_pairs)
+        sf_free[matched["sf_row"].to_numpy(dtype=int)] = False
+        tf_free[matched["tf_row"].to_numpy(dtype=int)] = False
+        stages.append(matched)
+    matched = pd.concat(stages, ignore_index=True)
+
+    sf_cols = {"pair_id": "pair_id", "item_id": "sf_item_id", "item_title": "sf_title", "item_variation": "sf_variation",
+               "category_name": "sf_category", "price": "sf_price"}
+    tf_cols = {"pair_id": "pair_id", "item_id": "tf_item_id", "item_title": "tf_title", "item_variation": "tf_variation",
+               "category_name": "tf_category", "price": "tf_price"}
+    sf_part = sf[list(sf_cols)].rename(columns=sf_cols)
+    tf_part = tf[list(tf_cols)].rename(columns=tf_cols)
+    both = pd.concat([sf_part.iloc[matched["sf_row"].to_numpy(dtype=int)].reset_index(drop=True),
+                      tf_part.iloc[matched["tf_row"].to_numpy(dtype=int)].drop(columns="pair_id").reset_index(drop=True),
+                      matched[["match_type", "score"]]], axis=1)
+    sf_only = sf_part[sf_free].assign(match_type=SF_ONLY, score=np.nan)
+    tf_only = tf_part[tf_free].assign(match_type=TF_ONLY, score=np.nan)
+    item_matches = pd.concat([both, sf_only, tf_only], ignore_index=True)
+
+    item_matches["price_delta"] = item_matches["tf_price"] - item_matches["sf_price"]
+    item_matches["price_delta_pct"] = (item_matches["price_delta"] / item_matches["sf_price"].where(item_matches["sf_price"] > 0) * 100).round(2)
+    item_matches = item_matches.merge(pairs, on="pair_id", how="left")
+    item_matches["match_type"] = pd.Categorical(item_matches["match_type"], categories=MATCH_TYPES)
+    item_matches = item_matches.sort_values(["pair_id", "match_type"], kind="stable")[[
+        "pair_id", "sf_code", "tf_code", "match_type", "score",
+        "sf_item_id", "tf_item_id", "sf_title", "tf_title", "sf_variation", "tf_variation", "sf_category", "tf_category",
+        "sf_price", "tf_price", "price_delta", "price_delta_pct"]].reset_index(drop=True)
+    return item_matches, summarize_pairs(item_matches, pairs)
+
+
+def summarize_pairs(item_matches: pd.DataFrame, pairs: pd.DataFrame) -> pd.DataFrame:
+    """Per vendor pair: item counts, coverage (share of each side matched) and price delta stats."""
+    counts = pd.crosstab(item_matches["pair_id"], item_matches["match_type"]).reindex(columns=MATCH_TYPES, fill_value=0)
+    matched = counts[[MATCH_EXACT, MATCH_COMPACT, MATCH_FUZZY]].sum(axis=1)
+    summary = pd.DataFrame({
+        "matched": matched,
+        "sf_only": counts[SF_ONLY],
+        "tf_only": counts[TF_ONLY],
+    })
+    summary["sf_items"] = summary["matched"] + summary["sf_only"]
+    summary["tf_items"] = summary["matched"] + summary["tf_only"]
+    summary["sf_coverage"] = (summary["matched"] / summary["sf_items"].where(summary["sf_items"] > 0)).round(3)
+    summary["tf_coverage"] = (summary["matched"] / summary["tf_items"].where(summary["tf_items"] > 0)).round(3)
+    by_pair = item_matches["pair_id"]
+    summary["median_delta_pct"] = item_matches["price_delta_pct"].groupby(by_pair).median().round(2)
+    summary["tf_cheaper"] = (item_matches["price_delta"] < 0).groupby(by_pair).sum()
+    summary["sf_cheaper"] = (item_matches["price_delta"] > 0).groupby(by_pair).sum()
+    summary = pairs.merge(summary.reset_index(), on="pair_id", how="inner")
+    for col in ("tf_cheaper", "sf_cheaper"):
+        summary[col] = summary[col].fillna(0).astype(int)
+    return summary
+
+
+def write_comparison(item_matches: pd.DataFrame, pair_summary: pd.DataFrame, db_path: Path):
+    """Writes both tables to a SQLite file (replacing earlier results) with lookup indexes."""
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    with sqlite3.connect(db_path) as conn:
+        item_matches.assign(match_type=item_matches["match_type"].astype(str)).to_sql(
+            "item_matches", conn, if_exists="replace", index=False, chunksize=50_000)
+        pair_summary.to_sql("pair_summary", conn, if_exists="replace", index=False)
+        for table, col in (("item_matches", "sf_code"), ("item_matches", "tf_code"), ("item_matches", "match_type"),
+                           ("pair_summary", "sf_code"), ("pair_summary", "tf_code")):
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{col} ON {table} ({col})")
+
+
+def load_sf_menus(path: Path) -> pd.DataFrame:
+    """Crawled Snappfood menus (bulk_crawl.py output)."""
+    columns = {"vendor_code", "category_name", "item_id", "item_title", "item_variation", "price"}
+    return pd.read_csv(path, dtype=str, encoding="utf-8-sig", usecols=lambda col: col in columns)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Align SF and TF menus of matched vendors and compare prices.")
+    parser.add_argument("--sf-menus", type=Path, default=config.OUTPUT_DIR_MENU_SCRAPER / "bulk_menu.csv", help="Crawled Snappfood menus (bulk_crawl.py output).")
+    parser.add_argument("--tf-menu", type=Path, default=config.TF_MENU_CSV_PATH, help="TapsiFood menu export.")
+    parser.add_argument("--pairs", type=Path, default=config.MATCHED_VENDORS_CSV_PATH, help="matched_vendors.csv with sf_code/tf_code.")
+    parser.add_argument("--output", type=Path, default=config.PRICE_COMPARISON_DB, help="SQLite file for item_matches / pair_summary.")
+    parser.add_argument("--min-similarity", type=float, default=config.PRICE_MATCH_MIN_SIMILARITY, help="Trigram similarity for fuzzy matches (1 disables them).")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    started = time.perf_counter()
+    pairs = load_pairs(args.pairs)
+    sf_items = load_sf_menus(args.sf_menus)
+    tf_items = load_tf_table(args.tf_menu, config.TF_MENU_CATEGORY_COLS)
+    logger.info(f"Loaded {len(pairs)} vendor pairs, {len(sf_items)} SF items, {len(tf_items)} TF items in {time.perf_counter() - started:.1f}s")
+
+    item_matches, pair_summary = compare_menus(sf_items, tf_items, pairs, min_similarity=args.min_similarity)
+    write_comparison(item_matches, pair_summary, args.output)
+    by_type = item_matches["match_type"].value_counts().to_dict()
+    logger.info(f"Compared {len(pair_summary)} vendor pairs in {time.perf_counter() - started:.1f}s: {by_type} -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
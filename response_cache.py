@@ -0,0 +1,171 @@
+# response_cache.py
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import config
+
+
+class CachedResponse:
+    """A decoded vendor JSON payload plus the validators needed to revalidate it."""
+
+    __slots__ = ("data", "etag", "last_modified", "stored_at")
+
+    def __init__(self, data: dict, etag: str | None = None, last_modified: str | None = None, stored_at: float | None = None):
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = time.time() if stored_at is None else stored_at
+
+    def is_fresh(self, ttl: float) -> bool:
+        return (time.time() - self.stored_at) < ttl
+
+    def can_revalidate(self) -> bool:
+        return bool(self.etag or self.last_modified)
+
+    def conditional_headers(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class VendorResponseCache:
+    """Thread-safe LRU + TTL cache of Snappfood vendor JSON, with an optional disk tier.
+
+    Memory hits hand back the already-decoded dict (callers must treat it as
+    read-only). Stale entries that carry an ETag/Last-Modified are kept so the
+    next fetch can send a conditional request and reuse them on a 304.
+    """
+
+    def __init__(self, max_entries: int = config.SF_CACHE_MAX_ENTRIES, ttl: float = config.SF_CACHE_TTL_SEC,
+                 disk_dir: Path | None = None):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "disk_hits": 0, "misses": 0, "revalidated": 0, "stores": 0, "evictions": 0}
+
+    # --- Lookup ---
+    def get(self, vendor_code: str) -> CachedResponse | None:
+        """Returns the cached entry (fresh or revalidatable-stale) or None."""
+        with self._lock:
+            entry = self._entries.get(vendor_code)
+            if entry is not None:
+                self._entries.move_to_end(vendor_code)
+        if entry is None and self.disk_dir is not None:
+            entry = self._read_disk(vendor_code)
+            if entry is not None:
+                self._remember(vendor_code, entry)
+                if entry.is_fresh(self.ttl):
+                    self._count("disk_hits")
+        if entry is None:
+            return None
+        if not entry.is_fresh(self.ttl) and not entry.can_revalidate():
+            return None
+        return entry
+
+    def record_hit(self):
+        self._count("hits")
+
+    def record_miss(self):
+        self._count("misses")
+
+    # --- Updates ---
+    def put(self, vendor_code: str, data: dict, etag: str | None = None, last_modified: str | None = None) -> CachedResponse:
+        entry = CachedResponse(data, etag, last_modified)
+        self._remember(vendor_code, entry)
+        self._count("stores")
+        if self.disk_dir is not None:
+            self._write_disk(vendor_code, entry)
+        return entry
+
+    def mark_revalidated(self, vendor_code: str, entry: CachedResponse):
+        """Refreshes an entry's TTL after the upstream answered 304 Not Modified."""
+        entry.stored_at = time.time()
+        self._remember(vendor_code, entry)
+        self._count("revalidated")
+        if self.disk_dir is not None:
+            self._write_disk(vendor_code, entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["revalidated"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["hits"] + stats["revalidated"]) / lookups, 4) if lookups else 0.0
+        stats.update({"max_entries": self.max_entries, "ttl_sec": self.ttl, "disk_tier": self.disk_dir is not None})
+        return stats
+
+    # --- Internals ---
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _remember(self, vendor_code: str, entry: CachedResponse):
+        with self._lock:
+            self._entries[vendor_code] = entry
+            self._entries.move_to_end(vendor_code)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def _disk_path(self, vendor_code: str) -> Path:
+        # The readable prefix is only for humans; the hash keeps codes that differ only in punctuation apart
+        digest = hashlib.sha256(vendor_code.encode("utf-8")).hexdigest()[:32]
+        return self.disk_dir / f"{''.join(filter(str.isalnum, vendor_code))[:32]}-{digest}.json"
+
+    def _read_disk(self, vendor_code: str) -> CachedResponse | None:
+        path = self._disk_path(vendor_code)
+        try:
+            with open(path, encoding="utf-8") as f:
+                raw = json.load(f)
+            return CachedResponse(raw["data"], raw.get("etag"), raw.get("last_modified"), raw.get("stored_at", 0))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_disk(self, vendor_code: str, entry: CachedResponse):
+        path = self._disk_path(vendor_code)
+        tmp_path = None
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # A unique temp file per writer, so concurrent writes of one vendor never share (and truncate) it
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=path.parent, prefix=path.stem,
+                                             suffix=".tmp", delete=False) as f:
+                tmp_path = Path(f.name)
+                json.dump({"stored_at": entry.stored_at, "etag": entry.etag,
+                           "last_modified": entry.last_modified, "data": entry.data}, f, ensure_ascii=False)
+            os.replace(tmp_path, path) # Atomic swap: readers never see a half-written file
+        except OSError:
+            # The disk tier is best-effort; the memory tier still has the entry
+            if tmp_path is not None:
+                tmp_path.unlink(missing_ok=True)
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> VendorResponseCache | None:
+    """Returns the process-wide vendor response cache, or None when SF_CACHE_TTL_SEC <= 0."""
+    global _response_cache
+    if config.SF_CACHE_TTL_SEC <= 0:
+        return None
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = VendorResponseCache(
+                    disk_dir=config.SF_CACHE_DIR if config.SF_CACHE_DISK_ENABLED else None)
+    return _response_cache
@@ -3,7 +3,8 @@ import * as dom from './dom.js';
 import * as state from './state.js';
 import { setFetchStatus, resetUI } from './ui/common.js';
 import { populateVendorInfoForm } from './ui/vendorInfo.js';
-import { renderMenuItems } from './ui/menu.js';
+import { renderMenuItems, refreshCategory } from './ui/menu.js';
+import { buildToppingGroups } from './ui/toppingsModal.js';
 // PapaParse is global
 
 function getPlatformSpecificGenerateButton(platform) {
@@ -15,7 +16,114 @@ function getPlatformSpecificMenuItemsContainer(platform) {
 }
 
 
-export function processPlatformData(platform, csvData, vendorInfo, originalIdentifier) {
+const CATEGORY_FETCH_CONCURRENCY = 4; // Parallel category page requests when the whole lazy menu is needed
+
+
+// Fills the platform's vendor store and form; firstRow is the first menu row (or the vendor block alone).
+function loadPlatformVendor(platform, firstRow, headers, vendorInfo, originalIdentifier) {
+    const currentVendorDataStore = state.getVendorDataStore(platform);
+    currentVendorDataStore.vendorInfo = vendorInfo || (firstRow ? { ...firstRow } : {});
+    currentVendorDataStore.originalHeaders = headers || [];
+
+    if (firstRow) {
+        // Store a copy of the first row as potential base for vendor info if not explicitly provided
+        currentVendorDataStore.originalData = { ...firstRow };
+    } else {
+        currentVendorDataStore.originalData = {};
+    }
+    // Store original snappfood_vendor_id or other crucial IDs from vendorInfo into the store
+    if(vendorInfo) {
+         if (platform === 'sf' && vendorInfo.snappfood_vendor_id) currentVendorDataStore.vendorInfo.snappfood_vendor_id = vendorInfo.snappfood_vendor_id;
+         if (vendorInfo.rating) currentVendorDataStore.vendorInfo.rating = vendorInfo.rating;
+         if (vendorInfo.comment_count) currentVendorDataStore.vendorInfo.comment_count = vendorInfo.comment_count;
+         // Add other platform specific ids if necessary
+    }
+
+
+    populateVendorInfoForm(platform, currentVendorDataStore.vendorInfo, originalIdentifier);
+    state.getManuallyAddedCategoriesSet(platform).clear(); // Clear manually added for this platform
+}
+
+// One editor item. idx is the row's position in the full menu (unique per platform, used in DOM ids);
+// toppings is the row's parsed topping groups, or its group IDs when useCatalog is set.
+function buildMenuItem(platform, row, idx, toppings, useCatalog) {
+    let productToppings = [];
+    let toppingGroupIds;
+    if (useCatalog) {
+        // Items only reference shared groups; editable copies are built when the toppings modal opens
+        toppingGroupIds = Array.isArray(toppings) ? toppings : [];
+        productToppings = null;
+    } else if (platform === 'sf') {
+        try {
+            productToppings = buildToppingGroups(platform, idx, toppings);
+        } catch (e) { console.warn(`Error parsing toppings for ${platform} item ${idx}:`, e, row.product_toppings); }
+    }
+    return {
+        domId: `item-src-${platform}-${idx}`,
+        selected: true, // Default all loaded items to selected
+        itemId: row.item_id || '',
+        itemTitle: row.item_title || '',
+        description: row.description || row.item_description || '',
+        price: parseFloat(row.price) || 0,
+        rating: parseFloat(row.rating) || 0,
+        categoryName: row.category_name || "Uncategorized",
+        productToppings: productToppings, // SF specific; null until materialized from toppingGroupIds
+        ...(useCatalog ? { toppingGroupIds: toppingGroupIds } : {}),
+        sourceIndex: idx,
+        originalRowData: { ...row }, // Store the full original row
+        platform: platform
+    };
+}
+
+// Columnar item columns ({column: [...]}) -> row objects carrying the vendor block; toppings are left out.
+function rowsFromColumns(vendor, items, count) {
+    const columns = Object.keys(items || {}).filter(col => col !== 'product_toppings');
+    const rows = [];
+    for (let i = 0; i < (count || 0); i++) {
+        const row = { ...vendor };
+        for (const col of columns) {
+            const value = items[col][i];
+            row[col] = value === null || value === undefined ? '' : value;
+        }
+        rows.push(row);
+    }
+    return rows;
+}
+
+// Shared by the CSV and columnar paths once rows are available as plain objects.
+// getToppings(row, idx) returns the row's parsed topping groups (array) for SF, or its
+// group IDs when a toppingCatalog ({group ID: group}) came with the menu.
+function loadPlatformRows(platform, rows, headers, vendorInfo, originalIdentifier, getToppings, toppingCatalog = null) {
+    const generateButton = getPlatformSpecificGenerateButton(platform);
+    loadPlatformVendor(platform, rows && rows[0], headers, vendorInfo, originalIdentifier);
+
+    if (!rows || rows.length === 0) {
+        setFetchStatus(`${platform.toUpperCase()} menu is empty. Vendor info processed.`, "success");
+        state.setMenuItemsStore(platform, []);
+        renderMenuItems(platform); // Will show empty message and update quick nav
+        if (generateButton) generateButton.disabled = true;
+        return;
+    }
+
+    const useCatalog = platform === 'sf' && toppingCatalog !== null;
+    if (useCatalog) state.setSfToppingCatalog(toppingCatalog);
+
+    const menuItems = rows.map((row, idx) => {
+        let toppings = [];
+        if (platform === 'sf') {
+            try {
+                toppings = getToppings(row, idx);
+            } catch (e) { console.warn(`Error parsing toppings for ${platform} item ${idx}:`, e, row.product_toppings); }
+        }
+        return buildMenuItem(platform, row, idx, toppings, useCatalog);
+    });
+    state.setMenuItemsStore(platform, menuItems);
+    renderMenuItems(platform);
+    if (generateButton) generateButton.disabled = menuItems.length === 0;
+    setFetchStatus(`${platform.toUpperCase()} menu processed successfully.`, "success");
+}
+
+export function processPlatformData(platform, csvData, vendorInfo, originalIdentifier, toppingCatalog = null) {
     setFetchStatus(`Processing ${platform.toUpperCase()} data...`, "processing");
 
     const papaDone = (parseResults) => {
@@ -33,75 +141,8 @@ export function processPlatformData(platform, csvData, vendorInfo, originalIdent
             return;
         }
 
-        const currentVendorDataStore = state.getVendorDataStore(platform);
-        currentVendorDataStore.vendorInfo = vendorInfo || (parseResults.data && parseResults.data[0] ? { ...parseResults.data[0] } : {});
-        currentVendorDataStore.originalHeaders = parseResults.meta.fields || [];
-
-        if (parseResults.data && parseResults.data[0]) {
-            // Store a copy of the first row as potential base for vendor info if not explicitly provided
-            currentVendorDataStore.originalData = { ...parseResults.data[0] };
-        } else {
-            currentVendorDataStore.originalData = {};
-        }
-        // Store original snappfood_vendor_id or other crucial IDs from vendorInfo into the store
-        if(vendorInfo) {
-             if (platform === 'sf' && vendorInfo.snappfood_vendor_id) currentVendorDataStore.vendorInfo.snappfood_vendor_id = vendorInfo.snappfood_vendor_id;
-             if (vendorInfo.rating) currentVendorDataStore.vendorInfo.rating = vendorInfo.rating;
-             if (vendorInfo.comment_count) currentVendorDataStore.vendorInfo.comment_count = vendorInfo.comment_count;
-             // Add other platform specific ids if necessary
-        }
-
-
-        populateVendorInfoForm(platform, currentVendorDataStore.vendorInfo, originalIdentifier);
-        state.getManuallyAddedCategoriesSet(platform).clear(); // Clear manually added for this platform
-
-        if (!parseResults.data || parseResults.data.length === 0) {
-            setFetchStatus(`${platform.toUpperCase()} menu is empty. Vendor info processed.`, "success");
-            state.setMenuItemsStore(platform, []);
-            renderMenuItems(platform); // Will show empty message and update quick nav
-            if (generateButton) generateButton.disabled = true;
-            return;
-        }
-
-        const menuItems = parseResults.data.map((row, idx) => {
-            let toppings = [];
-            if (platform === 'sf' && row.product_toppings) {
-                try {
-                    const parsedToppings = JSON.parse(row.product_toppings || '[]');
-                    if (Array.isArray(parsedToppings)) {
-                        toppings = parsedToppings.map((g, gi) => ({
-                            ...g,
-                            domId: `group-src-${platform}-${idx}-${gi}`,
-                            originalGroupId: g.id, // Store original ID
-                            selected: true, // Default to selected
-                            toppings: (Array.isArray(g.toppings) ? g.toppings : []).map((t, ti) => ({
-                                ...t,
-                                domId: `topping-src-${platform}-${idx}-${gi}-${ti}`,
-                                originalToppingId: t.id, // Store original ID
-                                selected: true // Default to selected
-                            }))
-                        }));
-                    }
-                } catch (e) { console.warn(`Error parsing toppings for ${platform} item ${idx}:`, e, row.product_toppings); }
-            }
-            return {
-                domId: `item-src-${platform}-${idx}`,
-                selected: true, // Default all loaded items to selected
-                itemId: row.item_id || '',
-                itemTitle: row.item_title || '',
-                description: row.description || row.item_description || '',
-                price: parseFloat(row.price) || 0,
-                rating: parseFloat(row.rating) || 0,
-                categoryName: row.category_name || "Uncategorized",
-                productToppings: toppings, // SF specific
-                originalRowData: { ...row }, // Store the full original row
-                platform: platform
-            };
-        });
-        state.setMenuItemsStore(platform, menuItems);
-        renderMenuItems(platform);
-        if (generateButton) generateButton.disabled = menuItems.length === 0;
-        setFetchStatus(`${platform.toUpperCase()} menu processed successfully.`, "success");
+        loadPlatformRows(platform, parseResults.data, parseResults.meta.fields, vendorInfo, originalIdentifier,
+            (row) => row.product_toppings ? JSON.parse(row.product_toppings || '[]') : [], toppingCatalog);
     };
 
     Papa.parse(csvData, {
@@ -119,6 +160,133 @@ export function processPlatformData(platform, csvData, vendorInfo, originalIdent
     });
 }
 
+// Columnar JSON menu ({vendor, headers, items: {column: [...]}, item_count}) from /scrape?format=json.
+// No CSV parsing and no per-row JSON.parse: toppings already arrive as objects, or as group IDs
+// into menu.topping_groups when the menu was requested with toppings=catalog.
+// With format=index large menus come as a category index instead (menu.categories); see loadMenuCategory.
+export function processPlatformMenu(platform, menu, vendorInfo, originalIdentifier) {
+    setFetchStatus(`Processing ${platform.toUpperCase()} data...`, "processing");
+    if (Array.isArray(menu.categories)) {
+        loadPlatformIndex(platform, menu, vendorInfo, originalIdentifier);
+        return;
+    }
+
+    const toppingsColumn = (menu.items && menu.items.product_toppings) || [];
+    const rows = rowsFromColumns(menu.vendor || {}, menu.items, menu.item_count);
+
+    loadPlatformRows(platform, rows, menu.headers, vendorInfo, originalIdentifier, (row, idx) => toppingsColumn[idx] || [],
+        menu.topping_groups || null);
+}
+
+// Category index ({vendor, headers, menu_id, categories: [{name, position, item_count, first_index}]}):
+// only the vendor and the category list are loaded now; each category's items when it is first shown.
+function loadPlatformIndex(platform, menu, vendorInfo, originalIdentifier) {
+    loadPlatformVendor(platform, { ...(menu.vendor || {}) }, menu.headers, vendorInfo, originalIdentifier);
+    const categories = new Map(menu.categories.map(cat => [cat.name || "Uncategorized", {
+        position: cat.position, itemCount: cat.item_count, firstIndex: cat.first_index, status: 'pending'
+    }]));
+    state.setLazyMenu(platform, { menuId: menu.menu_id, vendor: menu.vendor || {}, headers: menu.headers || [], categories });
+    if (platform === 'sf') state.setSfToppingCatalog({}); // Filled page by page
+    state.setMenuItemsStore(platform, []);
+    renderMenuItems(platform);
+    const generateButton = getPlatformSpecificGenerateButton(platform);
+    if (generateButton) generateButton.disabled = categories.size === 0;
+    setFetchStatus(`${platform.toUpperCase()} menu index loaded (${menu.item_count} items in ${categories.size} categories).`, "success");
+}
+
+// Fetches one category of a lazily loaded menu into the item store; concurrent calls share the request.
+export function loadMenuCategory(platform, categoryName) {
+    const lazyMenu = state.getLazyMenu(platform);
+    const category = lazyMenu && lazyMenu.categories.get(categoryName);
+    if (!category || category.status === 'loaded') return Promise.resolve();
+    if (category.request) return category.request;
+
+    category.status = 'loading';
+    category.request = (async () => {
+        try {
+            const response = await fetch(`/menu/${encodeURIComponent(lazyMenu.menuId)}/categories/${category.position}`);
+            const page = await response.json();
+            if (!response.ok || !page.success) throw new Error(page.error || `HTTP ${response.status}`);
+            if (state.getLazyMenu(platform) !== lazyMenu) return; // Another vendor was loaded meanwhile
+
+            const useCatalog = platform === 'sf' && page.topping_groups !== undefined;
+            if (useCatalog) Object.assign(state.getSfToppingCatalog(), page.topping_groups);
+            const toppingsColumn = (page.items && page.items.product_toppings) || [];
+            const sourceIndex = page.source_index || [];
+            const newItems = rowsFromColumns(lazyMenu.vendor, page.items, page.item_count).map((row, i) =>
+                buildMenuItem(platform, row, i < sourceIndex.length ? sourceIndex[i] : page.first_index + i,
+                    platform === 'sf' ? (toppingsColumn[i] || []) : [], useCatalog));
+            // Keep the store in menu order, whatever order the categories were opened in: a category's
+            // items need not be contiguous in the menu, so each one goes before the first later item
+            const items = state.getMenuItemsStore(platform);
+            const merged = [];
+            let next = 0;
+            for (const item of items) {
+                while (next < newItems.length && typeof item.sourceIndex === 'number' && item.sourceIndex > newItems[next].sourceIndex) {
+                    merged.push(newItems[next++]);
+                }
+                merged.push(item);
+            }
+            merged.push(...newItems.slice(next));
+            items.splice(0, items.length, ...merged);
+            category.status = 'loaded';
+        } catch (error) {
+            console.warn(`Could not load ${platform.toUpperCase()} category "${categoryName}":`, error);
+            category.status = 'error';
+            throw error;
+        } finally {
+            category.request = null;
+            if (state.getLazyMenu(platform) === lazyMenu) refreshCategory(platform, categoryName);
+        }
+    })();
+    return category.request;
+}
+
+// Loads every category not loaded yet (e.g. before CSV export); rejects if any of them fails.
+export async function loadAllMenuCategories(platform) {
+    const lazyMenu = state.getLazyMenu(platform);
+    if (!lazyMenu) return;
+    const queue = [...lazyMenu.categories.keys()].filter(name => lazyMenu.categories.get(name).status !== 'loaded');
+    const failures = [];
+    const worker = async () => {
+        while (queue.length > 0) {
+            const name = queue.shift();
+            try {
+                await loadMenuCategory(platform, name);
+            } catch (error) {
+                failures.push(name);
+            }
+        }
+    };
+    await Promise.all(Array.from({ length: Math.min(CATEGORY_FETCH_CONCURRENCY, queue.length) }, worker));
+    if (failures.length > 0) throw new Error(`Could not load categories: ${failures.join(', ')}`);
+}
+
+
+let vendorSuggestController = null;
+
+export async function fetchVendorSuggestions(query) {
+    if (!dom.vendorSuggestions) return;
+    if (vendorSuggestController) vendorSuggestController.abort(); // Only the latest keystroke matters
+    dom.vendorSuggestions.innerHTML = '';
+    if (query.length < 2 || /^https?:/i.test(query)) return;
+    vendorSuggestController = new AbortController();
+    try {
+        const response = await fetch(`/vendors/search?q=${encodeURIComponent(query)}&limit=10`,
+            { signal: vendorSuggestController.signal });
+        if (!response.ok) return;
+        const data = await response.json();
+        (data.results || []).forEach(vendor => {
+            const option = document.createElement('option');
+            option.value = vendor.sf_code || vendor.tf_code;
+            option.label = [vendor.sf_name || vendor.tf_name, vendor.tf_code, vendor.city_id].filter(Boolean).join(' | ');
+            dom.vendorSuggestions.appendChild(option);
+        });
+    } catch (error) {
+        if (error.name !== 'AbortError') console.warn("Vendor search failed:", error);
+    }
+}
+
 
 export async function handleFetchAndLoad() {
     const identifier = dom.vendorIdentifierInput.value.trim();
@@ -140,7 +308,9 @@ export async function handleFetchAndLoad() {
         const response = await fetch('/scrape', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ identifier: identifier })
+            // Columnar menus with each distinct topping group sent once; CSV and inline toppings stay available server-side
+            // Large menus come as a category index; their items are fetched per category (loadMenuCategory)
+            body: JSON.stringify({ identifier: identifier, format: 'index', toppings: 'catalog' })
         });
         const result = await response.json();
         console.log("Backend Response:", result);
@@ -159,8 +329,12 @@ export async function handleFetchAndLoad() {
             if (result.snappfood) {
                 if (result.snappfood.data_loaded) {
                     messages.push(`SnappFood data for ${result.snappfood.original_identifier || 'vendor'} loaded.`);
-                    if (result.snappfood.csv_data) {
-                         processPlatformData('sf', result.snappfood.csv_data, result.snappfood.vendor_info, result.snappfood.original_identifier);
+                    if (result.snappfood.menu) {
+                         processPlatformMenu('sf', result.snappfood.menu, result.snappfood.vendor_info, result.snappfood.original_identifier);
+                         sfLoadedSuccessfully = true;
+                    } else if (result.snappfood.csv_data) {
+                         processPlatformData('sf', result.snappfood.csv_data, result.snappfood.vendor_info, result.snappfood.original_identifier,
+                             result.snappfood.topping_groups || null);
                          sfLoadedSuccessfully = true;
                     } else { // Data loaded but no CSV (e.g., only vendor info, empty menu)
                         populateVendorInfoForm('sf', result.snappfood.vendor_info || {}, result.snappfood.original_identifier);
@@ -174,7 +348,7 @@ export async function handleFetchAndLoad() {
                     if(sfContainer) sfContainer.innerHTML = `<div class="text-center p-5 initial-message"><h5>SnappFood data could not be loaded. ${result.snappfood.error || ''}</h5></div>`;
                     renderMenuItems('sf');
                 }
-                if (sfGenerateBtn) sfGenerateBtn.disabled = !sfLoadedSuccessfully || state.getMenuItemsStore('sf').length === 0 && state.getManuallyAddedCategoriesSet('sf').size === 0;
+                if (sfGenerateBtn) sfGenerateBtn.disabled = !sfLoadedSuccessfully || state.getMenuItemsStore('sf').length === 0 && state.getManuallyAddedCategoriesSet('sf').size === 0 && !state.getLazyMenu('sf');
             }
 
 
@@ -182,7 +356,10 @@ export async function handleFetchAndLoad() {
             if (result.tapsifood) {
                 if (result.tapsifood.data_loaded) {
                     messages.push(`TapsiFood data for ${result.tapsifood.original_identifier || 'vendor'} loaded.`);
-                     if (result.tapsifood.csv_data) {
+                     if (result.tapsifood.menu) {
+                        processPlatformMenu('tf', result.tapsifood.menu, result.tapsifood.vendor_info, result.tapsifood.original_identifier);
+                        tfLoadedSuccessfully = true;
+                     } else if (result.tapsifood.csv_data) {
                         processPlatformData('tf', result.tapsifood.csv_data, result.tapsifood.vendor_info, result.tapsifood.original_identifier);
                         tfLoadedSuccessfully = true;
                      } else {
@@ -197,7 +374,7 @@ export async function handleFetchAndLoad() {
                     if(tfContainer) tfContainer.innerHTML = `<div class="text-center p-5 initial-message"><h5>TapsiFood data could not be loaded. ${result.tapsifood.error || ''}</h5></div>`;
                     renderMenuItems('tf');
                 }
-                if(tfGenerateBtn) tfGenerateBtn.disabled = !tfLoadedSuccessfully || state.getMenuItemsStore('tf').length === 0 && state.getManuallyAddedCategoriesSet('tf').size === 0;
+                if(tfGenerateBtn) tfGenerateBtn.disabled = !tfLoadedSuccessfully || state.getMenuItemsStore('tf').length === 0 && state.getManuallyAddedCategoriesSet('tf').size === 0 && !state.getLazyMenu('tf');
             }
 
             setFetchStatus(messages.join(' '), "success");
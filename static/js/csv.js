@@ -2,6 +2,7 @@
 import * as state from './state.js';
 import { getVendorInfoFromForm } from './ui/vendorInfo.js';
 import { convertTagsInputToJSON, downloadCSV } from './utils.js';
+import { resolveCatalogToppingGroups } from './ui/toppingsModal.js';
 // PapaParse is assumed to be globally available (from papaparse.min.js script tag)
 // If you prefer to import it as a module, you'd need a modular version of PapaParse.
 
@@ -65,7 +66,10 @@ export function handleGenerateCsv(platform) {
         baseRow.price = item.price;
         baseRow.rating = item.rating;
 
-        if (platform === 'sf') {
+        if (platform === 'sf' && !Array.isArray(item.productToppings)) {
+            // Toppings never opened for editing: the catalog groups already have the export shape
+            baseRow.product_toppings = JSON.stringify(resolveCatalogToppingGroups(item));
+        } else if (platform === 'sf') {
             baseRow.product_toppings = JSON.stringify(
                 (item.productToppings || []).filter(g => g.selected).map(g => ({
                     id: (typeof g.originalGroupId !== 'undefined' && g.originalGroupId !== null && String(g.originalGroupId).trim() !== "") ? g.originalGroupId : (g.id || ''),
@@ -1,5 +1,6 @@
 // static/js/dom.js
 export const vendorIdentifierInput = document.getElementById('vendor-identifier-input');
+export const vendorSuggestions = document.getElementById('vendor-suggestions');
 export const fetchButton = document.getElementById('fetch-button');
 export const fetchSpinner = fetchButton.querySelector('.spinner-border');
 export const fetchStatus = document.getElementById('fetch-status');
@@ -1,7 +1,7 @@
 // static/js/main.js
 import * as dom from './dom.js';
 import * as state from './state.js'; // May not need direct state import if actions go through other modules
-import { handleFetchAndLoad } from './api.js';
+import { handleFetchAndLoad, fetchVendorSuggestions, loadAllMenuCategories } from './api.js';
 import { handleGenerateCsv } from './csv.js';
 import { setFetchStatus, resetUI, handleCancelReset } from './ui/common.js';
 import { handleAddNewCategory, setupMenuEventListeners, renderMenuItems } from './ui/menu.js';
@@ -28,6 +28,11 @@ document.addEventListener('DOMContentLoaded', () => {
         dom.vendorIdentifierInput.addEventListener('keypress', (e) => {
             if (e.key === 'Enter') handleFetchAndLoad();
         });
+        let suggestTimer = null;
+        dom.vendorIdentifierInput.addEventListener('input', () => {
+            clearTimeout(suggestTimer);
+            suggestTimer = setTimeout(() => fetchVendorSuggestions(dom.vendorIdentifierInput.value.trim()), 150);
+        });
     }
 
     if (dom.sfAddCategoryButton) {
@@ -37,17 +42,26 @@ document.addEventListener('DOMContentLoaded', () => {
         dom.tfAddCategoryButton.addEventListener('click', () => handleAddNewCategory('tf'));
     }
 
+    // Lazily loaded menus fetch their remaining categories first so the CSV has every item
+    const generateCsv = async (platform) => {
+        const label = platform.toUpperCase();
+        if (state.getLazyMenu(platform)) {
+            setFetchStatus(`Loading all ${label} categories...`, "processing");
+            try {
+                await loadAllMenuCategories(platform);
+            } catch (error) {
+                setFetchStatus(`${label} CSV not generated: ${error.message}`, "error");
+                return;
+            }
+        }
+        handleGenerateCsv(platform);
+        setFetchStatus(`Generated ${label} CSV.`, "success"); // Update status after generation
+    };
     if (dom.sfGenerateButton) {
-        dom.sfGenerateButton.addEventListener('click', () => {
-            handleGenerateCsv('sf');
-            setFetchStatus(`Generated SF CSV.`, "success"); // Update status after generation
-        });
+        dom.sfGenerateButton.addEventListener('click', () => generateCsv('sf'));
     }
     if (dom.tfGenerateButton) {
-        dom.tfGenerateButton.addEventListener('click', () => {
-            handleGenerateCsv('tf');
-            setFetchStatus(`Generated TF CSV.`, "success"); // Update status after generation
-        });
+        dom.tfGenerateButton.addEventListener('click', () => generateCsv('tf'));
     }
 
     if (dom.cancelButton) {
@@ -5,6 +5,9 @@ let sfVendorDataStore = { originalData: {}, originalHeaders: [], vendorInfo: {}
 let sfMenuItemsStore = [];
 let tfVendorDataStore = { originalData: {}, originalHeaders: [], vendorInfo: {} };
 let tfMenuItemsStore = [];
+let sfToppingCatalog = {}; // Topping group ID -> group, each distinct group once (catalog toppings mode)
+// Menus sent as a category index (format=index): {menuId, vendor, headers, categories: Map name -> {position, itemCount, firstIndex, status}}
+let lazyMenus = { sf: null, tf: null };
 
 let currentEditingSFToppingsItemId = null;
 let nextNewItemIdInternal = { sf: 0, tf: 0 };
@@ -18,6 +21,10 @@ export const getSfVendorDataStore = () => sfVendorDataStore; // Primarily for di
 export const getSfMenuItemsStore = () => sfMenuItemsStore;     // like api.js or csv.js
 export const getTfVendorDataStore = () => tfVendorDataStore;
 export const getTfMenuItemsStore = () => tfMenuItemsStore;
+export const getSfToppingCatalog = () => sfToppingCatalog;
+export const setSfToppingCatalog = (catalog) => { sfToppingCatalog = catalog || {}; };
+export const getLazyMenu = (platform) => lazyMenus[platform];
+export const setLazyMenu = (platform, lazyMenu) => { lazyMenus[platform] = lazyMenu || null; };
 
 export const getCurrentEditingSFToppingsItemId = () => currentEditingSFToppingsItemId;
 export const setCurrentEditingSFToppingsItemId = (itemId) => { currentEditingSFToppingsItemId = itemId; };
@@ -52,6 +59,8 @@ export function resetAllStateData() {
     sfMenuItemsStore = [];
     tfVendorDataStore = { originalData: {}, originalHeaders: [], vendorInfo: {} };
     tfMenuItemsStore = [];
+    sfToppingCatalog = {};
+    lazyMenus = { sf: null, tf: null };
     currentEditingSFToppingsItemId = null;
     nextNewItemIdInternal = { sf: 0, tf: 0 };
     nextNewToppingGroupIdInternal = 0;
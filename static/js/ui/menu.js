@@ -3,7 +3,16 @@ import * as dom from '../dom.js';
 import * as state from '../state.js';
 import { isProbablyRTL, convertTagsInputToJSON } from '../utils.js';
 import { getVendorInfoFromForm } from './vendorInfo.js';
-import { openToppingsModalForItem } from './toppingsModal.js'; // For item card's toppings button
+import { openToppingsModalForItem, countSelectedToppingGroups } from './toppingsModal.js'; // For item card's toppings button
+import { loadMenuCategory } from '../api.js'; // Category pages of lazily loaded menus
+
+const VIRTUALIZE_MIN_ITEMS = 200; // Larger menus (and all lazily loaded ones) only keep cards near the viewport in the DOM
+const WINDOW_OVERSCAN_PX = 800; // Cards rendered above and below the visible area
+const DEFAULT_CARD_HEIGHT_PX = 180; // Row height estimate until a real card has been measured
+const LAZY_LOAD_DELAY_MS = 150; // Categories only scrolled past (e.g. by quick nav) are not fetched
+
+// Per platform while virtualized: {sections: Map categoryName -> {section, container, items, cards, rendered, sizeKey}, cardHeight, measured, loadTimer}
+const virtualViews = { sf: null, tf: null };
 
 // --- Helper Functions to access platform-specific DOM elements more easily ---
 function getMenuItemsContainer(platform) {
@@ -37,7 +46,7 @@ function createMenuItemCard(item) {
         </div>
         <textarea class="form-control form-control-sm item-description-textarea mb-2 ${descRTL ? 'rtl-input' : ''}" data-field="description" placeholder="Description...">${item.description || ''}</textarea>
         <div class="item-controls d-flex justify-content-between align-items-center">
-            ${hasToppingsButton ? `<button class="btn btn-sm btn-outline-secondary item-toppings-btn" type="button" aria-label="Manage Toppings">Toppings (${item.productToppings?.filter(g => g.selected).length || 0} Grps)</button>` : '<div class="text-muted small" style="min-width:80px;">(No Toppings)</div>' }
+            ${hasToppingsButton ? `<button class="btn btn-sm btn-outline-secondary item-toppings-btn" type="button" aria-label="Manage Toppings">Toppings (${countSelectedToppingGroups(item)} Grps)</button>` : '<div class="text-muted small" style="min-width:80px;">(No Toppings)</div>' }
             <div class="d-flex align-items-center">
                 <div class="input-group input-group-sm item-price-input-group ms-2" style="width:120px;"><span class="input-group-text">تومان</span><input type="number" step="any" min="0" class="form-control" value="${item.price || 0}" data-field="price" aria-label="Price"></div>
                 <div class="input-group input-group-sm item-rating-input-group ms-2" style="width:90px;"><span class="input-group-text" title="Item Rating">⭐</span><input type="number" step="0.1" min="0" max="5" class="form-control" value="${item.rating || 0}" data-field="rating" title="Item Rating (0-5)" aria-label="Item Rating"></div>
@@ -126,6 +135,155 @@ function renderCategoryHeaderDOM(platform, categoryName, addBtn = true) {
 }
 
 
+function createSpacer(height) {
+    const spacer = document.createElement('div');
+    spacer.className = 'virtual-spacer';
+    spacer.style.height = `${height}px`;
+    return spacer;
+}
+
+// Shows cards [first, last) of a category between spacers that stand in for the rest; range null drops all cards.
+function renderCategoryWindow(entry, range, cardHeight) {
+    const key = range ? `${range[0]}:${range[1]}:${entry.items.length}:${cardHeight}` : 'none';
+    if (entry.rendered === key) return;
+    entry.rendered = key;
+    if (!range) {
+        entry.cards = new Map();
+        entry.container.replaceChildren();
+        return;
+    }
+    if (entry.items.length === 0) {
+        entry.container.innerHTML = '<p class="text-muted small ps-2">No items in this category.</p>';
+        return;
+    }
+    const [first, last] = range;
+    const cards = entry.items.slice(first, last).map(item => entry.cards.get(item.domId) || createMenuItemCard(item));
+    entry.cards = new Map(cards.map(card => [card.id, card])); // Cards scrolled out of the window are released
+    entry.container.replaceChildren(createSpacer(first * cardHeight), ...cards, createSpacer((entry.items.length - last) * cardHeight));
+}
+
+// A category of a lazily loaded menu whose items have not arrived: sized like its cards will be
+function renderCategoryPlaceholder(categoryName, entry, lazyCategory, cardHeight) {
+    const key = `placeholder:${lazyCategory.status}:${cardHeight}`;
+    if (entry.rendered === key) return;
+    entry.rendered = key;
+    entry.cards = new Map();
+    const placeholder = document.createElement('div');
+    placeholder.className = 'category-placeholder';
+    placeholder.style.height = `${Math.max(1, lazyCategory.itemCount) * cardHeight}px`;
+    if (lazyCategory.status === 'error') {
+        placeholder.innerHTML = `<span class="text-danger small me-2">Could not load ${lazyCategory.itemCount} items.</span><button type="button" class="btn btn-sm btn-outline-secondary retry-category-btn">Retry</button>`;
+        placeholder.querySelector('.retry-category-btn').dataset.category = categoryName;
+    } else {
+        placeholder.innerHTML = `<span class="spinner-border spinner-border-sm me-2" role="status"></span><span class="small">Loading ${lazyCategory.itemCount} items...</span>`;
+    }
+    entry.container.replaceChildren(placeholder);
+}
+
+// Renders, in each expanded category, only the cards within WINDOW_OVERSCAN_PX of the viewport, and
+// fetches lazily loaded categories that stay in view for LAZY_LOAD_DELAY_MS.
+function updateVirtualWindow(platform) {
+    const view = virtualViews[platform];
+    if (!view) return;
+    const scroller = getMenuItemsContainer(platform);
+    const scrollerTop = scroller.getBoundingClientRect().top;
+    const windowBottom = scroller.clientHeight + WINDOW_OVERSCAN_PX;
+    const lazyMenu = state.getLazyMenu(platform);
+
+    // Read every category's offset before changing any of them, so the update costs one layout
+    const positions = [];
+    view.sections.forEach((entry, catName) => {
+        const collapsed = entry.section.classList.contains('collapsed');
+        positions.push([catName, entry, collapsed ? null : entry.container.getBoundingClientRect().top - scrollerTop]);
+    });
+
+    const toLoad = [];
+    let resized = false; // A category changed its total height, so the offsets read above are stale
+    const setSizeKey = (entry, sizeKey) => {
+        if (entry.sizeKey !== sizeKey) resized = true;
+        entry.sizeKey = sizeKey;
+    };
+    for (const [catName, entry, top] of positions) {
+        if (top === null) {
+            setSizeKey(entry, 'collapsed');
+            renderCategoryWindow(entry, null, view.cardHeight);
+            continue;
+        }
+        const lazyCategory = lazyMenu && lazyMenu.categories.get(catName);
+        if (lazyCategory && lazyCategory.status !== 'loaded') {
+            setSizeKey(entry, `placeholder:${lazyCategory.itemCount}:${view.cardHeight}`);
+            renderCategoryPlaceholder(catName, entry, lazyCategory, view.cardHeight);
+            const bottom = top + Math.max(1, lazyCategory.itemCount) * view.cardHeight;
+            if (lazyCategory.status === 'pending' && top < windowBottom && bottom > -WINDOW_OVERSCAN_PX) toLoad.push(catName);
+            continue;
+        }
+        setSizeKey(entry, `items:${entry.items.length}:${view.cardHeight}`);
+        const first = Math.max(0, Math.floor((-WINDOW_OVERSCAN_PX - top) / view.cardHeight));
+        const last = Math.min(entry.items.length, Math.ceil((windowBottom - top) / view.cardHeight));
+        renderCategoryWindow(entry, first < last ? [first, last] : [0, 0], view.cardHeight);
+    }
+    if (resized) {
+        updateVirtualWindow(platform); // Sizes are stable on the second pass
+        return;
+    }
+
+    if (!view.measured) {
+        const card = scroller.querySelector('.items-in-category-container.virtualized .item-card');
+        if (card) {
+            const next = card.nextElementSibling;
+            const height = next && next.classList.contains('item-card') ? next.offsetTop - card.offsetTop
+                : card.offsetHeight + (parseFloat(getComputedStyle(card).marginBottom) || 0);
+            view.measured = true;
+            if (height > 0 && Math.abs(height - view.cardHeight) > 1) {
+                view.cardHeight = height;
+                updateVirtualWindow(platform); // Redo the windows with the real row height
+                return;
+            }
+        }
+    }
+
+    clearTimeout(view.loadTimer);
+    if (toLoad.length > 0) {
+        view.loadTimer = setTimeout(() => {
+            toLoad.forEach(catName => loadMenuCategory(platform, catName).catch(() => {})); // Failures show a retry button
+        }, LAZY_LOAD_DELAY_MS);
+    }
+}
+
+// Re-reads one category's items from the store (after its page arrived or failed) and redraws it.
+export function refreshCategory(platform, categoryName) {
+    const view = virtualViews[platform];
+    const entry = view && view.sections.get(categoryName);
+    if (!entry) {
+        renderMenuItems(platform);
+        return;
+    }
+    entry.items = state.getMenuItemsStore(platform).filter(item => (item.categoryName || "Uncategorized") === categoryName);
+    entry.rendered = null;
+    entry.sizeKey = null;
+    updateVirtualWindow(platform);
+}
+
+// The item's card; in a virtualized menu, scrolls the item's category window to it first.
+function revealItemCard(platform, domId) {
+    const card = document.getElementById(domId);
+    const view = virtualViews[platform];
+    if (card || !view) return card;
+    for (const entry of view.sections.values()) {
+        const idx = entry.items.findIndex(item => item.domId === domId);
+        if (idx === -1) continue;
+        entry.section.classList.remove('collapsed');
+        state.getCollapsedCategoriesSet(platform).delete(entry.section.id);
+        const scroller = getMenuItemsContainer(platform);
+        scroller.scrollTop += entry.container.getBoundingClientRect().top - scroller.getBoundingClientRect().top
+            + idx * view.cardHeight - scroller.clientHeight / 2;
+        updateVirtualWindow(platform);
+        return document.getElementById(domId);
+    }
+    return null;
+}
+
+
 function populateCategoryQuickNav(platform, categoryNames) {
     const quickNavContainer = getCategoryQuickNavContainer(platform);
     if (!quickNavContainer) return;
@@ -159,7 +317,9 @@ function populateCategoryQuickNav(platform, categoryNames) {
                 if (targetSection.classList.contains('collapsed')) {
                     targetSection.classList.remove('collapsed');
                     state.getCollapsedCategoriesSet(platform).delete(sectionId);
+                    updateVirtualWindow(platform);
                 }
+                loadMenuCategory(platform, catName).catch(() => {}); // No-op unless the category is still lazy
             } else {
                 console.warn("Target section or scroll container not found for quick nav:", sectionId);
             }
@@ -176,9 +336,11 @@ export function renderMenuItems(platform) {
 
     const items = state.getMenuItemsStore(platform);
     const generateBtn = getGenerateButton(platform);
+    const lazyMenu = state.getLazyMenu(platform);
 
     let allCategoryNamesSet = new Set(items.map(item => item.categoryName || "Uncategorized"));
     state.getManuallyAddedCategoriesSet(platform).forEach(catName => allCategoryNamesSet.add(catName));
+    if (lazyMenu) lazyMenu.categories.forEach((_, catName) => allCategoryNamesSet.add(catName));
     const sortedCategoryNames = Array.from(allCategoryNamesSet).sort();
 
     if (sortedCategoryNames.length === 0 && items.length === 0) {
@@ -193,6 +355,7 @@ export function renderMenuItems(platform) {
         }
         populateCategoryQuickNav(platform, []);
         if (generateBtn) generateBtn.disabled = true;
+        virtualViews[platform] = null;
         return;
     }
 
@@ -207,6 +370,15 @@ export function renderMenuItems(platform) {
 
     populateCategoryQuickNav(platform, sortedCategoryNames);
 
+    const previousView = virtualViews[platform];
+    if (previousView) clearTimeout(previousView.loadTimer);
+    const view = (lazyMenu || items.length > VIRTUALIZE_MIN_ITEMS) ? {
+        sections: new Map(), loadTimer: null,
+        cardHeight: previousView ? previousView.cardHeight : DEFAULT_CARD_HEIGHT_PX,
+        measured: previousView ? previousView.measured : false
+    } : null;
+    virtualViews[platform] = view;
+
     sortedCategoryNames.forEach(catName => {
         let section = renderCategoryHeaderDOM(platform, catName, true);
         if (!section) {
@@ -217,7 +389,10 @@ export function renderMenuItems(platform) {
 
         const itemsInCategoryContainer = section.querySelector('.items-in-category-container');
         const itemsForThisCategory = itemsGroupedByCategory[catName] || [];
-        if (itemsForThisCategory.length > 0) {
+        if (view) {
+            itemsInCategoryContainer.classList.add('virtualized'); // Filled by updateVirtualWindow
+            view.sections.set(catName, { section, container: itemsInCategoryContainer, items: itemsForThisCategory, cards: new Map(), rendered: null, sizeKey: null });
+        } else if (itemsForThisCategory.length > 0) {
             itemsForThisCategory.forEach(item => {
                 const card = createMenuItemCard(item);
                 itemsInCategoryContainer.appendChild(card);
@@ -226,6 +401,7 @@ export function renderMenuItems(platform) {
             itemsInCategoryContainer.innerHTML = '<p class="text-muted small ps-2">No items in this category.</p>';
         }
     });
+    updateVirtualWindow(platform);
 }
 
 function handleAddItemToCategory(platform, categoryName) {
@@ -268,8 +444,9 @@ function handleAddItemToCategory(platform, categoryName) {
     state.getMenuItemsStore(platform).push(item);
     renderMenuItems(platform); // Full re-render for consistency
 
-    setTimeout(() => {
-        const newCard = document.getElementById(domId);
+    // A lazy category is loaded first so the new item lands after its existing ones
+    loadMenuCategory(platform, categoryName).catch(() => {}).then(() => setTimeout(() => {
+        const newCard = revealItemCard(platform, domId);
         if (newCard) {
              const catSectionOfNewItem = newCard.closest('.category-section');
              if (catSectionOfNewItem && catSectionOfNewItem.classList.contains('collapsed')) {
@@ -279,7 +456,7 @@ function handleAddItemToCategory(platform, categoryName) {
             newCard.scrollIntoView({ behavior: 'smooth', block: 'nearest' });
             newCard.querySelector('.item-title-input')?.focus();
         }
-    }, 100);
+    }, 100));
 
     const genButton = getGenerateButton(platform);
     if (genButton) genButton.disabled = false;
@@ -296,8 +473,9 @@ export function handleAddNewCategory(platform) {
     const items = state.getMenuItemsStore(platform);
     const existingInItems = items.some(item => item.categoryName === trimName);
     const existingManually = state.getManuallyAddedCategoriesSet(platform).has(trimName);
+    const existingLazy = !!state.getLazyMenu(platform)?.categories.has(trimName);
 
-    if (existingInItems || existingManually) {
+    if (existingInItems || existingManually || existingLazy) {
         alert(`Category "${trimName}" already exists for ${platform.toUpperCase()}.`);
         return;
     }
@@ -315,7 +493,30 @@ export function setupMenuEventListeners(platform) {
     const container = getMenuItemsContainer(platform);
     if (!container) return;
 
+    // Re-window virtualized categories as the menu scrolls, at most once per frame
+    let windowFrame = null;
+    const scheduleWindowUpdate = () => {
+        if (windowFrame !== null) return;
+        windowFrame = requestAnimationFrame(() => {
+            windowFrame = null;
+            updateVirtualWindow(platform);
+        });
+    };
+    container.addEventListener('scroll', scheduleWindowUpdate, { passive: true });
+    window.addEventListener('resize', scheduleWindowUpdate);
+
     container.addEventListener('click', function(event) {
+        // Retry a lazily loaded category whose page failed
+        const retryBtn = event.target.closest('.retry-category-btn');
+        if (retryBtn) {
+            const categoryName = retryBtn.dataset.category;
+            const lazyCategory = state.getLazyMenu(platform)?.categories.get(categoryName);
+            if (lazyCategory) lazyCategory.status = 'pending';
+            loadMenuCategory(platform, categoryName).catch(() => {});
+            updateVirtualWindow(platform); // Shows the loading placeholder
+            return;
+        }
+
         // Handle "Add Item to Category" button
         const addItemBtn = event.target.closest('.add-item-to-category-btn');
         if (addItemBtn && addItemBtn.dataset.platform === platform) {
@@ -339,6 +540,7 @@ export function setupMenuEventListeners(platform) {
                 } else {
                     collapsedSet.delete(categorySection.id);
                 }
+                updateVirtualWindow(platform); // Collapsed categories release their cards
             }
         }
     });
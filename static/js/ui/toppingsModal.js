@@ -10,6 +10,43 @@ function getCurrentEditingSfItem() {
     return state.getSfMenuItemsStore().find(it => it.domId === itemId);
 }
 
+// Editable copies of an item's topping groups (selection state and DOM ids added); the source groups are not modified.
+export function buildToppingGroups(platform, idx, parsedToppings) {
+    if (!Array.isArray(parsedToppings)) return [];
+    return parsedToppings.map((g, gi) => ({
+        ...g,
+        domId: `group-src-${platform}-${idx}-${gi}`,
+        originalGroupId: g.id, // Store original ID
+        selected: true, // Default to selected
+        toppings: (Array.isArray(g.toppings) ? g.toppings : []).map((t, ti) => ({
+            ...t,
+            domId: `topping-src-${platform}-${idx}-${gi}-${ti}`,
+            originalToppingId: t.id, // Store original ID
+            selected: true // Default to selected
+        }))
+    }));
+}
+
+// Catalog-mode items hold toppingGroupIds into the shared topping catalog instead of their own groups
+export function resolveCatalogToppingGroups(item) {
+    const catalog = state.getSfToppingCatalog();
+    return (item.toppingGroupIds || []).map(id => catalog[id]).filter(Boolean);
+}
+
+// Returns the item's editable topping groups, building them from the catalog on first use
+export function ensureItemToppings(item) {
+    if (!Array.isArray(item.productToppings)) {
+        item.productToppings = buildToppingGroups(item.platform, item.sourceIndex, resolveCatalogToppingGroups(item));
+        delete item.toppingGroupIds; // productToppings is now the item's own copy
+    }
+    return item.productToppings;
+}
+
+export function countSelectedToppingGroups(item) {
+    if (!Array.isArray(item.productToppings)) return resolveCatalogToppingGroups(item).length; // Untouched groups are all selected
+    return item.productToppings.filter(g => g.selected).length;
+}
+
 function renderToppingItems(toppings, groupDomId) {
     if (!toppings || toppings.length === 0) return '<p class="text-muted small ms-1">No toppings in this group.</p>';
     return toppings.map(t => {
@@ -142,7 +179,7 @@ export function handleConfirmToppings() {
         if (itemCard) {
             const toppingsBtn = itemCard.querySelector('.item-toppings-btn');
             if (toppingsBtn) {
-                toppingsBtn.textContent = `Toppings (${sfItem.productToppings?.filter(g => g.selected).length || 0} Grps)`;
+                toppingsBtn.textContent = `Toppings (${countSelectedToppingGroups(sfItem)} Grps)`;
             }
         }
     }
@@ -160,6 +197,6 @@ export function openToppingsModalForItem(itemId) {
     }
     dom.toppingsModalLabel.textContent = `Toppings: ${sfItem.itemTitle || (sfItem.domId.startsWith('item-new-sf-') ? 'New SnappFood Item' : 'Unnamed SnappFood Item')}`;
     dom.toppingsModalLabel.classList.toggle('rtl-input', isProbablyRTL(sfItem.itemTitle));
-    renderToppingsModal(sfItem.productToppings);
+    renderToppingsModal(ensureItemToppings(sfItem));
     dom.toppingsModalInstance.show();
 }
\ No newline at end of file
@@ -0,0 +1,19 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Keep test runs away from the real data/output directories and background threads;
+# set before any project module reads config.
+_scratch = Path(tempfile.mkdtemp(prefix="menu-tests-"))
+os.environ.setdefault("OUTPUT_DIR_MENU_SCRAPER", str(_scratch / "output"))
+os.environ.setdefault("DATA_DIR", str(_scratch / "data"))
+os.environ.setdefault("TF_MENU_CSV_PATH", str(_scratch / "tf_menu.csv"))
+os.environ.setdefault("TF_INFO_CSV_PATH", str(_scratch / "tf_info.csv"))
+os.environ.setdefault("DATA_RELOAD_INTERVAL_SEC", "0")
+os.environ.setdefault("MENU_SNAPSHOTS_ENABLED", "0")
+os.environ.setdefault("SF_CACHE_DISK_ENABLED", "0")
+os.environ.setdefault("RETRY_BACKOFF_FACTOR", "0.01")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
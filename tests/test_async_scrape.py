@@ -0,0 +1,68 @@
+# tests/test_async_scrape.py
+import asyncio
+import inspect
+
+import pytest
+
+from async_scrape import AsyncScrapeEngine, AsyncVendorMenuScraper, build_async_client
+from benchmark import FakeSnappfoodServer, scenario_async_concurrency, unguarded, use_base_url, use_upstream_guard
+from vendor_scrape import VendorMenuFastScraper, VendorMenuParser
+
+
+def test_async_scraper_shares_parsing_not_the_blocking_api():
+    assert issubclass(AsyncVendorMenuScraper, VendorMenuParser)
+    assert not issubclass(AsyncVendorMenuScraper, VendorMenuFastScraper)
+    assert not hasattr(AsyncVendorMenuScraper, "run")
+    assert inspect.iscoroutinefunction(AsyncVendorMenuScraper.scrape)
+    assert inspect.iscoroutinefunction(AsyncVendorMenuScraper.fetch_vendor_json)
+
+
+async def async_scrape(vendor_code):
+    async with build_async_client(4) as client:
+        scraper = AsyncVendorMenuScraper(vendor_code, client, use_cache=False)
+        return await scraper.scrape(), scraper
+
+
+@pytest.fixture
+def stub_api():
+    with FakeSnappfoodServer(n_products=60) as srv, use_base_url(srv.base_url), use_upstream_guard(unguarded()):
+        yield srv
+
+
+def test_async_and_blocking_scrapers_produce_the_same_menu(stub_api):
+    blocking = VendorMenuFastScraper("v42", use_cache=False).scrape()
+    result, _ = asyncio.run(async_scrape("v42"))
+    assert len(result) == len(blocking) > 0
+    assert result.vendor_info == blocking.vendor_info
+    assert result.to_csv_string() == blocking.to_csv_string()
+
+
+def test_async_scraper_reports_a_missing_vendor(stub_api):
+    result, scraper = asyncio.run(async_scrape("missing"))
+    assert result is None
+    assert scraper.last_error_kind == "not_found"
+
+
+def test_async_engine_keeps_many_requests_in_flight():
+    codes = [f"c{i:03d}" for i in range(48)]
+    with FakeSnappfoodServer(n_products=5, latency_ms=300) as srv, use_base_url(srv.base_url), \
+            use_upstream_guard(unguarded()):
+        engine = AsyncScrapeEngine(max_connections=32, max_concurrency=32)
+        try:
+            futures = [engine.scrape_future(code, use_cache=False) for code in codes]
+            assert all(future.result(timeout=30)[0] is not None for future in futures)
+        finally:
+            engine.close()
+    assert 16 < srv.stats["peak_in_flight"] <= 32
+    assert srv.stats["in_flight"] == 0
+
+
+def test_async_concurrency_scenario_outpaces_the_thread_pool(tmp_path):
+    with use_upstream_guard(unguarded()):
+        result = scenario_async_concurrency(products=5, vendors=60, workers=4, async_concurrency=30,
+                                            latency_ms=150, work_dir=tmp_path)
+    assert [result[path]["ok"] for path in ("threads", "async_crawler", "async_engine")] == [60, 60, 60]
+    assert result["threads"]["peak_in_flight"] <= 4
+    assert result["async_crawler"]["peak_in_flight"] > 12
+    assert result["async_engine"]["peak_in_flight"] > 12
+    assert result["async_speedup"] > 1
@@ -0,0 +1,115 @@
+# tests/test_bulk_crawl.py
+import csv
+import json
+
+import pytest
+
+import bulk_crawl
+import config
+import vendor_scrape
+from benchmark import FakeSnappfoodServer, unguarded, use_base_url, use_upstream_guard
+
+ITEMS_PER_VENDOR = 80 # Synthetic payload: 40 categories x 2 products
+VENDOR_CODES = [f"sf{i:04d}" for i in range(12)]
+
+
+def write_mapping(path, codes):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["sf_code", "sf_name", "tf_code", "tf_name"])
+        writer.writerows([code, f"vendor {code}", f"tf-{code}", f"vendor {code}"] for code in codes)
+    return path
+
+
+def read_rows(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return list(csv.DictReader(f))
+
+
+def read_journal(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+@pytest.fixture
+def stub_api():
+    with FakeSnappfoodServer(n_products=ITEMS_PER_VENDOR) as srv, use_base_url(srv.base_url), use_upstream_guard(unguarded()):
+        yield srv
+
+
+@pytest.mark.parametrize("engine_args", [[], ["--async"]], ids=["threads", "async"])
+def test_bulk_crawl_end_to_end(stub_api, tmp_path, engine_args):
+    mapping = write_mapping(tmp_path / "matched.csv", VENDOR_CODES[:5] + ["missing"] + VENDOR_CODES[5:])
+    output, journal = tmp_path / "out" / "menus.csv", tmp_path / "out" / "journal.jsonl"
+
+    exit_code = bulk_crawl.main(["--mapping", str(mapping), "--output", str(output), "--journal", str(journal),
+                                 "--workers", "4", "--rate", "0", "--no-snapshots", *engine_args])
+
+    assert exit_code == 0
+    rows = read_rows(output)
+    assert len(rows) == len(VENDOR_CODES) * ITEMS_PER_VENDOR
+    assert list(rows[0]) == config.EXPECTED_MERGED_ITEM_DATA_COLS
+    assert {row["vendor_code"] for row in rows} == set(VENDOR_CODES)
+    # The unknown vendor is a single 404: journaled as not_found, no rows, no retries
+    entries = {entry["vendor_code"]: entry for entry in read_journal(journal)}
+    assert entries["missing"]["status"] == "not_found"
+    assert entries["missing"]["item_count"] == 0
+    assert all(entries[code]["status"] == "ok" and entries[code]["item_count"] == ITEMS_PER_VENDOR for code in VENDOR_CODES)
+    assert stub_api.stats["not_found"] == 1
+    assert stub_api.stats["requests"] == len(VENDOR_CODES) + 1
+
+
+def test_async_crawl_never_builds_the_blocking_session(stub_api, tmp_path, monkeypatch):
+    def no_blocking_session():
+        raise AssertionError("the async crawler built a requests session")
+
+    monkeypatch.setattr(vendor_scrape, "_http_session", None)
+    monkeypatch.setattr(vendor_scrape, "build_http_session", no_blocking_session)
+    crawler = bulk_crawl.AsyncBulkMenuCrawler(VENDOR_CODES[:3], tmp_path / "menus.csv", max_workers=2, rate_per_sec=0)
+    assert crawler.session is None
+    assert crawler.run()["ok"] == 3
+
+
+def test_bulk_crawl_fails_when_no_vendor_succeeds(stub_api, tmp_path):
+    mapping = write_mapping(tmp_path / "matched.csv", ["missing"])
+    output, journal = tmp_path / "menus.csv", tmp_path / "journal.jsonl"
+    exit_code = bulk_crawl.main(["--mapping", str(mapping), "--output", str(output), "--journal", str(journal),
+                                 "--rate", "0", "--no-snapshots"])
+    assert exit_code == 1 # Nothing crawled successfully
+    assert read_rows(output) == []
+
+
+def test_fresh_crawl_does_not_inherit_an_earlier_journal(tmp_path):
+    output, journal = tmp_path / "menus.csv", tmp_path / "journal.jsonl"
+    first_codes, all_codes = VENDOR_CODES[:4], VENDOR_CODES
+    common = ["--output", str(output), "--journal", str(journal), "--workers", "4", "--rate", "0", "--no-snapshots"]
+
+    with use_upstream_guard(unguarded()):
+        # An earlier, unrelated crawl finishes a few vendors
+        with FakeSnappfoodServer(n_products=ITEMS_PER_VENDOR) as srv, use_base_url(srv.base_url):
+            assert bulk_crawl.main(["--mapping", str(write_mapping(tmp_path / "a.csv", first_codes)), *common]) == 0
+        # A fresh crawl truncates the output and fails every vendor (stands in for a crash)
+        mapping = write_mapping(tmp_path / "b.csv", all_codes)
+        with FakeSnappfoodServer(n_products=ITEMS_PER_VENDOR, error_rate=1.0) as srv, use_base_url(srv.base_url):
+            assert bulk_crawl.main(["--mapping", str(mapping), *common]) == 1
+        assert read_rows(output) == []
+        assert (tmp_path / "journal.jsonl.prev").is_file()
+        # Resuming it must redo every vendor, including those the earlier crawl had finished
+        with FakeSnappfoodServer(n_products=ITEMS_PER_VENDOR) as srv, use_base_url(srv.base_url):
+            assert bulk_crawl.main(["--mapping", str(mapping), "--resume", *common]) == 0
+            assert srv.stats["requests"] == len(all_codes)
+
+    rows = read_rows(output)
+    assert len(rows) == len(all_codes) * ITEMS_PER_VENDOR
+    assert {row["vendor_code"] for row in rows} == set(all_codes)
+
+
+def test_resume_skips_vendors_finished_by_the_same_crawl(stub_api, tmp_path):
+    mapping = write_mapping(tmp_path / "matched.csv", VENDOR_CODES)
+    common = ["--mapping", str(mapping), "--output", str(tmp_path / "menus.csv"), "--journal", str(tmp_path / "journal.jsonl"),
+              "--rate", "0", "--no-snapshots"]
+    assert bulk_crawl.main(common) == 0
+    requests_after_first_run = stub_api.stats["requests"]
+    assert bulk_crawl.main([*common, "--resume"]) == 0
+    assert stub_api.stats["requests"] == requests_after_first_run
+    assert len(read_rows(tmp_path / "menus.csv")) == len(VENDOR_CODES) * ITEMS_PER_VENDOR
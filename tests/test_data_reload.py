@@ -0,0 +1,155 @@
+# tests/test_data_reload.py
+import logging
+import threading
+import time
+
+import pytest
+
+import config
+from data_reload import DataReloader, DataSource
+
+
+class CountingLoader:
+    """Reads a text file; raises on content starting with "bad"."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, path):
+        self.calls += 1
+        text = path.read_text(encoding="utf-8")
+        if text.startswith("bad"):
+            raise ValueError("malformed file")
+        return text
+
+
+@pytest.fixture
+def source_file(tmp_path):
+    path = tmp_path / "tf_menu.csv"
+    path.write_text("v1", encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def loader():
+    return CountingLoader()
+
+
+@pytest.fixture
+def reloader(source_file, loader):
+    reloader = DataReloader([DataSource("tf_menu", source_file, loader, str)])
+    reloader.load_initial()
+    return reloader
+
+
+def test_watcher_waits_for_the_stamp_to_settle(reloader, source_file):
+    source_file.write_text("v2 (partial", encoding="utf-8")
+    assert reloader.settled_changes() == [] # First sighting of the new stamp
+    source_file.write_text("v2 (partial copy, more)", encoding="utf-8")
+    assert reloader.settled_changes() == [] # Still growing
+    assert reloader.settled_changes() == ["tf_menu"]
+
+    snapshot = reloader.reload(only=["tf_menu"])
+    assert snapshot.generation == 2
+    assert snapshot["tf_menu"] == "v2 (partial copy, more)"
+    assert reloader.settled_changes() == []
+
+
+def test_reload_only_leaves_other_sources_alone(tmp_path):
+    paths = {name: tmp_path / f"{name}.csv" for name in ("a", "b")}
+    for path in paths.values():
+        path.write_text("old", encoding="utf-8")
+    reloader = DataReloader([DataSource(name, path, lambda p: p.read_text(encoding="utf-8"), str)
+                             for name, path in paths.items()])
+    reloader.load_initial()
+    for path in paths.values():
+        path.write_text("newer", encoding="utf-8")
+
+    snapshot = reloader.reload(only=["a"])
+    assert (snapshot["a"], snapshot["b"]) == ("newer", "old")
+    assert reloader.changed_sources() == ["b"]
+
+
+def test_failed_version_is_not_retried_until_the_file_changes(reloader, source_file, loader, caplog):
+    source_file.write_text("bad data", encoding="utf-8")
+    with caplog.at_level(logging.ERROR):
+        assert reloader.reload().generation == 1
+        assert reloader.changed_sources() == []
+        assert reloader.reload().generation == 1
+    assert loader.calls == 2 # Initial load + the one failed attempt
+    assert len([r for r in caplog.records if "failed" in r.getMessage()]) == 1
+    assert reloader.snapshot["tf_menu"] == "v1"
+    assert reloader.status()["failed"]["tf_menu"] is not None
+
+    source_file.write_text("v3 fixed", encoding="utf-8")
+    assert reloader.changed_sources() == ["tf_menu"]
+    assert reloader.reload()["tf_menu"] == "v3 fixed"
+    assert reloader.status()["failed"] == {}
+
+
+def test_forced_reload_retries_a_failed_version(reloader, source_file, loader):
+    source_file.write_text("bad data", encoding="utf-8")
+    reloader.reload()
+    reloader.reload(force=True)
+    assert loader.calls == 3
+
+
+def test_concurrent_background_reloads_start_one_rebuild(source_file):
+    release = threading.Event()
+    calls = []
+
+    def slow_loader(path):
+        calls.append(path)
+        if len(calls) > 1: # The initial load is not held up
+            release.wait(5)
+        return path.read_text(encoding="utf-8")
+
+    reloader = DataReloader([DataSource("tf_menu", source_file, slow_loader, str)])
+    reloader.load_initial()
+    start = threading.Barrier(8)
+    started = []
+
+    def request_reload():
+        start.wait()
+        started.append(reloader.reload_in_background(force=True))
+
+    threads = [threading.Thread(target=request_reload) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(started) == [False] * 7 + [True]
+    assert reloader.status()["reloading"] is True
+
+    release.set()
+    deadline = time.monotonic() + 5
+    while reloader.status()["reloading"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert reloader.status()["reloading"] is False
+    assert len(calls) == 2 # Initial load + exactly one forced rebuild
+    assert reloader.snapshot.generation == 2
+    assert reloader.reload_in_background() is True # The lock was handed back
+
+
+@pytest.fixture
+def web_app(monkeypatch):
+    import app as web_app
+    monkeypatch.setattr(web_app.data_reloader, "reload_in_background", lambda force=False: True)
+    return web_app
+
+
+def test_admin_reload_is_localhost_only_without_a_token(web_app, monkeypatch):
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "")
+    client = web_app.app.test_client()
+    assert client.post("/admin/reload").status_code == 202
+    assert client.post("/admin/reload", environ_base={"REMOTE_ADDR": "10.1.2.3"}).status_code == 403
+
+
+def test_admin_reload_requires_the_configured_token(web_app, monkeypatch):
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "s3cret")
+    client = web_app.app.test_client()
+    assert client.post("/admin/reload").status_code == 403
+    assert client.post("/admin/reload", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert client.post("/admin/reload", headers={"X-Admin-Token": "s3cret"},
+                       environ_base={"REMOTE_ADDR": "10.1.2.3"}).status_code == 202
+    assert client.get("/admin/reload").status_code == 200
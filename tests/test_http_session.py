@@ -0,0 +1,77 @@
+# tests/test_http_session.py
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import config
+import vendor_scrape
+from benchmark import FakeSnappfoodServer, unguarded, use_base_url, use_upstream_guard
+from vendor_scrape import CountingRetry, VendorMenuFastScraper, build_http_session, get_http_session
+
+
+@pytest.fixture
+def guard_off():
+    with use_upstream_guard(unguarded()) as guard:
+        yield guard
+
+
+def test_scrapers_share_the_process_session():
+    assert VendorMenuFastScraper("a1").session is get_http_session()
+    assert VendorMenuFastScraper("b2").session is VendorMenuFastScraper("c3").session
+
+
+def test_scrapers_reuse_pooled_connections(guard_off):
+    session = build_http_session(pool_size=4)
+    with FakeSnappfoodServer(n_products=20) as srv, use_base_url(srv.base_url):
+        for i in range(10):
+            assert VendorMenuFastScraper(f"seq{i}", session=session, use_cache=False).scrape() is not None
+        assert srv.stats["connections"] == 1
+
+        def scrape(code):
+            return VendorMenuFastScraper(code, session=session, use_cache=False).scrape()
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(scrape, [f"par{i}" for i in range(40)]))
+        assert all(result is not None for result in results)
+        assert srv.stats["requests"] == 50
+        assert srv.stats["connections"] <= 1 + 4 # Never more than the pool size
+        assert srv.stats["connections"] < srv.stats["requests"]
+
+
+def test_503_is_retried_with_backoff_then_fails(guard_off, monkeypatch):
+    backoffs = []
+    original = CountingRetry.get_backoff_time
+
+    def spy(self):
+        backoff = original(self)
+        backoffs.append(backoff)
+        return backoff
+
+    monkeypatch.setattr(CountingRetry, "get_backoff_time", spy)
+    monkeypatch.setattr(config, "RETRY_BACKOFF_FACTOR", 0.02)
+    session = build_http_session(pool_size=2)
+    with FakeSnappfoodServer(n_products=5, error_rate=1.0, error_status=503) as srv, use_base_url(srv.base_url):
+        scraper = VendorMenuFastScraper("down1", session=session, use_cache=False)
+        assert scraper.scrape() is None
+    assert srv.stats["requests"] == config.MAX_RETRIES # The first attempt plus MAX_RETRIES - 1 retries
+    assert scraper.last_error_kind == "http_error"
+    assert "503" in scraper.last_error_message
+    slept = [b for b in backoffs if b > 0]
+    assert len(slept) == config.MAX_RETRIES - 1
+    assert all(0 < b <= 0.02 * 2 ** (config.MAX_RETRIES - 2) for b in slept)
+
+
+def test_404_is_not_retried(guard_off):
+    session = build_http_session(pool_size=2)
+    with FakeSnappfoodServer(n_products=5) as srv, use_base_url(srv.base_url):
+        scraper = VendorMenuFastScraper("missing", session=session, use_cache=False)
+        assert scraper.scrape() is None
+    assert srv.stats["requests"] == 1
+    assert scraper.last_error_kind == "not_found"
+
+
+def test_session_retry_budget_follows_max_retries(monkeypatch):
+    monkeypatch.setattr(config, "MAX_RETRIES", 5)
+    adapter = vendor_scrape.build_http_session().get_adapter("http://example.invalid/")
+    assert isinstance(adapter.max_retries, CountingRetry)
+    assert adapter.max_retries.total == 4
@@ -0,0 +1,82 @@
+# tests/test_menu_pages.py
+from menu_pages import MenuPageStore
+from menu_payload import TOPPINGS_CATALOG, split_menu_by_category
+
+
+def columnar_menu(categories, vendor_code="v1"):
+    """A format=json style payload whose items are in the given category order."""
+    return {
+        "vendor": {"vendor_code": vendor_code},
+        "headers": ["vendor_code", "category_id", "category_name", "item_id"],
+        "items": {"category_id": [f"id-{name}" for name in categories], "category_name": list(categories),
+                  "item_id": list(range(len(categories)))},
+        "item_count": len(categories),
+    }
+
+
+def test_split_keeps_the_menu_position_of_every_item():
+    # "Popular" is a promo section repeated at the top and the bottom of the menu
+    menu = columnar_menu(["Popular", "Pizza", "Pizza", "Popular", "Drinks"])
+    index, pages = split_menu_by_category(menu)
+
+    assert [(entry["name"], entry["first_index"], entry["item_count"]) for entry in index] == [
+        ("Popular", 0, 2), ("Pizza", 1, 2), ("Drinks", 4, 1)]
+    assert [page["source_index"] for page in pages] == [[0, 3], [1, 2], [4]]
+    # Laying the pages' items out by source_index restores the original menu
+    restored = sorted((pos, item_id) for page in pages for pos, item_id in zip(page["source_index"], page["items"]["item_id"]))
+    assert [item_id for _, item_id in restored] == menu["items"]["item_id"]
+
+
+def test_store_is_bounded_by_total_items():
+    store = MenuPageStore(max_entries=10, max_items=10, ttl=60)
+    first = store.put("snappfood", "a", columnar_menu(["x"] * 4))
+    second = store.put("snappfood", "b", columnar_menu(["x"] * 4))
+    third = store.put("snappfood", "c", columnar_menu(["x"] * 4))
+
+    assert store.page(first["menu_id"], 0) is None # Evicted: 12 items would exceed max_items
+    assert store.page(second["menu_id"], 0) is not None
+    assert store.page(third["menu_id"], 0) is not None
+    stats = store.stats()
+    assert (stats["entries"], stats["items"], stats["evictions"]) == (2, 8, 1)
+
+
+def test_menu_larger_than_the_item_bound_is_still_served():
+    store = MenuPageStore(max_entries=10, max_items=5, ttl=60)
+    store.put("snappfood", "a", columnar_menu(["x"] * 3))
+    big = store.put("snappfood", "b", columnar_menu(["x"] * 8))
+    assert store.page(big["menu_id"], 0)["item_count"] == 8
+    assert store.stats()["entries"] == 1
+
+
+def test_storing_a_vendor_again_keeps_the_earlier_menu_servable():
+    store = MenuPageStore(max_entries=10, max_items=100, ttl=60)
+    old = store.put("snappfood", "a", columnar_menu(["x", "y"])) # One editor is paging through this
+    new = store.put("snappfood", "a", columnar_menu(["x", "y", "z"])) # Another opens the changed menu
+
+    assert old["menu_id"] != new["menu_id"]
+    assert store.page(old["menu_id"], 1)["category"] == "y"
+    assert store.page(old["menu_id"], 2) is None
+    assert store.page(new["menu_id"], 2)["category"] == "z"
+    assert (store.stats()["entries"], store.stats()["items"]) == (2, 5)
+
+
+def test_storing_the_same_menu_again_reuses_its_menu_id():
+    store = MenuPageStore(max_entries=10, max_items=100, ttl=60)
+    first = store.put("snappfood", "a", columnar_menu(["x", "y"]))
+    again = store.put("snappfood", "a", columnar_menu(["x", "y"]))
+    other_mode = store.put("snappfood", "a", columnar_menu(["x", "y"]), TOPPINGS_CATALOG)
+    other_platform = store.put("tapsifood", "a", columnar_menu(["x", "y"]))
+
+    assert again == first
+    assert len({first["menu_id"], other_mode["menu_id"], other_platform["menu_id"]}) == 3
+    assert store.page(first["menu_id"], 0)["category"] == "x"
+    stats = store.stats()
+    assert (stats["entries"], stats["items"], stats["stores"], stats["reused"]) == (3, 6, 3, 1)
+
+
+def test_expired_menus_release_their_items():
+    store = MenuPageStore(max_entries=10, max_items=100, ttl=0)
+    entry = store.put("snappfood", "a", columnar_menu(["x", "y"]))
+    assert store.page(entry["menu_id"], 0) is None
+    assert store.stats()["items"] == 0
+    assert store.put("snappfood", "a", columnar_menu(["x"]))["menu_id"] != entry["menu_id"]
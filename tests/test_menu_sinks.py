@@ -0,0 +1,73 @@
+# tests/test_menu_sinks.py
+import sqlite3
+
+import pytest
+
+from menu_sinks import MenuSink, ParquetMenuSink, SqliteMenuSink
+from vendor_scrape import ScrapeResult
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def scrape_result(vendor_code, prices, business_line="Restaurant"):
+    vendor_info = {"vendor_code": vendor_code, "vendor_name": f"vendor {vendor_code}", "business_line": business_line}
+    items = [{"category_id": 1, "category_name": "c", "item_id": i, "item_title": f"item {i}", "price": price}
+             for i, price in enumerate(prices)]
+    return ScrapeResult(vendor_code, vendor_info, items)
+
+
+def crawl(sink, results):
+    with sink:
+        for result in results:
+            sink.write(result)
+
+
+def read_dataset(root):
+    table = pq.read_table(root)
+    return sorted(zip(table["vendor_code"].to_pylist(), table["price"].to_pylist(),
+                      table["business_line"].to_pylist()))
+
+
+def test_menu_sink_is_abstract():
+    with pytest.raises(TypeError):
+        MenuSink()
+
+    class PartialSink(MenuSink):
+        def _add_item(self, result, vendor_values, position, item):
+            pass
+
+    with pytest.raises(TypeError):
+        PartialSink() # _write_batch is still abstract
+
+
+def test_parquet_recrawl_on_the_same_date_replaces_vendor_rows(tmp_path):
+    root = tmp_path / "menus"
+    crawl(ParquetMenuSink(root, crawl_date="2026-10-18", batch_rows=3),
+          [scrape_result("a", [10, 20]), scrape_result("b", [30]), scrape_result("c", [40, 50])])
+    # Re-crawl a and b (b has moved to another business line); c is left alone
+    crawl(ParquetMenuSink(root, crawl_date="2026-10-18", batch_rows=3),
+          [scrape_result("a", [11, 21]), scrape_result("b", [31], business_line="Cafe")])
+
+    assert read_dataset(root) == [("a", 11, "Restaurant"), ("a", 21, "Restaurant"), ("b", 31, "Cafe"),
+                                  ("c", 40, "Restaurant"), ("c", 50, "Restaurant")]
+    assert list(root.rglob("*.tmp")) == []
+
+
+def test_parquet_resumed_crawl_keeps_earlier_vendors_and_other_dates(tmp_path):
+    root = tmp_path / "menus"
+    crawl(ParquetMenuSink(root, crawl_date="2026-10-17"), [scrape_result("a", [9])])
+    crawl(ParquetMenuSink(root, crawl_date="2026-10-18"), [scrape_result("a", [10])])
+    crawl(ParquetMenuSink(root, crawl_date="2026-10-18"), [scrape_result("b", [20])]) # --resume picks up b
+
+    table = pq.read_table(root)
+    rows = sorted(zip(table["crawl_date"].to_pylist(), table["vendor_code"].to_pylist(), table["price"].to_pylist()))
+    assert rows == [("2026-10-17", "a", 9), ("2026-10-18", "a", 10), ("2026-10-18", "b", 20)]
+
+
+def test_sqlite_recrawl_on_the_same_date_replaces_vendor_rows(tmp_path):
+    db_path = tmp_path / "menus.sqlite"
+    crawl(SqliteMenuSink(db_path, crawl_date="2026-10-18"), [scrape_result("a", [10, 20])])
+    crawl(SqliteMenuSink(db_path, crawl_date="2026-10-18"), [scrape_result("a", [11])])
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT vendor_code, price FROM items").fetchall() == [("a", 11)]
+        assert conn.execute("SELECT item_count FROM vendors").fetchall() == [(1,)]
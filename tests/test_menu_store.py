@@ -0,0 +1,59 @@
+# tests/test_menu_store.py
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+import config
+import menu_store
+from menu_store import MenuSnapshotStore
+
+
+def scrape_result(prices, vendor_code="v1"):
+    rows = [{"item_id": i, "item_title": f"item {i}", "category_name": "c", "price": price}
+            for i, price in enumerate(prices)]
+    return SimpleNamespace(vendor_code=vendor_code, vendor_info={"name": vendor_code}, item_rows=rows)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MenuSnapshotStore(tmp_path / "menu_snapshots.sqlite")
+    yield store
+    store.close()
+
+
+def test_diff_of_a_menu_larger_than_the_sqlite_variable_limit(store, monkeypatch):
+    store._conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 100)
+    monkeypatch.setattr(menu_store, "SQL_MAX_PARAMS", 64)
+    store.record(scrape_result([1000] * 600))
+    store.record(scrape_result([1000 + i for i in range(600)]))
+
+    report = store.diff("v1")
+    assert len(report["price_changed"]) == 599 # Item 0 kept its price
+    assert all(entry["item_title"] for entry in report["price_changed"])
+    assert report["added"] == report["removed"] == report["modified"] == []
+
+
+def test_unchanged_menu_creates_no_snapshot(store):
+    first = store.record(scrape_result([10, 20]))
+    again = store.record(scrape_result([10, 20]))
+    assert (first["created"], again["created"]) == (True, False)
+    assert again["snapshot_id"] == first["snapshot_id"]
+
+
+def test_scrape_requests_skip_snapshots_by_default(monkeypatch):
+    import app as web_app
+    recorded = []
+
+    def record(result):
+        recorded.append(result)
+        return {"created": False}
+
+    monkeypatch.setattr(web_app, "get_menu_store", lambda: SimpleNamespace(record=record))
+    assert config.MENU_SNAPSHOTS_ON_REQUEST is False
+
+    web_app.record_menu_snapshot(scrape_result([10]))
+    assert recorded == []
+    monkeypatch.setattr(config, "MENU_SNAPSHOTS_ON_REQUEST", True)
+    web_app.record_menu_snapshot(scrape_result([10]))
+    assert len(recorded) == 1
@@ -0,0 +1,177 @@
+# tests/test_metrics.py
+import math
+import re
+
+import pytest
+
+import metrics
+import vendor_scrape
+from benchmark import FakeSnappfoodServer, synthetic_data_reloader, unguarded, use_base_url, use_upstream_guard, \
+    write_synthetic_tf_data
+
+SAMPLE_LINE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\[\\"n])*",?)*\})? (\S+)$')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+SCRAPE_STAGES = [("json_decode", "sf"), ("parse_menu", "sf"), ("csv_render", "sf"),
+                 ("tf_lookup", "tf"), ("tf_assembly", "tf"), ("csv_render", "tf")]
+
+
+def parse_exposition(text: str) -> dict:
+    """Checks text against the Prometheus 0.0.4 text format; returns {family: {"type", "samples"}}."""
+    assert text.endswith("\n")
+    families, current = {}, None
+    for line in text[:-1].split("\n"):
+        if line.startswith("# HELP "):
+            name = line.split(" ", 3)[2]
+            assert name not in families, f"{name} declared twice"
+            current = families[name] = {"type": None, "samples": []}
+        elif line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            assert current is families.get(name) and not current["samples"]
+            assert kind in ("counter", "gauge", "histogram")
+            current["type"] = kind
+        else:
+            match = SAMPLE_LINE.match(line)
+            assert match, f"malformed sample line: {line!r}"
+            name, labels, value = match.group(1), match.group(2) or "", match.group(3)
+            family = name if current["type"] != "histogram" else re.sub(r"_(bucket|sum|count)$", "", name)
+            assert current is families.get(family), f"{name} outside its family"
+            current["samples"].append((name, dict(LABEL.findall(labels)), float(value)))
+    return families
+
+
+def check_histograms(families: dict):
+    """Buckets are cumulative, end with +Inf and agree with _count."""
+    for family in (f for f in families.values() if f["type"] == "histogram"):
+        series = {}
+        for name, labels, value in family["samples"]:
+            key = tuple(sorted((k, v) for k, v in labels.items() if k != "le"))
+            series.setdefault(key, []).append((name, labels.get("le"), value))
+        for samples in series.values():
+            buckets = [(le, value) for name, le, value in samples if name.endswith("_bucket")]
+            counts = [value for _, value in buckets]
+            assert buckets[-1][0] == "+Inf"
+            assert counts == sorted(counts)
+            assert [value for name, _, value in samples if name.endswith("_count")] == [counts[-1]]
+            assert [float(le) for le, _ in buckets] == sorted(float(le) for le, _ in buckets)
+
+
+@pytest.fixture
+def recording():
+    was_enabled = metrics.enabled()
+    metrics.reset()
+    metrics.set_enabled(True)
+    yield
+    metrics.set_enabled(was_enabled)
+    metrics.reset()
+
+
+@pytest.fixture
+def web_app(monkeypatch, tmp_path):
+    web_app, reloader = synthetic_data_reloader(write_synthetic_tf_data(tmp_path, n_vendors=3, items_per_vendor=20))
+    monkeypatch.setattr(web_app, "data_reloader", reloader)
+    monkeypatch.setattr(vendor_scrape, "get_response_cache", lambda: None)
+    with FakeSnappfoodServer(n_products=15) as srv, use_base_url(srv.base_url), use_upstream_guard(unguarded()):
+        yield web_app
+
+
+def scrape(web_app, identifier):
+    response = web_app.app.test_client().post("/scrape", json={"identifier": identifier})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_render_is_valid_exposition_text(recording):
+    metrics.UPSTREAM_RETRIES.inc(reason='odd "quoted"\\reason\n')
+    metrics.UPSTREAM_RATE_LIMIT.set(12.5)
+    metrics.STAGE_SECONDS.observe(0.003, stage="parse_menu", platform="sf")
+    metrics.STAGE_SECONDS.observe(99, stage="parse_menu", platform="sf")
+    families = parse_exposition(metrics.render())
+    check_histograms(families)
+
+    assert {metric.name for metric in metrics.REGISTRY} == set(families)
+    assert families["sf_tf_upstream_retries_total"]["samples"] == [
+        ("sf_tf_upstream_retries_total", {"reason": 'odd \\"quoted\\"\\\\reason\\n'}, 1.0)]
+    assert families["sf_tf_upstream_rate_limit"]["samples"] == [("sf_tf_upstream_rate_limit", {}, 12.5)]
+    stage = {(name, labels.get("le")): value for name, labels, value in families["sf_tf_stage_seconds"]["samples"]}
+    assert stage[("sf_tf_stage_seconds_bucket", "0.005")] == 1
+    assert stage[("sf_tf_stage_seconds_bucket", "5")] == 1
+    assert stage[("sf_tf_stage_seconds_bucket", "+Inf")] == 2
+    assert math.isclose(stage[("sf_tf_stage_seconds_sum", None)], 99.003)
+
+
+def test_scrape_populates_stage_and_upstream_histograms(recording, web_app):
+    result = scrape(web_app, "sf000001")
+    assert result["snappfood"]["data_loaded"] and result["tapsifood"]["data_loaded"]
+    scrape(web_app, "missing")
+
+    for stage, platform in SCRAPE_STAGES:
+        assert metrics.STAGE_SECONDS.count(stage=stage, platform=platform) >= 1, (stage, platform)
+    assert metrics.UPSTREAM_SECONDS.count(status="200") == 1
+    assert metrics.UPSTREAM_SECONDS.count(status="404") == 1
+    assert metrics.REQUEST_SECONDS.count(route="/scrape", method="POST", status="200") == 2
+    assert metrics.MENU_ITEMS.count(platform="sf") == 1
+
+    response = web_app.app.test_client().get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert "version=0.0.4" in response.headers["Content-Type"]
+    families = parse_exposition(response.get_data(as_text=True))
+    check_histograms(families)
+    stage_series = {(labels["stage"], labels["platform"])
+                    for name, labels, _ in families["sf_tf_stage_seconds"]["samples"] if name.endswith("_count")}
+    assert set(SCRAPE_STAGES) <= stage_series
+    upstream_statuses = {labels["status"] for _, labels, _ in families["sf_tf_upstream_request_seconds"]["samples"]}
+    assert {"200", "404"} <= upstream_statuses
+
+
+def test_timed_and_instrumented_record_when_enabled(recording):
+    with metrics.timed("unit_stage", "sf"):
+        pass
+
+    @metrics.instrumented("unit_fn", "tf")
+    def add(a, b):
+        return a + b
+
+    assert add(2, 3) == 5
+    assert add.__name__ == "add"
+    assert metrics.STAGE_SECONDS.count(stage="unit_stage", platform="sf") == 1
+    assert metrics.STAGE_SECONDS.count(stage="unit_fn", platform="tf") == 1
+
+
+def test_disabled_metrics_record_nothing(recording):
+    metrics.set_enabled(False)
+
+    @metrics.instrumented("unit_fn", "tf")
+    def fail():
+        raise ValueError("still raised")
+
+    assert metrics.timed("unit_stage", "sf") is metrics.timed("other", "tf") # Shared no-op timer
+    with metrics.timed("unit_stage", "sf"):
+        pass
+    with pytest.raises(ValueError):
+        fail()
+    metrics.UPSTREAM_RETRIES.inc(reason="read")
+    metrics.UPSTREAM_RATE_LIMIT.set(3)
+    metrics.MENU_ITEMS.observe(10, platform="sf")
+
+    assert metrics.STAGE_SECONDS.count(stage="unit_stage", platform="sf") == 0
+    assert metrics.STAGE_SECONDS.count(stage="unit_fn", platform="tf") == 0
+    assert metrics.UPSTREAM_RETRIES.value(reason="read") == 0
+    assert metrics.UPSTREAM_RATE_LIMIT.value() == 0
+    assert metrics.MENU_ITEMS.count(platform="sf") == 0
+    families = parse_exposition(metrics.render())
+    assert all(not family["samples"] for family in families.values())
+
+
+def test_disabled_metrics_endpoint_and_scrape(recording, web_app):
+    metrics.set_enabled(False)
+    assert scrape(web_app, "sf000002")["snappfood"]["data_loaded"]
+
+    response = web_app.app.test_client().get("/metrics")
+    assert response.status_code == 404
+    assert response.get_json()["success"] is False
+    for stage, platform in SCRAPE_STAGES:
+        assert metrics.STAGE_SECONDS.count(stage=stage, platform=platform) == 0
+    assert metrics.UPSTREAM_SECONDS.count(status="200") == 0
+    assert metrics.REQUEST_SECONDS.count(route="/scrape", method="POST", status="200") == 0
@@ -0,0 +1,68 @@
+# tests/test_price_compare.py
+import pandas as pd
+
+from price_compare import MATCH_EXACT, SF_ONLY, TF_ONLY, compare_menus, load_sf_menus
+
+PAIRS = pd.DataFrame({"pair_id": [0], "sf_code": ["sf1"], "tf_code": ["tf1"]})
+
+
+def sf_menu(rows):
+    return pd.DataFrame([{"vendor_code": "sf1", "category_name": "پیتزا", **row} for row in rows])
+
+
+def tf_menu(rows):
+    return pd.DataFrame([{"vendor_code": "tf1", "category_name": "پیتزا", **row} for row in rows])
+
+
+def matched_prices(item_matches):
+    rows = item_matches[item_matches["match_type"] == MATCH_EXACT]
+    return sorted(zip(rows["sf_item_id"], rows["tf_item_id"], rows["sf_price"], rows["tf_price"]))
+
+
+def test_same_title_variants_match_by_variation():
+    sf = sf_menu([
+        {"item_id": "s-large", "item_title": "پیتزا پپرونی", "item_variation": "بزرگ", "price": "420000"},
+        {"item_id": "s-small", "item_title": "پیتزا پپرونی", "item_variation": "کوچک", "price": "250000"},
+    ])
+    tf = tf_menu([ # TapsiFood spells the variant out in the title
+        {"item_id": "t-small", "item_title": "پیتزا پپرونی کوچک", "price": "260000"},
+        {"item_id": "t-large", "item_title": "پیتزا پپرونی بزرگ", "price": "430000"},
+    ])
+    item_matches, summary = compare_menus(sf, tf, PAIRS, min_similarity=1.0)
+
+    assert matched_prices(item_matches) == [("s-large", "t-large", 420000, 430000), ("s-small", "t-small", 250000, 260000)]
+    assert set(item_matches.loc[item_matches["sf_item_id"] == "s-small", "sf_variation"]) == {"کوچک"}
+    assert summary.loc[0, "matched"] == 2
+
+
+def test_indistinguishable_variants_pair_up_by_closest_price():
+    sf = sf_menu([
+        {"item_id": "s-a", "item_title": "نوشابه", "item_variation": "", "price": "90000"},
+        {"item_id": "s-b", "item_title": "نوشابه", "item_variation": "", "price": "40000"},
+        {"item_id": "s-c", "item_title": "نوشابه", "item_variation": "", "price": "60000"},
+    ])
+    tf = tf_menu([
+        {"item_id": "t-a", "item_title": "نوشابه", "price": "45000"},
+        {"item_id": "t-b", "item_title": "نوشابه", "price": "95000"},
+    ])
+    item_matches, _ = compare_menus(sf, tf, PAIRS, min_similarity=1.0)
+
+    assert matched_prices(item_matches) == [("s-a", "t-b", 90000, 95000), ("s-b", "t-a", 40000, 45000)]
+    assert item_matches.loc[item_matches["match_type"] == SF_ONLY, "sf_item_id"].tolist() == ["s-c"]
+    assert (item_matches["match_type"] == TF_ONLY).sum() == 0
+
+
+def test_variation_already_in_the_title_is_not_repeated():
+    sf = sf_menu([{"item_id": "s1", "item_title": "پیتزا مخصوص بزرگ", "item_variation": "بزرگ", "price": "500000"}])
+    tf = tf_menu([{"item_id": "t1", "item_title": "پیتزا مخصوص بزرگ", "price": "510000"}])
+    item_matches, _ = compare_menus(sf, tf, PAIRS, min_similarity=1.0)
+    assert matched_prices(item_matches) == [("s1", "t1", 500000, 510000)]
+
+
+def test_load_sf_menus_reads_the_variation_when_present(tmp_path):
+    path = tmp_path / "bulk_menu.csv"
+    pd.DataFrame([{"vendor_code": "sf1", "vendor_name": "x", "category_name": "c", "item_id": "1",
+                   "item_title": "t", "item_variation": "v", "price": "1"}]).to_csv(path, index=False)
+    assert list(load_sf_menus(path).columns) == ["vendor_code", "category_name", "item_id", "item_title", "item_variation", "price"]
+    pd.read_csv(path).drop(columns="item_variation").to_csv(path, index=False)
+    assert "item_variation" not in load_sf_menus(path).columns
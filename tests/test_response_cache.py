@@ -0,0 +1,43 @@
+# tests/test_response_cache.py
+import threading
+
+from response_cache import VendorResponseCache
+
+
+def test_disk_tier_round_trips_an_entry(tmp_path):
+    VendorResponseCache(disk_dir=tmp_path).put("x1y2z3", {"items": [1, 2]}, etag='"v1"')
+    entry = VendorResponseCache(disk_dir=tmp_path).get("x1y2z3")
+    assert entry.data == {"items": [1, 2]}
+    assert entry.etag == '"v1"'
+
+
+def test_codes_differing_only_in_punctuation_do_not_collide(tmp_path):
+    writer = VendorResponseCache(disk_dir=tmp_path)
+    writer.put("ab-c", {"vendor": "ab-c"})
+    writer.put("a.bc", {"vendor": "a.bc"})
+    writer.put("abc", {"vendor": "abc"})
+    assert len(list(tmp_path.glob("*.json"))) == 3
+
+    reader = VendorResponseCache(disk_dir=tmp_path)
+    for code in ("ab-c", "a.bc", "abc"):
+        assert reader.get(code).data == {"vendor": code}
+
+
+def test_concurrent_writers_of_one_vendor_leave_a_whole_file(tmp_path):
+    cache = VendorResponseCache(disk_dir=tmp_path)
+    payloads = [{"writer": n, "items": list(range(2000))} for n in range(8)]
+    start = threading.Barrier(len(payloads))
+
+    def write(payload):
+        start.wait()
+        for _ in range(20):
+            cache.put("shared", payload)
+
+    threads = [threading.Thread(target=write, args=(payload,)) for payload in payloads]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert list(tmp_path.glob("*.tmp")) == []
+    assert VendorResponseCache(disk_dir=tmp_path).get("shared").data in payloads
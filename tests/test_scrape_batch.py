@@ -0,0 +1,141 @@
+# tests/test_scrape_batch.py
+import json
+import threading
+import time
+
+import pytest
+
+import config
+import vendor_scrape
+from benchmark import FakeSnappfoodServer, unguarded, use_base_url, use_upstream_guard
+
+
+@pytest.fixture
+def web_app(monkeypatch):
+    import app as web_app
+    monkeypatch.setattr(vendor_scrape, "get_response_cache", lambda: None) # Every identifier reaches the stub
+    return web_app
+
+
+@pytest.fixture
+def stub_api():
+    with FakeSnappfoodServer(n_products=20, latency_ms=20) as srv, use_base_url(srv.base_url), \
+            use_upstream_guard(unguarded()):
+        yield srv
+
+
+def post_batch(web_app, payload):
+    return web_app.app.test_client().post("/scrape/batch", json=payload)
+
+
+def ndjson_lines(response):
+    body = response.get_data(as_text=True)
+    assert body.endswith("\n")
+    return [json.loads(line) for line in body.split("\n")[:-1]]
+
+
+def test_batch_streams_one_ndjson_line_per_identifier_then_a_summary(web_app, stub_api):
+    identifiers = [f"b{i:03d}" for i in range(6)] + ["missing"]
+    response = post_batch(web_app, {"identifiers": identifiers, "concurrency": 3})
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert response.headers["X-Accel-Buffering"] == "no"
+    lines = ndjson_lines(response)
+    results, summary = lines[:-1], lines[-1]
+    assert sorted((line["index"], line["identifier"]) for line in results) == list(enumerate(identifiers))
+    by_identifier = {line["identifier"]: line for line in results}
+    assert by_identifier["b000"]["snappfood"]["data_loaded"] is True
+    assert by_identifier["missing"]["snappfood"]["data_loaded"] is False
+    assert by_identifier["missing"]["snappfood"]["error"]
+    assert summary["summary"]["total"] == 7
+    assert summary["summary"]["ok"] + summary["summary"]["failed"] == 7
+    assert stub_api.stats["requests"] == 7
+
+
+def test_results_arrive_in_completion_order(web_app, stub_api, monkeypatch):
+    scrape_identifier = web_app.scrape_identifier
+
+    def slow_first(identifier, *args, **kwargs):
+        if identifier == "slow":
+            time.sleep(0.5)
+        return scrape_identifier(identifier, *args, **kwargs)
+
+    monkeypatch.setattr(web_app, "scrape_identifier", slow_first)
+    lines = ndjson_lines(post_batch(web_app, {"identifiers": ["slow", "c1", "c2", "c3"], "concurrency": 4}))
+    assert [line["identifier"] for line in lines[:-1]][-1] == "slow"
+    assert {line["index"] for line in lines[:-1] if line["identifier"] == "slow"} == {0}
+
+
+def test_duplicates_and_blanks_are_dropped(web_app, stub_api):
+    lines = ndjson_lines(post_batch(web_app, {"identifiers": ["d1", " d1 ", "", "d2", "d1", "   "]}))
+    assert sorted((line["index"], line["identifier"]) for line in lines[:-1]) == [(0, "d1"), (1, "d2")]
+    assert lines[-1]["summary"]["total"] == 2
+    assert stub_api.stats["requests"] == 2
+
+
+def test_failed_identifier_is_reported_and_counted(web_app, stub_api, monkeypatch):
+    scrape_identifier = web_app.scrape_identifier
+
+    def broken(identifier, *args, **kwargs):
+        if identifier == "boom":
+            raise RuntimeError("exploded")
+        return scrape_identifier(identifier, *args, **kwargs)
+
+    monkeypatch.setattr(web_app, "scrape_identifier", broken)
+    lines = ndjson_lines(post_batch(web_app, {"identifiers": ["e1", "boom"]}))
+    failed = [line for line in lines[:-1] if line["identifier"] == "boom"][0]
+    assert failed["success"] is False and "exploded" in failed["error"]
+    assert (lines[-1]["summary"]["ok"], lines[-1]["summary"]["failed"]) == (1, 1)
+
+
+def test_in_flight_identifiers_stay_within_the_window(web_app, stub_api, monkeypatch):
+    scrape_identifier = web_app.scrape_identifier
+    lock = threading.Lock()
+    in_flight = [0, 0] # current, peak
+
+    def tracked(identifier, *args, **kwargs):
+        with lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight[1], in_flight[0])
+        try:
+            time.sleep(0.02)
+            return scrape_identifier(identifier, *args, **kwargs)
+        finally:
+            with lock:
+                in_flight[0] -= 1
+
+    monkeypatch.setattr(web_app, "scrape_identifier", tracked)
+    lines = ndjson_lines(post_batch(web_app, {"identifiers": [f"w{i:03d}" for i in range(20)], "concurrency": 3}))
+    assert len(lines) == 21
+    assert in_flight[1] == 3
+
+
+def test_concurrency_is_capped_by_the_server_limit(web_app, stub_api, monkeypatch):
+    monkeypatch.setattr(config, "BATCH_CONCURRENCY", 2)
+    seen = []
+    monkeypatch.setattr(web_app, "stream_batch_results",
+                        lambda identifiers, menu_format, snapshot, concurrency, toppings_mode: iter([seen.append(concurrency) or ""]))
+    assert post_batch(web_app, {"identifiers": ["x"], "concurrency": 50}).status_code == 200
+    assert post_batch(web_app, {"identifiers": ["x"], "concurrency": 0}).status_code == 200
+    assert seen == [2, 2]
+
+
+@pytest.mark.parametrize("payload, message", [
+    ({"identifiers": "sf1"}, "must be a list"),
+    ({}, "must be a list"),
+    ({"identifiers": []}, "No identifiers"),
+    ({"identifiers": ["", "  "]}, "No identifiers"),
+    ({"identifiers": ["a"], "concurrency": "fast"}, "must be an integer"),
+], ids=["not-a-list", "missing", "empty", "blank", "bad-concurrency"])
+def test_bad_requests_are_rejected(web_app, payload, message):
+    response = post_batch(web_app, payload)
+    assert response.status_code == 400
+    assert message in response.get_json()["error"]
+
+
+def test_too_many_identifiers_are_rejected(web_app, monkeypatch):
+    monkeypatch.setattr(config, "BATCH_MAX_IDENTIFIERS", 3)
+    response = post_batch(web_app, {"identifiers": ["a", "b", "c", "d"]})
+    assert response.status_code == 400
+    assert "Too many identifiers (4)" in response.get_json()["error"]
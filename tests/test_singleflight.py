@@ -0,0 +1,52 @@
+# tests/test_singleflight.py
+import threading
+
+import pytest
+
+import vendor_scrape
+from benchmark import FakeSnappfoodServer, unguarded, use_base_url, use_upstream_guard
+
+CONCURRENT_REQUESTS = 8
+
+
+@pytest.fixture
+def web_app(monkeypatch):
+    import app as web_app
+    # No response cache: a late caller must not be served from it instead of joining the flight
+    monkeypatch.setattr(vendor_scrape, "get_response_cache", lambda: None)
+    # Download filenames carry a per-second timestamp; pin it so whole responses can be compared
+    monkeypatch.setattr(web_app.time, "strftime", lambda fmt, *args: "20260101_000000")
+    return web_app
+
+
+def test_concurrent_scrapes_of_one_vendor_share_one_upstream_fetch(web_app):
+    start = threading.Barrier(CONCURRENT_REQUESTS)
+    responses = [None] * CONCURRENT_REQUESTS
+
+    def scrape(slot):
+        client = web_app.app.test_client()
+        start.wait()
+        responses[slot] = client.post("/scrape", json={"identifier": "slowvendor"})
+
+    with FakeSnappfoodServer(n_products=60, latency_ms=750) as srv, use_base_url(srv.base_url), \
+            use_upstream_guard(unguarded()):
+        threads = [threading.Thread(target=scrape, args=(slot,)) for slot in range(CONCURRENT_REQUESTS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert srv.stats["requests"] == 1
+
+    assert all(response.status_code == 200 for response in responses)
+    bodies = [response.get_data() for response in responses]
+    assert bodies.count(bodies[0]) == CONCURRENT_REQUESTS
+    assert responses[0].get_json()["snappfood"]["data_loaded"] is True
+
+
+def test_sequential_scrapes_are_not_coalesced(web_app):
+    client = web_app.app.test_client()
+    with FakeSnappfoodServer(n_products=20) as srv, use_base_url(srv.base_url), use_upstream_guard(unguarded()):
+        for _ in range(3):
+            assert client.post("/scrape", json={"identifier": "slowvendor"}).get_json()["snappfood"]["data_loaded"]
+        assert srv.stats["requests"] == 3
+    assert web_app.scrape_flights.in_flight() == 0
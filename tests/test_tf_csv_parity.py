@@ -0,0 +1,90 @@
+# tests/test_tf_csv_parity.py
+import csv
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import config
+from benchmark import synthetic_data_reloader, synthetic_tf_frames
+
+# Cells the old row-wise writer had to quote, escape or pass through as-is
+TRICKY_CELLS = [
+    'Pizza, large',
+    'The "special" burger',
+    'line one\nline two',
+    'crlf\r\ninside',
+    '',
+    np.nan,
+    '   ',
+    '5" pizza, "half',
+    'قیمت: ۱۲,۰۰۰ تومان',
+    '\ttabbed',
+]
+
+
+def legacy_dictwriter_csv(web_app, menu_items_df, vendor_info, vendor_code):
+    """The iterrows/csv.DictWriter implementation prepare_tapsifood_csv_data replaced."""
+    rows = []
+    for _, item_row in menu_items_df.iterrows():
+        merged_item = web_app.get_default_menu_item_data(vendor_code)
+        for key in config.EXPECTED_VENDOR_INFO_KEYS:
+            if key in vendor_info:
+                merged_item[key] = vendor_info[key]
+        merged_item.update({
+            "category_id": item_row.get('category_id', ''),
+            "category_name": item_row.get('category_name', ''),
+            "item_id": item_row.get('item_id', ''),
+            "item_title": item_row.get('item_title', ''),
+            "description": item_row.get('item_description', ''),
+            "price": str(item_row.get('price', '0')),
+            "product_toppings": "[]"
+        })
+        rows.append(merged_item)
+    string_io = io.StringIO()
+    writer = csv.DictWriter(string_io, fieldnames=config.EXPECTED_MERGED_ITEM_DATA_COLS, quoting=csv.QUOTE_MINIMAL, extrasaction='ignore')
+    writer.writeheader()
+    writer.writerows(rows)
+    return '\ufeff' + string_io.getvalue()
+
+
+@pytest.fixture(scope="module")
+def tf_data(tmp_path_factory):
+    frames = synthetic_tf_frames(n_vendors=4, items_per_vendor=30, seed=7)
+    menu, info = frames["tf_menu"], frames["tf_info"]
+    for col in ("category_name", "item_title", "item_description", "price"):
+        for i, cell in enumerate(TRICKY_CELLS):
+            menu.loc[(i * 7 + len(col)) % len(menu), col] = cell
+    menu.loc[3, "category_id"] = np.nan
+    info.loc[0, "vendor_name"] = 'Cafe "Roma", Tehran'
+    info.loc[1, "address"] = np.nan
+    info.loc[2, "min_order"] = "not a number"
+    out_dir = tmp_path_factory.mktemp("tf")
+    paths = {}
+    for name, df in frames.items():
+        paths[name] = out_dir / f"{name}.csv"
+        df.to_csv(paths[name], index=False)
+    web_app, reloader = synthetic_data_reloader(paths)
+    return web_app, reloader.snapshot, list(info["vendor_code"])
+
+
+def test_to_csv_matches_legacy_dictwriter_bytes(tf_data):
+    web_app, snapshot, vendor_codes = tf_data
+    for code in vendor_codes:
+        csv_content, vendor_info = web_app.prepare_tapsifood_csv_data(code, snapshot)
+        assert csv_content is not None
+        expected = legacy_dictwriter_csv(web_app, snapshot["tf_menu"].get(code), vendor_info, code)
+        assert csv_content.encode("utf-8") == expected.encode("utf-8")
+
+
+def test_fixture_covers_tricky_cells(tf_data):
+    web_app, snapshot, vendor_codes = tf_data
+    output = "".join(web_app.prepare_tapsifood_csv_data(code, snapshot)[0] for code in vendor_codes)
+    assert '"Pizza, large"' in output
+    assert '"The ""special"" burger"' in output
+    assert '"line one\nline two"' in output
+    assert ",nan," in output
+    assert '"Cafe ""Roma"", Tehran"' in output
+    first_vendor = web_app.prepare_tapsifood_csv_data(vendor_codes[0], snapshot)[0]
+    assert len(pd.read_csv(io.StringIO(first_vendor.lstrip("\ufeff")), dtype=str)) == len(snapshot["tf_menu"].get(vendor_codes[0]))
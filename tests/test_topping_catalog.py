@@ -0,0 +1,132 @@
+# tests/test_topping_catalog.py
+import copy
+import csv
+import io
+import json
+
+import pytest
+
+import vendor_scrape
+from benchmark import FakeSnappfoodServer, unguarded, use_base_url, use_upstream_guard
+from menu_payload import (TOPPINGS_CATALOG, TOPPINGS_INLINE, columnar_menu_from_scrape_result, split_menu_by_category,
+                          topping_group_id)
+from vendor_scrape import VendorMenuFastScraper, _synthetic_vendor_payload
+
+CHEESE = {"id": 7, "title": "پنیر", "maxCount": 2, "minCount": 0,
+          "toppings": [{"id": 71, "title": "چدار", "description": "", "price": 15000},
+                       {"id": 72, "title": "موتزارلا", "description": "کش‌دار", "price": 18000}]}
+
+
+def reordered(group: dict) -> dict:
+    """The same group with every object's keys in reverse order, as another API response might send it."""
+    flipped = {key: group[key] for key in reversed(group)}
+    flipped["toppings"] = [{key: t[key] for key in reversed(t)} for t in group["toppings"]]
+    return flipped
+
+
+def payload(*product_toppings) -> dict:
+    products = [{"id": i, "title": f"p{i}", "price": 1000, "productToppings": groups}
+                for i, groups in enumerate(product_toppings)]
+    return {"data": {"vendor": {"id": 1, "title": "v"}, "menus": [{"categoryId": 1, "category": "c", "products": products}]}}
+
+
+def parse(data, vendor_code="v1"):
+    return VendorMenuFastScraper(vendor_code, use_cache=False).parse_menu(data, vendor_code)
+
+
+def resolve(refs, catalog) -> str:
+    """Rebuilds an inline product_toppings cell from catalog group IDs."""
+    groups = [{"group_index": index, **catalog[group_id]} for index, group_id in enumerate(refs)]
+    return json.dumps(groups, ensure_ascii=False, separators=(',', ':'))
+
+
+def csv_rows(content: str) -> list[dict]:
+    return list(csv.DictReader(io.StringIO(content.lstrip('﻿'))))
+
+
+def test_identical_groups_collapse_to_one_catalog_entry():
+    result = parse(payload([CHEESE], [copy.deepcopy(CHEESE)], [reordered(CHEESE)], []))
+    assert len(result.topping_groups) == 1
+    (group_id,) = result.topping_groups
+    assert result.topping_refs == [(group_id,), (group_id,), (group_id,), ()]
+    assert result.topping_catalog() == {group_id: CHEESE}
+
+
+def test_group_ids_are_stable_content_hashes():
+    first, second = parse(payload([CHEESE]), "v1"), parse(payload([reordered(CHEESE)]), "v2")
+    assert first.topping_groups == second.topping_groups # Across vendors, runs and key order
+    (group_id, body), = first.topping_groups.items()
+    assert group_id == topping_group_id(body) == topping_group_id(json.dumps(CHEESE, ensure_ascii=False, separators=(',', ':')))
+    assert len(group_id) == 16
+
+    pricier = copy.deepcopy(CHEESE)
+    pricier["toppings"][0]["price"] = 16000
+    ids = {group_id for groups in (parse(payload([g])).topping_groups for g in (CHEESE, pricier, {**CHEESE, "maxCount": 2.0},
+                                                                              {**CHEESE, "minCount": False}))
+           for group_id in groups}
+    assert len(ids) == 4 # Any content change, including 0 vs False, is a different group
+
+
+def test_catalog_rows_resolve_to_the_inline_toppings():
+    result = parse(_synthetic_vendor_payload(400, n_categories=10))
+    catalog = result.topping_catalog()
+    assert 0 < len(catalog) <= 8
+    assert any(len(refs) > 1 for refs in result.topping_refs)
+    for item, refs in zip(result.item_rows, result.topping_refs):
+        assert resolve(refs, catalog) == item["product_toppings"]
+
+    inline_rows = csv_rows(result.to_csv_string(TOPPINGS_INLINE))
+    catalog_rows = csv_rows(result.to_csv_string(TOPPINGS_CATALOG))
+    for inline, by_id in zip(inline_rows, catalog_rows, strict=True):
+        assert resolve(json.loads(by_id["product_toppings"]), catalog) == inline["product_toppings"]
+        assert {**by_id, "product_toppings": None} == {**inline, "product_toppings": None}
+
+
+def test_columnar_catalog_payload_and_pages():
+    result = parse(_synthetic_vendor_payload(200, n_categories=10))
+    inline = columnar_menu_from_scrape_result(result, TOPPINGS_INLINE)
+    menu = columnar_menu_from_scrape_result(result, TOPPINGS_CATALOG)
+    assert "topping_groups" not in inline
+    assert menu["topping_groups"] == result.topping_catalog()
+    for refs, groups in zip(menu["items"]["product_toppings"], inline["items"]["product_toppings"], strict=True):
+        assert json.loads(resolve(refs, menu["topping_groups"])) == groups
+
+    _, pages = split_menu_by_category(menu)
+    for page in pages:
+        used = {group_id for refs in page["items"]["product_toppings"] for group_id in refs}
+        assert set(page["topping_groups"]) == used
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import app as web_app
+    monkeypatch.setattr(vendor_scrape, "get_response_cache", lambda: None)
+    with FakeSnappfoodServer(n_products=120) as srv, use_base_url(srv.base_url), use_upstream_guard(unguarded()):
+        yield web_app.app.test_client()
+
+
+def test_scrape_with_catalog_toppings_matches_inline(client):
+    inline = client.post("/scrape", json={"identifier": "cat1"}).get_json()
+    by_id = client.post("/scrape?toppings=catalog", json={"identifier": "cat1"}).get_json()
+    assert (inline["toppings"], by_id["toppings"]) == (TOPPINGS_INLINE, TOPPINGS_CATALOG)
+    assert "topping_groups" not in inline["snappfood"]
+    catalog = by_id["snappfood"]["topping_groups"]
+    assert catalog
+
+    inline_rows = csv_rows(inline["snappfood"]["csv_data"])
+    catalog_rows = csv_rows(by_id["snappfood"]["csv_data"])
+    assert len(inline_rows) == len(catalog_rows) == 120
+    for row, ref_row in zip(inline_rows, catalog_rows):
+        # jsonify sorts the catalog groups' keys, so compare as objects
+        assert json.loads(resolve(json.loads(ref_row["product_toppings"]), catalog)) == json.loads(row["product_toppings"])
+
+
+def test_scrape_columnar_with_catalog_toppings(client):
+    body = client.post("/scrape", json={"identifier": "cat2", "format": "json", "toppings": "CATALOG"}).get_json()
+    menu = body["snappfood"]["menu"]
+    assert body["toppings"] == TOPPINGS_CATALOG
+    assert all(group_id in menu["topping_groups"] for refs in menu["items"]["product_toppings"] for group_id in refs)
+
+    body = client.post("/scrape", json={"identifier": "cat2", "format": "json", "toppings": "bogus"}).get_json()
+    assert body["toppings"] == TOPPINGS_INLINE
+    assert "topping_groups" not in body["snappfood"]["menu"]
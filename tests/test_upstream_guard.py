@@ -0,0 +1,213 @@
+# tests/test_upstream_guard.py
+import asyncio
+import time
+
+import pytest
+
+import upstream_guard
+from benchmark import FakeSnappfoodServer, use_base_url, use_upstream_guard
+from upstream_guard import AdaptiveRateLimiter, CircuitBreaker, UpstreamGuard, UpstreamUnavailable
+from async_scrape import AsyncVendorMenuScraper, build_async_client
+from vendor_scrape import VendorMenuFastScraper, build_http_session
+
+
+class FakeClock:
+    """Stands in for the time module inside upstream_guard so tests can step through cooldowns."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(upstream_guard, "time", clock)
+    return clock
+
+
+# --- AdaptiveRateLimiter ---
+def test_throttling_cuts_the_rate_multiplicatively(clock):
+    limiter = AdaptiveRateLimiter(max_rate=16, min_rate=1, burst=4)
+    limiter.record("throttled")
+    assert limiter.rate == 8
+    limiter.record("throttled") # Same burst of 429s: within the cooldown, no second cut
+    assert limiter.rate == 8
+    assert limiter.try_acquire() > 0 # The bucket was emptied too
+
+    for expected in (4, 2, 1, 1): # Halves once per cooldown, never below min_rate
+        clock.advance(upstream_guard.DECREASE_COOLDOWN_SEC)
+        limiter.record("throttled")
+        assert limiter.rate == expected
+    assert (limiter.counters["throttled"], limiter.counters["decreases"]) == (6, 5) # The cooldown swallowed one
+
+
+def test_successes_recover_the_rate_additively(clock):
+    limiter = AdaptiveRateLimiter(max_rate=20, min_rate=1, burst=4)
+    limiter.record("throttled")
+    clock.advance(upstream_guard.DECREASE_COOLDOWN_SEC)
+    limiter.record("throttled")
+    assert limiter.rate == 5
+
+    limiter.record("ok") # +increase_per_sec spread over one second of calls at the current rate
+    assert limiter.rate == pytest.approx(5 + limiter.increase_per_sec / 5)
+    rates = [limiter.rate]
+    for _ in range(5):
+        limiter.record("ok")
+        rates.append(limiter.rate)
+    steps = [b - a for a, b in zip(rates, rates[1:])]
+    assert all(0 < step < 1 for step in steps) # Small additive steps, not a jump back to max_rate
+
+    for _ in range(2000):
+        limiter.record("ok")
+    assert limiter.rate == 20
+
+
+def test_error_bursts_cut_the_rate_once_the_window_agrees(clock):
+    limiter = AdaptiveRateLimiter(max_rate=10, min_rate=1, burst=4, error_ratio=0.5)
+    for _ in range(upstream_guard.LIMITER_WINDOW // 2 - 1):
+        limiter.record("error")
+    assert limiter.rate == 10 # Too few attempts to judge yet
+    limiter.record("timeout")
+    assert limiter.rate == 5
+
+
+# --- CircuitBreaker ---
+def make_breaker(**overrides):
+    return CircuitBreaker(**{"failure_ratio": 0.5, "min_calls": 4, "window_sec": 10, "open_sec": 2, "max_open_sec": 8,
+                             **overrides})
+
+
+def test_breaker_opens_then_half_opens_then_closes_on_a_probe_success(clock):
+    breaker = make_breaker()
+    for outcome in ("ok", "error", "ok"):
+        breaker.record(outcome)
+    assert breaker.status == "closed"
+    breaker.record("error") # 2 of 4 attempts failed
+    assert breaker.status == "open"
+
+    with pytest.raises(UpstreamUnavailable) as rejected:
+        breaker.before_call()
+    assert 2 <= rejected.value.retry_in <= 4 # open_sec, doubled and jittered for the first trip
+    assert breaker.counters["rejected"] == 1
+
+    clock.advance(4.01)
+    probe = breaker.before_call() # The probe
+    assert probe is not None
+    assert breaker.status == "half_open"
+    with pytest.raises(UpstreamUnavailable):
+        breaker.before_call() # Only one probe at a time
+
+    breaker.record("ok", probe)
+    assert (breaker.status, breaker.trips) == ("closed", 0)
+    assert breaker.before_call() is None
+
+
+def test_failed_probe_reopens_for_longer(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record("error")
+    clock.advance(4.01)
+    breaker.record("timeout", breaker.before_call())
+    assert (breaker.status, breaker.trips) == ("open", 2)
+    assert 4 <= breaker.retry_in() <= 8
+
+
+def test_only_the_probe_settles_the_half_open_state(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record("error")
+    clock.advance(4.01)
+    probe = breaker.before_call()
+    breaker.record("ok")     # A call admitted before the trip answers late
+    breaker.record("error")
+    assert (breaker.status, breaker.trips) == ("half_open", 1)
+    with pytest.raises(UpstreamUnavailable):
+        breaker.before_call() # Still waiting on the probe
+
+    breaker.record("timeout", probe)
+    assert (breaker.status, breaker.trips) == ("open", 2)
+
+
+def test_a_timed_out_probe_cannot_settle_its_successor(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record("error")
+    clock.advance(4.01)
+    stuck = breaker.before_call()
+    clock.advance(2.01) # Longer than open_sec: the stuck probe is replaced
+    probe = breaker.before_call()
+    assert probe not in (None, stuck)
+
+    breaker.record("ok", stuck)
+    assert breaker.status == "half_open"
+    breaker.record("ok", probe)
+    assert (breaker.status, breaker.trips) == ("closed", 0)
+
+
+def test_failures_outside_the_window_do_not_trip(clock):
+    breaker = make_breaker()
+    for _ in range(6):
+        breaker.record("error")
+        breaker.record("ok")
+        breaker.record("ok")
+        clock.advance(11)
+    assert breaker.status == "closed"
+
+
+def test_throttling_does_not_trip_the_breaker(clock):
+    breaker = make_breaker()
+    for _ in range(10):
+        breaker.record("throttled")
+    assert breaker.status == "closed"
+
+
+# --- Against the stub API ---
+def test_open_circuit_fails_fast_during_an_error_burst():
+    guard = UpstreamGuard(AdaptiveRateLimiter(max_rate=0),
+                          make_breaker(min_calls=3, window_sec=30, open_sec=30, max_open_sec=60))
+    session = build_http_session(pool_size=2)
+    with FakeSnappfoodServer(n_products=20) as srv, use_base_url(srv.base_url), use_upstream_guard(guard):
+        srv.inject_burst(30)
+        first = VendorMenuFastScraper("burst0", session=session, use_cache=False)
+        assert first.scrape() is None # Its retries are what trip the breaker
+        assert guard.breaker.status == "open"
+        requests_when_opened = srv.stats["requests"]
+
+        started = time.perf_counter()
+        for i in range(1, 6):
+            scraper = VendorMenuFastScraper(f"burst{i}", session=session, use_cache=False)
+            assert scraper.scrape() is None
+            assert scraper.last_error_kind == "circuit_open"
+        assert time.perf_counter() - started < 1.0
+        assert srv.stats["requests"] == requests_when_opened
+    assert guard.breaker.counters["rejected"] >= 5
+
+
+async def async_scrape(vendor_code):
+    async with build_async_client(2) as client:
+        return await AsyncVendorMenuScraper(vendor_code, client, use_cache=False).scrape()
+
+
+@pytest.mark.parametrize("engine", ["blocking", "async"])
+def test_probe_through_the_scraper_closes_the_circuit(engine):
+    guard = UpstreamGuard(AdaptiveRateLimiter(max_rate=0),
+                          make_breaker(min_calls=3, window_sec=30, open_sec=0.1, max_open_sec=0.2))
+    scrape = (lambda code: VendorMenuFastScraper(code, session=build_http_session(pool_size=2), use_cache=False).scrape()) \
+        if engine == "blocking" else (lambda code: asyncio.run(async_scrape(code)))
+    with FakeSnappfoodServer(n_products=20) as srv, use_base_url(srv.base_url), use_upstream_guard(guard):
+        for _ in range(3):
+            guard.record(503)
+        assert guard.breaker.status == "open"
+        time.sleep(guard.breaker.retry_in() + 0.01)
+
+        assert scrape("recovered") is not None # This scrape's request is the probe
+        assert (guard.breaker.status, guard.breaker.trips) == ("closed", 0)
@@ -0,0 +1,121 @@
+# tests/test_vendor_search.py
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from vendor_search import VendorSearchIndex
+
+VENDORS = [
+    # sf_code, sf_name, tf_code, tf_name, city_id, marketing_area, business_line
+    ("s1a", "پیتزا پپرونی", "t1a", "پيتزا پپروني", "1", "Tehran", "Restaurant"),
+    ("s2b", "کافه لمیز", "t2b", "", "1", "Tehran", "Cafe"),
+    ("s3c", "پیتزا‌فروشی نمونه", "t3c", "", "2", "Karaj", "Restaurant"),
+    ("s4d", "تاپ پیتزا", "t4d", "", "1", "Shemiran", "Restaurant"),
+    ("s5e", "Pizza Hut", "t5e", "", "2", "Karaj", "Restaurant"),
+    ("s6f", "Pizzeria Roma", "t6f", "", "1", "Tehran", "Restaurant"),
+]
+
+
+def vendors_frame(rows=VENDORS):
+    return pd.DataFrame(rows, columns=["sf_code", "sf_name", "tf_code", "tf_name", "city_id", "marketing_area", "business_line"])
+
+
+@pytest.fixture(scope="module")
+def index():
+    return VendorSearchIndex(vendors_frame())
+
+
+def codes(results):
+    return [result["sf_code"] for result in results]
+
+
+def test_arabic_letters_spacing_and_zwnj_are_normalized(index):
+    assert codes(index.search("  كافه   لميز "))[0] == "s2b"     # Arabic kaf / yeh, stray spaces
+    assert codes(index.search("پیتزا فروشی"))[0] == "s3c"        # ZWNJ in the indexed name
+    assert codes(index.search("PIZZA hut"))[0] == "s5e"
+
+
+def test_exact_code_ranks_first(index):
+    results = index.search("T3C")
+    assert codes(results)[0] == "s3c"
+    assert results[0]["score"] >= 3
+
+
+def test_name_prefix_outranks_word_prefix_and_trigram_hits(index):
+    results = index.search("پیتزا")
+    ranked = codes(results)
+    assert set(ranked[:2]) == {"s1a", "s3c"} # Full name starts with the query
+    assert ranked[2] == "s4d"                # Only a later word does
+    assert results[1]["score"] > results[2]["score"]
+
+    results = index.search("pizza")
+    assert codes(results)[0] == "s5e"
+    pizzeria = next(result for result in results if result["sf_code"] == "s6f") # Trigram similarity only
+    assert 0 < pizzeria["score"] < 1 < results[0]["score"]
+
+
+def test_last_word_is_matched_as_a_prefix(index):
+    assert codes(index.search("کافه لم")) == ["s2b"]
+
+
+def test_filters_narrow_results(index):
+    assert set(codes(index.search("پیتزا", city_id="1"))) == {"s1a", "s4d"}
+    assert codes(index.search("pizza", marketing_area="karaj")) == ["s5e"]
+    assert codes(index.search("کافه", business_line="Restaurant")) == []
+    assert codes(index.search("کافه", city_id="1", business_line="cafe")) == ["s2b"]
+    assert codes(index.search("پیتزا", city_id="")) == codes(index.search("پیتزا")) # Empty filter is ignored
+    assert index.search("پیتزا", city_id="99") == []
+
+
+def test_limit(index):
+    assert len(index.search("پیتزا", limit=2)) == 2
+    assert index.search("پیتزا", limit=0) == []
+
+
+def test_queries_shorter_than_a_trigram_still_prefix_match(index):
+    ranked = codes(index.search("پ"))
+    assert set(ranked[:2]) == {"s1a", "s3c"} and ranked[2:] == ["s4d"]
+    assert codes(index.search("Pi"))[:2] == ["s5e", "s6f"]
+    assert index.search("") == []
+    assert index.search(" ‌ ") == []
+
+
+def test_empty_index_returns_nothing():
+    assert VendorSearchIndex().search("پیتزا") == []
+    assert len(VendorSearchIndex(pd.DataFrame())) == 0
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import app as web_app
+    rows = VENDORS + [(f"x{i:02d}", f"Pizza Place {i}", f"y{i:02d}", "", "3", "Tabriz", "Restaurant") for i in range(60)]
+    snapshot = {"matched_vendors": ({}, {}, VendorSearchIndex(vendors_frame(rows)))}
+    monkeypatch.setattr(web_app, "data_reloader", SimpleNamespace(snapshot=snapshot))
+    return web_app.app.test_client()
+
+
+def test_search_route_returns_ranked_results(client):
+    body = client.get("/vendors/search", query_string={"q": "لميز"}).get_json()
+    assert body["success"] is True
+    assert body["query"] == "لميز"
+    assert codes(body["results"]) == ["s2b"]
+    assert body["results"][0]["tf_code"] == "t2b"
+    assert body["took_ms"] >= 0
+
+
+def test_search_route_applies_filters(client):
+    body = client.get("/vendors/search", query_string={"q": "pizza", "city_id": "2", "marketing_area": "Karaj"}).get_json()
+    assert codes(body["results"]) == ["s5e"]
+
+
+def test_search_route_clamps_limit(client):
+    search = lambda limit: client.get("/vendors/search", query_string={"q": "pizza", "limit": limit}).get_json()["results"]
+    assert len(search(500)) == 50
+    assert len(search(0)) == 1
+    assert len(search(3)) == 3
+    assert len(client.get("/vendors/search", query_string={"q": "pizza"}).get_json()["results"]) == 10
+
+
+def test_search_route_with_blank_query(client):
+    assert client.get("/vendors/search").get_json()["results"] == []
@@ -0,0 +1,365 @@
+# tf_store.py
+import argparse
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather # Optional: enables the columnar cache
+except ImportError:
+    feather = None
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class VendorFrameIndex:
+    """Vendor-keyed index over a TapsiFood DataFrame.
+
+    Rows are stably sorted by vendor code once, and each code maps to its
+    (start, stop) row offsets, so a lookup is a dict hit plus an iloc slice
+    instead of a boolean scan over the whole frame.
+    """
+
+    def __init__(self, df: pd.DataFrame | None, key: str = "vendor_code"):
+        self.key = key
+        self._ranges = {}
+        if df is None or key not in df.columns:
+            self.df = pd.DataFrame()
+            return
+
+        # Rows without a code can never match a lookup, drop them up front
+        df = df[df[key].notna()]
+        # mergesort is stable: each vendor's rows keep their original file order
+        self.df = df.sort_values(key, kind="mergesort").reset_index(drop=True)
+        if self.df.empty:
+            return
+
+        codes = self.df[key].to_numpy(dtype=object)
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        stops = np.r_[starts[1:], len(codes)]
+        self._ranges = {codes[s]: (int(s), int(e)) for s, e in zip(starts, stops)}
+
+    def __len__(self) -> int:
+        return len(self._ranges)
+
+    def __contains__(self, vendor_code) -> bool:
+        return vendor_code in self._ranges
+
+    def vendor_codes(self):
+        return self._ranges.keys()
+
+    def get(self, vendor_code: str) -> pd.DataFrame | None:
+        """Returns the vendor's rows as a slice of the sorted frame, or None."""
+        bounds = self._ranges.get(vendor_code)
+        if bounds is None:
+            return None
+        return self.df.iloc[bounds[0]:bounds[1]]
+
+    def first_row(self, vendor_code: str) -> pd.Series | None:
+        """Returns the vendor's first row (in original file order), or None."""
+        bounds = self._ranges.get(vendor_code)
+        if bounds is None:
+            return None
+        return self.df.iloc[bounds[0]]
+
+
+# --- SnappFood-shaped vendor info, precomputed per TapsiFood vendor ---
+DAY_NAME_TO_SF_WEEKDAY = {
+    "Saturday": 1, "Sunday": 2, "Monday": 3, "Tuesday": 4,
+    "Wednesday": 5, "Thursday": 6, "Friday": 7
+}
+
+
+def transform_tf_shifts(raw_value) -> tuple[str, str | None]:
+    """TapsiFood shifts JSON -> SnappFood schedules JSON string.
+
+    Returns (shifts_json, problem) where problem describes a malformed cell, or None.
+    Whatever was transformed before a problem is kept.
+    """
+    raw_json_str = '[]' if pd.isna(raw_value) else str(raw_value)
+    if not raw_json_str.strip():
+        raw_json_str = '[]'
+
+    transformed_shifts_list = []
+    problem = None
+    try:
+        tf_shifts_data = json.loads(raw_json_str)
+        if isinstance(tf_shifts_data, list):
+            for day_schedule in tf_shifts_data:
+                weekday_num = DAY_NAME_TO_SF_WEEKDAY.get(day_schedule.get("DayOfWeek"))
+                if weekday_num is not None and isinstance(day_schedule.get("Shifts"), list):
+                    for shift_interval in day_schedule.get("Shifts", []):
+                        start_time = shift_interval.get("StartTime")
+                        end_time = shift_interval.get("EndTime")
+                        if start_time and end_time:
+                            transformed_shifts_list.append({
+                                "weekday": weekday_num,
+                                "allDay": False,
+                                "startHour": start_time,
+                                "stopHour": end_time
+                            })
+        elif raw_json_str != '[]':
+            problem = f"valid JSON but not a list: {raw_json_str[:80]}"
+    except json.JSONDecodeError:
+        problem = f"invalid JSON: '{raw_json_str[:80]}'"
+    except Exception as e:
+        problem = f"transform error: {e}"
+    return json.dumps(transformed_shifts_list), problem
+
+
+class TapsifoodInfo:
+    """tf_info indexed by vendor, plus each vendor's SnappFood-shaped vendor_info built once.
+
+    default_vendor_info(code) supplies the base dict (app.get_default_vendor_info). The
+    first tf_info row per vendor wins, as with the index lookup. Vendors whose shifts cell
+    could not be transformed are collected in malformed_shifts instead of logged per request.
+    """
+
+    def __init__(self, index: VendorFrameIndex, default_vendor_info):
+        self.index = index
+        self.vendor_infos = {}
+        self.malformed_shifts = {}
+        if index.df.empty:
+            return
+        for row in index.df.to_dict("records"):
+            tf_vendor_code = row.get("vendor_code")
+            if tf_vendor_code in self.vendor_infos:
+                continue
+            shifts_json, problem = transform_tf_shifts(row.get("shifts"))
+            if problem:
+                self.malformed_shifts[tf_vendor_code] = problem
+            vendor_info = default_vendor_info(tf_vendor_code)
+            vendor_info.update({
+                "vendor_code": tf_vendor_code,
+                "snappfood_vendor_id": row.get('id', ''), # Using 'id' from your SQL as the unique TF ID
+                "vendor_name": row.get('vendor_name', ''),
+                "business_line": row.get('business_line', ''),
+                "marketing_area": row.get('marketing_area', ''),
+                "address": row.get('address', ''),
+                "min_order": str(row.get('min_order', '0')),
+                "latitude": str(row.get('latitude', '')),
+                "longitude": str(row.get('longitude', '')),
+                "shifts": shifts_json
+            })
+            self.vendor_infos[tf_vendor_code] = vendor_info
+
+    def __len__(self) -> int:
+        return len(self.vendor_infos)
+
+    def vendor_info(self, tf_vendor_code: str) -> dict | None:
+        """Returns a copy of the vendor's precomputed vendor_info, or None."""
+        vendor_info = self.vendor_infos.get(tf_vendor_code)
+        return dict(vendor_info) if vendor_info is not None else None
+
+
+# --- Columnar cache of the TapsiFood CSV exports ---
+# tf_menu.csv -> tf_menu.feather (+ tf_menu.feather.meta.json next to it). The cache holds the
+# normalized, vendor-sorted frame with category dtypes, and is keyed by the CSV's size/mtime
+# and SHA-256 (hashed only when size/mtime changed, so a fresh cache costs one stat()).
+def read_tf_csv(csv_path: Path) -> pd.DataFrame:
+    """Reads a TapsiFood export as strings, naming the vendor column 'vendor_code' (stripped)."""
+    df = pd.read_csv(csv_path, dtype=str)
+    if 'vendor_code' not in df.columns and 'tf_code' in df.columns:
+        df = df.rename(columns={'tf_code': 'vendor_code'})
+    if 'vendor_code' in df.columns:
+        df['vendor_code'] = df['vendor_code'].str.strip()
+    return df
+
+
+def _cache_paths(csv_path: Path) -> tuple[Path, Path]:
+    cache_path = csv_path.with_suffix(".feather")
+    return cache_path, cache_path.with_name(cache_path.name + ".meta.json")
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _source_stamp(csv_path: Path) -> dict:
+    stat = csv_path.stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _cache_is_valid(csv_path: Path, cache_path: Path, meta_path: Path, category_cols) -> bool:
+    if not (cache_path.is_file() and meta_path.is_file()):
+        return False
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if meta.get("category_cols") != list(category_cols):
+        return False
+    stamp = _source_stamp(csv_path)
+    if meta.get("size") == stamp["size"] and meta.get("mtime_ns") == stamp["mtime_ns"]:
+        return True
+    # Touched but maybe not changed (e.g. re-copied export): fall back to the content hash
+    if meta.get("size") == stamp["size"] and meta.get("sha256") == _file_sha256(csv_path):
+        meta.update(stamp)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        return True
+    return False
+
+
+def build_tf_cache(csv_path: Path, category_cols=()) -> pd.DataFrame:
+    """Reads the CSV, normalizes/sorts/categorizes it and writes the columnar cache next to it."""
+    csv_path = Path(csv_path)
+    stamp = _source_stamp(csv_path)
+    df = read_tf_csv(csv_path)
+    if 'vendor_code' in df.columns:
+        df = VendorFrameIndex(df).df # Pre-sorted, so building the index at startup is cheap
+    for col in category_cols:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+
+    if feather is None:
+        logger.warning("pyarrow is not installed; TapsiFood columnar cache disabled.")
+        return df
+    cache_path, meta_path = _cache_paths(csv_path)
+    tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+    # Uncompressed so the file can be memory-mapped on load
+    feather.write_feather(df, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, cache_path)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({**stamp, "sha256": _file_sha256(csv_path), "category_cols": list(category_cols),
+                   "rows": len(df), "built_at": time.strftime("%Y-%m-%dT%H:%M:%S")}, f)
+    logger.info(f"Built TapsiFood columnar cache {cache_path} ({len(df)} rows).")
+    return df
+
+
+def load_tf_table(csv_path: Path, category_cols=(), use_cache: bool = config.TF_COLUMNAR_CACHE_ENABLED) -> pd.DataFrame:
+    """Loads a TapsiFood export, from its columnar cache when fresh (memory-mapped)."""
+    csv_path = Path(csv_path)
+    if not use_cache or feather is None:
+        return read_tf_csv(csv_path)
+    cache_path, meta_path = _cache_paths(csv_path)
+    if _cache_is_valid(csv_path, cache_path, meta_path, category_cols):
+        try:
+            return feather.read_table(cache_path, memory_map=True).to_pandas()
+        except Exception as e:
+            logger.warning(f"Could not read columnar cache {cache_path} ({e}); rebuilding from CSV.")
+    try:
+        return build_tf_cache(csv_path, category_cols)
+    except OSError as e:
+        logger.warning(f"Could not write columnar cache for {csv_path} ({e}); using CSV only.")
+        return read_tf_csv(csv_path)
+
+
+# --- Benchmarks (python tf_store.py bench-lookup | bench-startup) ---
+def _synthetic_menu_frame(n_rows: int, rows_per_vendor: int = 150) -> pd.DataFrame:
+    rng = np.random.default_rng(42)
+    n_vendors = max(1, n_rows // rows_per_vendor)
+    vendor_ids = rng.integers(0, n_vendors, size=n_rows)
+    return pd.DataFrame({
+        "vendor_code": [f"v{v:06d}" for v in vendor_ids],
+        "category_name": [f"cat{c}" for c in rng.integers(0, 20, size=n_rows)],
+        "item_id": [str(i) for i in range(n_rows)],
+        "item_title": [f"item {i}" for i in range(n_rows)],
+        "price": [str(p) for p in rng.integers(10_000, 900_000, size=n_rows)],
+    }, dtype=str)
+
+
+def benchmark_lookup(sizes=(10_000, 100_000, 1_000_000), lookups: int = 200):
+    for n_rows in sizes:
+        df = _synthetic_menu_frame(n_rows)
+        t0 = time.perf_counter()
+        index = VendorFrameIndex(df)
+        build_s = time.perf_counter() - t0
+
+        codes = list(index.vendor_codes())
+        sample = [codes[i % len(codes)] for i in range(0, lookups * 7, 7)]
+
+        t0 = time.perf_counter()
+        for code in sample:
+            df[df["vendor_code"] == code].copy()
+        scan_ms = (time.perf_counter() - t0) * 1000 / len(sample)
+
+        t0 = time.perf_counter()
+        for code in sample:
+            index.get(code)
+        index_ms = (time.perf_counter() - t0) * 1000 / len(sample)
+
+        print(f"{n_rows:>9,} rows / {len(index):>6,} vendors | build {build_s:6.2f}s | "
+              f"scan {scan_ms:8.3f} ms/lookup | index {index_ms:8.4f} ms/lookup | "
+              f"speedup x{scan_ms / index_ms if index_ms else float('inf'):,.0f}")
+
+
+def _peak_rss_mb() -> float:
+    # VmHWM resets on exec; ru_maxrss would inherit the parent's peak on Linux
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _load_once(csv_path: str, mode: str):
+    """Child-process body for bench-startup: load once, report seconds and peak RSS."""
+    t0 = time.perf_counter()
+    if mode == "csv":
+        df = read_tf_csv(Path(csv_path))
+        VendorFrameIndex(df)
+    else:
+        df = load_tf_table(Path(csv_path), config.TF_MENU_CATEGORY_COLS, use_cache=True)
+        VendorFrameIndex(df)
+    elapsed = time.perf_counter() - t0
+    rss_mb = _peak_rss_mb()
+    print(json.dumps({"mode": mode, "rows": len(df), "seconds": round(elapsed, 3), "peak_rss_mb": round(rss_mb, 1)}))
+
+
+def benchmark_startup(csv_path: Path):
+    """Compares load+index time and peak RSS of the CSV path against the columnar cache."""
+    csv_path = Path(csv_path)
+    build_tf_cache(csv_path, config.TF_MENU_CATEGORY_COLS) # Make sure the cache is warm
+    for mode in ("csv", "cache"):
+        out = subprocess.run([sys.executable, __file__, "_load-once", str(csv_path), mode],
+                             capture_output=True, text=True, check=True)
+        print(out.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TapsiFood store utilities.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_lookup = sub.add_parser("bench-lookup", help="Vendor lookup latency: boolean scan vs index.")
+    p_lookup.add_argument("rows", type=int, nargs="*", default=[10_000, 100_000, 1_000_000])
+    p_build = sub.add_parser("build-cache", help="Convert tf_menu.csv / tf_info.csv to their columnar cache.")
+    p_startup = sub.add_parser("bench-startup", help="Startup time and peak RSS: CSV vs columnar cache.")
+    p_startup.add_argument("csv_path", type=Path, nargs="?", default=config.TF_MENU_CSV_PATH)
+    p_once = sub.add_parser("_load-once")
+    p_once.add_argument("csv_path")
+    p_once.add_argument("mode", choices=("csv", "cache"))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    if args.command == "bench-lookup":
+        benchmark_lookup(tuple(args.rows))
+    elif args.command == "build-cache":
+        for path, cols in ((config.TF_MENU_CSV_PATH, config.TF_MENU_CATEGORY_COLS),
+                           (config.TF_INFO_CSV_PATH, config.TF_INFO_CATEGORY_COLS)):
+            if path.is_file():
+                build_tf_cache(path, cols)
+            else:
+                logger.warning(f"{path} not found, skipping.")
+    elif args.command == "bench-startup":
+        benchmark_startup(args.csv_path)
+    else:
+        _load_once(args.csv_path, args.mode)
@@ -0,0 +1,308 @@
+# upstream_guard.py
+import random
+import threading
+import time
+from collections import deque
+
+import config
+import metrics
+
+DECREASE_COOLDOWN_SEC = 1.0 # At most one rate cut per second, so one burst of failures halves the rate once
+LIMITER_WINDOW = 20 # Recent attempts the limiter's 5xx/timeout ratio is computed over
+BREAKER_STATE_CODES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class UpstreamUnavailable(Exception):
+    """Raised instead of calling Snappfood while the circuit breaker is open."""
+
+    def __init__(self, retry_in: float):
+        super().__init__(f"Snappfood API circuit is open; next attempt allowed in {retry_in:.1f}s")
+        self.retry_in = retry_in
+
+
+def jittered_backoff(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with "equal jitter": half the step fixed, half random, so callers spread out."""
+    step = min(cap, base * (2 ** max(0, attempt - 1)))
+    return step / 2 + random.uniform(0, step / 2)
+
+
+def classify_outcome(status: int | None = None, timed_out: bool = False) -> str:
+    """'ok', 'throttled' (429), 'error' (5xx or network failure) or 'timeout' for one upstream attempt."""
+    if status is None:
+        return "timeout" if timed_out else "error"
+    if status == 429:
+        return "throttled"
+    return "error" if status >= 500 else "ok" # 404 and 304 are a healthy upstream answering
+
+
+class AdaptiveRateLimiter:
+    """Token bucket whose rate backs off on 429s and 5xx/timeout bursts (AIMD).
+
+    A 429, or a 5xx/timeout share of the last LIMITER_WINDOW attempts at or above
+    error_ratio, multiplies the rate by decrease_factor (down to min_rate) and
+    empties the bucket; every success adds back about increase_per_sec per second
+    up to max_rate. max_rate <= 0 disables limiting.
+    """
+
+    def __init__(self, max_rate: float = config.SF_RATE_LIMIT_PER_SEC,
+                 min_rate: float = config.SF_RATE_LIMIT_MIN_PER_SEC,
+                 burst: float = config.SF_RATE_LIMIT_BURST,
+                 error_ratio: float = config.SF_RATE_LIMIT_ERROR_RATIO,
+                 decrease_factor: float = 0.5):
+        self.max_rate = max(0.0, max_rate)
+        self.min_rate = min(max(min_rate, 0.01), self.max_rate) if self.max_rate else 0.0
+        self.burst = max(1.0, burst)
+        self.error_ratio = error_ratio
+        self.decrease_factor = decrease_factor
+        self.increase_per_sec = self.max_rate / 20 # Full recovery from min_rate in about 20s of clean traffic
+        self.rate = self.max_rate
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._last_decrease = 0.0
+        self._recent = deque(maxlen=LIMITER_WINDOW) # True for each failed attempt
+        self._lock = threading.Lock()
+        self.counters = {"throttled": 0, "errors": 0, "decreases": 0}
+        metrics.UPSTREAM_RATE_LIMIT.set(self.rate)
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> float:
+        """Takes a token and returns 0, or returns the seconds until one is due (then try again).
+
+        Waiters re-check instead of booking a slot, so a rate change applies to
+        them at once; the jitter keeps them from all waking together.
+        """
+        if not self.max_rate:
+            return 0.0
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate * random.uniform(1.0, 1.5)
+
+    def acquire(self):
+        while (delay := self.try_acquire()) > 0:
+            time.sleep(delay)
+
+    def record(self, outcome: str):
+        if not self.max_rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            failed = outcome in ("error", "timeout")
+            self._recent.append(failed)
+            if outcome == "throttled":
+                self.counters["throttled"] += 1
+                self._decrease(now)
+            elif failed:
+                self.counters["errors"] += 1
+                if len(self._recent) >= LIMITER_WINDOW // 2 and sum(self._recent) / len(self._recent) >= self.error_ratio:
+                    self._decrease(now)
+            elif outcome == "ok" and self.rate < self.max_rate:
+                self._refill(now)
+                self.rate = min(self.max_rate, self.rate + self.increase_per_sec / self.rate)
+                metrics.UPSTREAM_RATE_LIMIT.set(self.rate)
+
+    def _decrease(self, now: float):
+        if now - self._last_decrease < DECREASE_COOLDOWN_SEC:
+            return
+        self._refill(now)
+        self._last_decrease = now
+        self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+        self._tokens = min(self._tokens, 0.0) # Stop the rest of the burst too
+        self.counters["decreases"] += 1
+        metrics.UPSTREAM_RATE_LIMIT.set(self.rate)
+
+    def state(self) -> dict:
+        with self._lock:
+            if self.max_rate:
+                self._refill(time.monotonic())
+            return {"enabled": bool(self.max_rate), "rate_per_sec": round(self.rate, 3),
+                    "min_rate_per_sec": self.min_rate, "max_rate_per_sec": self.max_rate,
+                    "tokens": round(self._tokens, 2), "burst": self.burst,
+                    "recent_failure_ratio": round(sum(self._recent) / len(self._recent), 3) if self._recent else 0.0,
+                    **self.counters}
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker over a sliding time window of attempts.
+
+    Trips when at least min_calls attempts in the last window_sec include a
+    failure_ratio share of 5xx/timeouts (429s are the limiter's business). While
+    open every call fails fast; after a jittered open period, which doubles with
+    each consecutive trip up to max_open_sec, one probe is let through: success
+    closes the circuit, failure opens it again. before_call() hands the probe a
+    token; only record() with that token settles the half-open state, so calls
+    that were already in flight cannot close the circuit on the probe's behalf.
+    """
+
+    def __init__(self, failure_ratio: float = config.SF_BREAKER_FAILURE_RATIO,
+                 min_calls: int = config.SF_BREAKER_MIN_CALLS,
+                 window_sec: float = config.SF_BREAKER_WINDOW_SEC,
+                 open_sec: float = config.SF_BREAKER_OPEN_SEC,
+                 max_open_sec: float = config.SF_BREAKER_MAX_OPEN_SEC):
+        self.failure_ratio = failure_ratio
+        self.min_calls = max(1, min_calls)
+        self.window_sec = window_sec
+        self.open_sec = open_sec
+        self.max_open_sec = max(open_sec, max_open_sec)
+        self.enabled = failure_ratio > 0
+        self.status = "closed"
+        self.trips = 0 # Consecutive trips without a successful probe
+        self._open_until = 0.0
+        self._probe_started = None
+        self._probe = None    # Token of the probe in flight
+        self._probe_seq = 0
+        self._window = deque() # (monotonic time, failed)
+        self._failures = 0
+        self._lock = threading.Lock()
+        self.counters = {"opened": 0, "rejected": 0}
+        metrics.UPSTREAM_BREAKER_STATE.set(0)
+
+    def _set_status(self, status: str):
+        self.status = status
+        metrics.UPSTREAM_BREAKER_STATE.set(BREAKER_STATE_CODES[status])
+
+    def _prune(self, now: float):
+        while self._window and now - self._window[0][0] > self.window_sec:
+            self._failures -= self._window.popleft()[1]
+
+    def before_call(self) -> int | None:
+        """Raises UpstreamUnavailable unless a call may go out now.
+
+        Returns the probe token when this call is the half-open probe (pass it to
+        record()), else None.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            if self.status == "closed":
+                return None
+            if self.status == "open" and now >= self._open_until:
+                self._set_status("half_open")
+                self._probe_started = None
+            # A probe that never reported back (caller died) stops blocking after one open period
+            if self.status == "half_open" and (self._probe_started is None or now - self._probe_started > self.open_sec):
+                self._probe_started = now
+                self._probe_seq += 1
+                self._probe = self._probe_seq
+                return self._probe
+            self.counters["rejected"] += 1
+            metrics.UPSTREAM_BREAKER_REJECTIONS.inc()
+            raise UpstreamUnavailable(self._retry_in(now))
+
+    def record(self, outcome: str, probe: int | None = None):
+        """Reports one attempt's outcome; probe is the token before_call() returned for it."""
+        if not self.enabled:
+            return
+        failed = outcome in ("error", "timeout")
+        with self._lock:
+            now = time.monotonic()
+            if self.status == "half_open":
+                if probe is None or probe != self._probe:
+                    return # A straggler admitted before the trip, or a probe that already timed out
+                self._probe = None
+                if failed:
+                    self._open(now)
+                else:
+                    self._set_status("closed")
+                    self.trips = 0
+                    self._window.clear()
+                    self._failures = 0
+                return
+            if self.status == "open":
+                return # A straggler from before the trip
+            self._window.append((now, failed))
+            self._failures += failed
+            self._prune(now)
+            if failed and len(self._window) >= self.min_calls and self._failures / len(self._window) >= self.failure_ratio:
+                self._open(now)
+
+    def _open(self, now: float):
+        self.trips += 1
+        self.counters["opened"] += 1
+        self._open_until = now + jittered_backoff(self.trips, self.open_sec * 2, self.max_open_sec)
+        self._probe_started = None
+        self._probe = None
+        self._window.clear()
+        self._failures = 0
+        self._set_status("open")
+
+    def _retry_in(self, now: float) -> float:
+        if self.status == "open":
+            return max(0.0, self._open_until - now)
+        if self.status == "half_open" and self._probe_started is not None:
+            return max(0.0, self._probe_started + self.open_sec - now) # Until a stuck probe times out
+        return 0.0
+
+    def retry_in(self) -> float:
+        """Seconds until the breaker lets a call through (0 when closed)."""
+        with self._lock:
+            return self._retry_in(time.monotonic()) if self.enabled else 0.0
+
+    def state(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            return {"enabled": self.enabled, "state": self.status, "consecutive_trips": self.trips,
+                    "retry_in_sec": round(self._retry_in(now), 2), "window_calls": len(self._window),
+                    "window_failures": self._failures, **self.counters}
+
+
+class UpstreamGuard:
+    """The rate limiter and circuit breaker every Snappfood attempt goes through.
+
+    Callers run acquire() (or, on an event loop, before_call() and then
+    try_acquire() until it returns 0) before each attempt, retries included,
+    and record() after it with the probe token those returned. The breaker
+    check raises UpstreamUnavailable while the circuit is open.
+    """
+
+    def __init__(self, limiter: AdaptiveRateLimiter | None = None, breaker: CircuitBreaker | None = None):
+        self.limiter = limiter or AdaptiveRateLimiter()
+        self.breaker = breaker or CircuitBreaker()
+
+    def before_call(self) -> int | None:
+        return self.breaker.before_call()
+
+    def try_acquire(self) -> float:
+        return self.limiter.try_acquire()
+
+    def acquire(self) -> int | None:
+        probe = self.breaker.before_call()
+        self.limiter.acquire()
+        return probe
+
+    def record(self, status: int | None = None, timed_out: bool = False, probe: int | None = None):
+        outcome = classify_outcome(status, timed_out)
+        self.limiter.record(outcome)
+        self.breaker.record(outcome, probe)
+
+    def state(self) -> dict:
+        return {"rate_limiter": self.limiter.state(), "circuit_breaker": self.breaker.state()}
+
+
+_upstream_guard = None
+_upstream_guard_lock = threading.Lock()
+
+
+def get_upstream_guard() -> UpstreamGuard:
+    """Returns the process-wide guard for the Snappfood API, creating it on first use."""
+    global _upstream_guard
+    if _upstream_guard is None:
+        with _upstream_guard_lock:
+            if _upstream_guard is None:
+                _upstream_guard = UpstreamGuard()
+    return _upstream_guard
+
+
+def set_upstream_guard(guard: UpstreamGuard | None) -> UpstreamGuard | None:
+    """Replaces the process-wide guard (None: rebuild from config on next use); returns the previous one."""
+    global _upstream_guard
+    with _upstream_guard_lock:
+        previous, _upstream_guard = _upstream_guard, guard
+    return previous
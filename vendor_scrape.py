@@ -8,15 +8,25 @@ import os
 import sys
 import subprocess
 import io
+import threading
 
-# concurrent.futures and pandas might not be strictly needed if only scraping one
-# but good to keep if you expand
-# from concurrent.futures import ThreadPoolExecutor, as_completed # Not used for single vendor scrape
-import pandas as pd # Used for Timestamp
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.exceptions import TimeoutError as Urllib3TimeoutError
+
+try:
+    import orjson # Optional: much faster decode of large vendor payloads
+except ImportError:
+    orjson = None
 
 try:
     import config # Your scraper's config file
+    import metrics
+    from response_cache import get_response_cache
+    from menu_store import get_menu_store
+    from upstream_guard import UpstreamUnavailable, get_upstream_guard, jittered_backoff
+    from menu_payload import TOPPINGS_INLINE, TOPPINGS_CATALOG, topping_group_id
 except ImportError:
     # This path is for when script is run directly
     print("Error: config.py not found. Please ensure it's in the same directory or PYTHONPATH.")
@@ -40,11 +50,135 @@ def configure_logging() -> logging.Logger:
     return logger
 
 
-class VendorMenuFastScraper:
-    """Scrapes menu data for a single Snappfood vendor."""
+# --- Shared HTTP session ---
+# One keep-alive session per process so repeated fetches reuse pooled TCP/TLS
+# connections to snappfood.ir instead of handshaking on every request.
+_http_session = None
+_http_session_lock = threading.Lock()
+
+# Circuit breaker probe token of the attempt this thread is making; CountingRetry runs inside session.get
+_upstream_attempt = threading.local()
+
+
+def is_timeout_error(error: Exception) -> bool:
+    """True for requests/urllib3 timeouts, including ones wrapped in MaxRetryError once retries ran out."""
+    if isinstance(error, (requests.exceptions.Timeout, Urllib3TimeoutError)):
+        return True
+    # Timeouts that exhaust urllib3's retries surface as ConnectionError(MaxRetryError(reason=...))
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, Urllib3TimeoutError)
+
+
+class CountingRetry(Retry):
+    """urllib3 Retry that counts every retry it grants and runs each one through the upstream guard.
+
+    The failed attempt is reported to the guard, the backoff is jittered, and the
+    retry then waits for a rate-limit token (or raises UpstreamUnavailable once
+    the circuit has opened).
+    """
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        new_retry = super().increment(method, url, response, error, _pool, _stacktrace) # Raises once exhausted
+        reason = str(response.status) if response is not None else type(error).__name__ if error is not None else "unknown"
+        metrics.UPSTREAM_RETRIES.inc(reason=reason)
+        # The final attempt is reported by the scraper's _upstream_get instead
+        get_upstream_guard().record(response.status if response is not None else None,
+                                    timed_out=error is not None and is_timeout_error(error),
+                                    probe=getattr(_upstream_attempt, "probe", None))
+        return new_retry
+
+    def get_backoff_time(self) -> float:
+        if len(self.history) < 1 or self.backoff_factor <= 0:
+            return 0.0
+        return jittered_backoff(len(self.history), self.backoff_factor, self.backoff_max)
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        _upstream_attempt.probe = get_upstream_guard().acquire()
+
+
+def build_http_session(pool_size: int | None = None, max_retries: int | None = None) -> requests.Session:
+    """Builds a pooled requests.Session with urllib3-level retry/backoff."""
+    pool_size = pool_size or config.HTTP_POOL_SIZE
+    max_retries = max_retries or config.MAX_RETRIES
+    retry = CountingRetry(
+        total=max(0, max_retries - 1), # MAX_RETRIES counts attempts, urllib3 counts retries
+        backoff_factor=config.RETRY_BACKOFF_FACTOR,
+        status_forcelist=config.RETRY_STATUS_CODES,
+        allowed_methods=frozenset({"GET"}),
+        raise_on_status=False, # Hand the final response back so raise_for_status reports it
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(config.REQUEST_HEADERS)
+    return session
 
-    def __init__(self, vendor_code: str):
-        """Initializes the scraper with vendor code and configuration."""
+
+def get_http_session() -> requests.Session:
+    """Returns the process-wide Snappfood session, creating it on first use."""
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                _http_session = build_http_session()
+    return _http_session
+
+
+def decode_json(content: bytes):
+    """Decodes a response body with orjson when available (see SF_JSON_BACKEND), else stdlib json."""
+    if orjson is not None and config.SF_JSON_BACKEND != "json":
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            pass # Let the stdlib decoder handle what orjson rejects (BOM, huge ints) or raise the error
+    return json.loads(content)
+
+
+def _topping_group(grp: dict, memo: dict) -> tuple[str, str]:
+    """Serializes one topping group (without group_index) as (content-hash ID, JSON text).
+
+    Groups identical to one already seen reuse its ID and JSON text.
+    """
+    inner = grp.get("toppings", [])
+    toppings = [t for t in inner if isinstance(t, dict)] if isinstance(inner, list) else []
+    max_count, min_count = grp.get("maxCount", 1), grp.get("minCount", 0)
+    # Types are part of the key so 1, 1.0 and True (equal as dict keys) don't share a serialization
+    try:
+        key = (grp.get("id"), grp.get("title", ""), max_count, type(max_count), min_count, type(min_count),
+               tuple((t.get("id"), t.get("title", ""), t.get("description", ""), price, type(price))
+                     for t in toppings for price in (t.get("price", 0),)))
+        cached = memo.get(key)
+    except TypeError: # Unhashable field values: serialize without memoizing
+        key, cached = None, None
+    if cached is not None:
+        return cached
+    if isinstance(inner, list) and len(toppings) != len(inner):
+        logging.getLogger("VendorMenuFastScraper").debug(
+            f"Skipping {len(inner) - len(toppings)} malformed topping(s) in group {grp.get('id', 'N/A')}")
+    body = json.dumps({
+        "id": grp.get("id"), "title": grp.get("title", ""),
+        "maxCount": max_count, "minCount": min_count,
+        "toppings": [{"id": t.get("id"), "title": t.get("title", ""),
+                      "description": t.get("description", ""), "price": t.get("price", 0)} for t in toppings],
+    }, ensure_ascii=False, indent=None, separators=(',', ':'))
+    cached = (topping_group_id(body), body)
+    if key is not None:
+        memo[key] = cached
+    return cached
+
+
+class VendorMenuParser:
+    """Transport-independent half of a Snappfood scraper: settings, logging and menu parsing.
+
+    Mixed into VendorMenuFastScraper (requests) and async_scrape.AsyncVendorMenuScraper
+    (httpx), which each add their own fetch_vendor_json()/scrape() with the same contract.
+    """
+
+    def _configure(self, vendor_code: str, use_cache: bool):
+        """Settings and logger; everything but the HTTP transport."""
         self.data_dir = config.DATA_DIR
         self.output_dir = config.OUTPUT_DIR_MENU_SCRAPER # Used by CLI mode
         self.max_retries = config.MAX_RETRIES
@@ -52,65 +186,19 @@ class VendorMenuFastScraper:
         self.default_params = config.REQUEST_PARAMS.copy()
         self.headers = config.REQUEST_HEADERS
         self.vendor_code = vendor_code.strip() # Ensure no leading/trailing whitespace
+        self.timeout = config.REQUEST_TIMEOUT
+        self.cache = get_response_cache() if use_cache else None # None when caching is disabled
 
         self.output_dir.mkdir(parents=True, exist_ok=True) # Ensure output dir exists
         self.logger = configure_logging() # Use the shared logger configuration
         self.last_error_message = None
+        self.last_error_kind = None # Machine-readable failure class for the crawl journal, e.g. 'not_found', 'timeout'
 
-    def fetch_vendor_json(self, code: str) -> dict | None:
-        """Fetches the raw JSON data for the vendor from the API."""
-        self.last_error_message = None
-        params = self.default_params.copy()
-        params["vendorCode"] = code
-        request_url = f"{self.base_url}?{'&'.join([f'{k}={v}' for k, v in params.items()])}"
-        self.logger.debug(f"Requesting URL: {request_url}")
-
-        for attempt in range(1, self.max_retries + 1):
-            try:
-                if not isinstance(self.headers, dict) or 'User-Agent' not in self.headers:
-                    self.logger.error("Request headers are not configured correctly in config.py.")
-                    self.last_error_message = "Request headers misconfiguration."
-                    return None
-
-                resp = requests.get(self.base_url, params=params, headers=self.headers, timeout=20)
-                resp.raise_for_status()
-                return resp.json()
-
-            except requests.HTTPError as e:
-                status = resp.status_code if hasattr(resp, 'status_code') else 'Unknown'
-                self.last_error_message = f"HTTPError for {code} (Status: {status}) on attempt {attempt}: {e}"
-                if status in (400, 404, "400", "404"): # API might return status as string
-                    self.logger.warning(f"Vendor {code} invalid or not found (HTTP {status}), skipping.")
-                    return None 
-                self.logger.error(self.last_error_message)
-            except requests.exceptions.Timeout:
-                 self.last_error_message = f"Timeout error for {code} on attempt {attempt}."
-                 self.logger.warning(self.last_error_message + " Retrying...")
-            except requests.RequestException as e:
-                self.last_error_message = f"Network error for {code} on attempt {attempt}: {e}"
-                self.logger.error(self.last_error_message)
-            except json.JSONDecodeError as e:
-                 self.last_error_message = f"Failed to decode JSON response for {code} on attempt {attempt}: {e}"
-                 self.logger.error(self.last_error_message)
-                 self.logger.debug(f"Response text was: {getattr(resp, 'text', 'N/A')}")
-                 return None
-            except Exception as e:
-                self.last_error_message = f"Unexpected error during fetch for {code} on attempt {attempt}: {e}"
-                self.logger.error(self.last_error_message, exc_info=True)
-
-            if attempt < self.max_retries:
-                time.sleep(attempt * 1.5)
-
-        self.logger.error(f"Failed to fetch data for {code} after {self.max_retries} attempts.")
-        if not self.last_error_message:
-             self.last_error_message = f"Failed to fetch data for {code} after multiple retries and no specific error captured."
-        return None
-
-    def parse_menu_items(self, data: dict, vendor_code: str) -> list[dict]:
-        if not data or "data" not in data or not isinstance(data["data"], dict):
-            self.logger.warning(f"Malformed or empty 'data' section for vendor {vendor_code}.")
-            return []
-        vendor_section = data["data"].get("vendor", {}) # Default to empty dict
+    def parse_vendor_info(self, data: dict, vendor_code: str) -> dict:
+        """Builds the vendor-level columns shared by every menu row."""
+        vendor_section = (data.get("data") or {}).get("vendor", {}) if isinstance(data, dict) else {}
+        if not isinstance(vendor_section, dict):
+            vendor_section = {}
         business_line_map = {
             'RESTAURANT': 'Restaurant', 'CAFFE': 'Cafe', 'CONFECTIONERY': 'Pastry',
             'BAKERY': 'Bakery', 'GROCERY': 'Fruit Shop', 'SUPERMARKET': 'Supermarket',
@@ -140,8 +228,22 @@ class VendorMenuFastScraper:
             "is_pro":              bool(vendor_section.get("isPro", False)),
             "is_economical":       bool(vendor_section.get("isEconomical", False))
         }
+        return vendor_info
+
+    @metrics.instrumented("parse_menu", "sf")
+    def parse_menu(self, data: dict, vendor_code: str, vendor_info: dict | None = None) -> "ScrapeResult":
+        """Parses the menu into a ScrapeResult: vendor_info once plus item-only rows."""
+        if vendor_info is None:
+            vendor_info = self.parse_vendor_info(data, vendor_code)
         items = []
+        if not data or "data" not in data or not isinstance(data["data"], dict):
+            self.logger.warning(f"Malformed or empty 'data' section for vendor {vendor_code}.")
+            return ScrapeResult(vendor_code, vendor_info, items)
         BANNED_CATEGORY_NAMES = ["آبکیجات", "مواد اولیه", "سایر"] # Define your banned list
+        group_memo = {} # Topping group -> (ID, JSON text), shared by every product of this vendor
+        topping_groups = {} # Group ID -> JSON text, each distinct group once
+        inline_memo = {} # (group_index, group ID) -> inline JSON text with group_index
+        topping_refs = [] # Group IDs per item, parallel to items
         menus_data = data["data"].get("menus", [])
         if not isinstance(menus_data, list):
             self.logger.warning(f"Menus data section is not a list for {vendor_code}.")
@@ -158,49 +260,181 @@ class VendorMenuFastScraper:
             if not isinstance(products_data, list):
                 self.logger.debug(f"Products data for category '{cname}' is not a list for vendor {vendor_code}")
                 continue
+            category_id = cat.get("categoryId")
             for prod_idx, p in enumerate(products_data):
                 if not isinstance(p, dict):
                     self.logger.debug(f"Skipping malformed product at index {prod_idx} in '{cname}' for vendor {vendor_code}")
                     continue
-                toppings_structure = []
+                group_texts, group_ids = [], []
                 product_toppings_data = p.get("productToppings", [])
                 if isinstance(product_toppings_data, list):
                     for grp_idx, grp in enumerate(product_toppings_data):
                         if not isinstance(grp, dict):
                             self.logger.debug(f"Skipping malformed topping group {grp_idx} for product ID {p.get('id', 'N/A')}")
                             continue
-                        toppings_list = []
-                        inner_toppings = grp.get("toppings", [])
-                        if isinstance(inner_toppings, list):
-                             for t_idx, t_data in enumerate(inner_toppings): # Renamed t to t_data
-                                if isinstance(t_data, dict):
-                                    toppings_list.append({
-                                        "id": t_data.get("id"), "title": t_data.get("title", ""),
-                                        "description": t_data.get("description", ""), "price": t_data.get("price", 0)
-                                    })
-                                else:
-                                     self.logger.debug(f"Skipping malformed topping {t_idx} in group {grp.get('id', 'N/A')}")
-                        toppings_structure.append({
-                            "group_index": grp_idx, "id": grp.get("id"), "title": grp.get("title", ""),
-                            "maxCount": grp.get("maxCount", 1), "minCount": grp.get("minCount", 0),
-                            "toppings": toppings_list
-                        })
+                        group_id, body = _topping_group(grp, group_memo)
+                        topping_groups[group_id] = body
+                        text = inline_memo.get((grp_idx, group_id))
+                        if text is None:
+                            text = inline_memo[(grp_idx, group_id)] = '{"group_index":%d,%s' % (grp_idx, body[1:])
+                        group_texts.append(text)
+                        group_ids.append(group_id)
                 elif product_toppings_data is not None:
                     self.logger.debug(f"productToppings for item ID {p.get('id')} is not a list: {type(product_toppings_data)}")
-                row = {
-                    **vendor_info,
-                    "category_id":      cat.get("categoryId"), "category_name":    cname,
+                # Item columns only; vendor columns live once in vendor_info (keys follow config.MENU_ITEM_COLS)
+                items.append({
+                    "category_id":      category_id, "category_name":    cname,
                     "item_id":          p.get("id"), "item_title":       p.get("title", ""),
                     "product_title":    p.get("productTitle", ""),
                     "item_variation":   p.get("productVariationTitle", ""),
                     "description":      p.get("description", ""), "price": p.get("price", 0),
                     "rating":           p.get("rating", 0),
-                    "product_toppings": json.dumps(toppings_structure, ensure_ascii=False, indent=None, separators=(',', ':')),
-                }
-                items.append(row)
-        return items
+                    "product_toppings": "[" + ",".join(group_texts) + "]",
+                })
+                topping_refs.append(tuple(group_ids))
+        return ScrapeResult(vendor_code, vendor_info, items, topping_groups, topping_refs)
 
-    def run(self, return_content_as_string=False) -> Path | str | None:
+    def parse_menu_items(self, data: dict, vendor_code: str, vendor_info: dict | None = None) -> list[dict]:
+        """Returns full rows (vendor + item columns) as dicts; prefer parse_menu on hot paths."""
+        return self.parse_menu(data, vendor_code, vendor_info).items
+
+    def _checked_result(self, result: "ScrapeResult") -> "ScrapeResult | None":
+        """The parsed result, or None (with last_error_message set) when it has no items."""
+        if not result:
+            msg = f"No menu items found/parsed for {self.vendor_code}."
+            self.logger.warning(msg)
+            if not self.last_error_message: self.last_error_message = msg
+            return None
+        metrics.MENU_ITEMS.observe(len(result), platform="sf")
+        self.logger.info(f"Parsed {len(result)} menu items for {self.vendor_code}.")
+        return result
+
+
+class VendorMenuFastScraper(VendorMenuParser):
+    """Scrapes menu data for a single Snappfood vendor."""
+
+    def __init__(self, vendor_code: str, session: requests.Session | None = None, use_cache: bool = True,
+                 sinks: list | None = None):
+        """Initializes the scraper with vendor code and configuration.
+
+        sinks are menu_sinks.MenuSink outputs that run() also feeds; the caller closes them.
+        """
+        self._configure(vendor_code, use_cache)
+        self.session = session or get_http_session() # Shared pooled session unless one is injected
+        self.sinks = list(sinks or [])
+
+    def fetch_vendor_json(self, code: str) -> dict | None:
+        """Fetches the raw JSON data for the vendor from the API."""
+        self.last_error_message = None
+        self.last_error_kind = None
+        params = self.default_params.copy()
+        params["vendorCode"] = code
+        request_url = f"{self.base_url}?{'&'.join([f'{k}={v}' for k, v in params.items()])}"
+        self.logger.debug(f"Requesting URL: {request_url}")
+
+        if not isinstance(self.headers, dict) or 'User-Agent' not in self.headers:
+            self.logger.error("Request headers are not configured correctly in config.py.")
+            self.last_error_message = "Request headers misconfiguration."
+            self.last_error_kind = "config_error"
+            return None
+
+        # Fresh cache hits skip both the network and the JSON decode
+        cached = self.cache.get(code) if self.cache else None
+        request_headers = self.headers
+        if cached is not None:
+            if cached.is_fresh(self.cache.ttl):
+                self.cache.record_hit()
+                metrics.CACHE_EVENTS.inc(result="hit")
+                self.logger.debug(f"Cache hit for vendor {code}.")
+                return cached.data
+            request_headers = {**self.headers, **cached.conditional_headers()}
+
+        # Retries with backoff for connection errors, timeouts and RETRY_STATUS_CODES
+        # happen inside the session's urllib3 adapter; this is a single logical call.
+        resp = None
+        try:
+            resp = self._upstream_get(params, request_headers)
+            if resp.status_code == 304 and cached is not None:
+                self.cache.mark_revalidated(code, cached)
+                metrics.CACHE_EVENTS.inc(result="revalidated")
+                self.logger.debug(f"Vendor {code} not modified upstream, reusing cached payload.")
+                return cached.data
+            resp.raise_for_status()
+            with metrics.timed("json_decode", "sf"):
+                data = decode_json(resp.content)
+            if self.cache:
+                self.cache.record_miss()
+                metrics.CACHE_EVENTS.inc(result="miss")
+                self.cache.put(code, data, resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+            return data
+
+        except requests.HTTPError as e:
+            status = resp.status_code if hasattr(resp, 'status_code') else 'Unknown'
+            self.last_error_message = f"HTTPError for {code} (Status: {status}): {e}"
+            self.last_error_kind = "http_error"
+            if status in (400, 404, "400", "404"): # API might return status as string
+                self.last_error_kind = "not_found"
+                self.logger.warning(f"Vendor {code} invalid or not found (HTTP {status}), skipping.")
+                return None
+            self.logger.error(self.last_error_message)
+        except json.JSONDecodeError as e: # requests' JSONDecodeError is also a RequestException, so catch it first
+            self.last_error_message = f"Failed to decode JSON response for {code}: {e}"
+            self.last_error_kind = "decode_error"
+            self.logger.error(self.last_error_message)
+            self.logger.debug(f"Response text was: {getattr(resp, 'text', 'N/A')}")
+            return None
+        except requests.exceptions.Timeout:
+            self.last_error_message = f"Timeout error for {code} after {self.max_retries} attempts."
+            self.last_error_kind = "timeout"
+            self.logger.warning(self.last_error_message)
+        except requests.RequestException as e:
+            self.last_error_message = f"Network error for {code}: {e}"
+            self.last_error_kind = "timeout" if is_timeout_error(e) else "network_error"
+            self.logger.error(self.last_error_message)
+        except UpstreamUnavailable as e:
+            self.last_error_message = f"Skipped {code}: {e}"
+            self.last_error_kind = "circuit_open"
+            self.logger.warning(self.last_error_message)
+            return None
+        except Exception as e:
+            self.last_error_message = f"Unexpected error during fetch for {code}: {e}"
+            self.last_error_kind = "unexpected_error"
+            self.logger.error(self.last_error_message, exc_info=True)
+
+        self.logger.error(f"Failed to fetch data for {code} after {self.max_retries} attempts.")
+        if not self.last_error_message:
+             self.last_error_message = f"Failed to fetch data for {code} after multiple retries and no specific error captured."
+        self.last_error_kind = self.last_error_kind or "unexpected_error"
+        return None
+
+    def _upstream_get(self, params: dict, headers: dict) -> requests.Response:
+        """One logical API call (urllib3 retries included), timed by final status or error class.
+
+        Waits for the upstream guard first and reports the final attempt to it
+        (CountingRetry reports the retried ones); raises UpstreamUnavailable
+        while the circuit is open.
+        """
+        guard = get_upstream_guard()
+        _upstream_attempt.probe = guard.acquire()
+        started = time.perf_counter()
+        status = "error"
+        try:
+            resp = self.session.get(self.base_url, params=params, headers=headers, timeout=self.timeout)
+            status = str(resp.status_code)
+            guard.record(resp.status_code, probe=_upstream_attempt.probe)
+            return resp
+        except UpstreamUnavailable: # The circuit opened between retries; those attempts are already recorded
+            status = "circuit_open"
+            raise
+        except Exception as e:
+            status = type(e).__name__
+            guard.record(timed_out=is_timeout_error(e), probe=_upstream_attempt.probe)
+            raise
+        finally:
+            metrics.UPSTREAM_SECONDS.observe(time.perf_counter() - started, status=status)
+
+    def scrape(self) -> "ScrapeResult | None":
+        """Fetches and parses the vendor. Returns a ScrapeResult, or None (see last_error_message)."""
         self.logger.info(f"Starting scrape for vendor: {self.vendor_code}")
         self.last_error_message = None
 
@@ -210,41 +444,49 @@ class VendorMenuFastScraper:
             return None
 
         self.logger.info(f"Parsing menu items for {self.vendor_code}")
-        items = self.parse_menu_items(data, self.vendor_code)
-        if not items:
-            msg = f"No menu items found/parsed for {self.vendor_code}."
-            self.logger.warning(msg)
-            if not self.last_error_message: self.last_error_message = msg
+        return self._checked_result(self.parse_menu(data, self.vendor_code))
+
+    def run(self, return_content_as_string=False) -> Path | str | None:
+        result = self.scrape()
+        if result is None:
             return None
 
-        self.logger.info(f"Parsed {len(items)} menu items for {self.vendor_code}.")
-        timestamp = pd.Timestamp.now().strftime("%Y%m%d_%H%M%S")
+        store = get_menu_store()
+        snapshot = None
+        if store is not None:
+            try:
+                snapshot = store.record(result)
+                self.logger.info(f"Menu snapshot #{snapshot['snapshot_id']} for {self.vendor_code}: "
+                                 f"{snapshot['added']} added, {snapshot['removed']} removed, "
+                                 f"{snapshot['price_changed']} price changes, {snapshot['modified']} modified.")
+            except Exception as e: # The snapshot history is secondary to producing the CSV
+                self.logger.error(f"Could not record menu snapshot for {self.vendor_code}: {e}", exc_info=True)
+        for sink in self.sinks:
+            try:
+                sink.write(result)
+            except Exception as e: # So are the analytics sinks
+                self.logger.error(f"Could not write {self.vendor_code} to {type(sink).__name__}: {e}", exc_info=True)
+
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
         safe_vendor_code = ''.join(filter(str.isalnum, self.vendor_code))
         out_filename = f"vendor_menu_{safe_vendor_code}_{timestamp}.csv"
-        
-        try:
-            if not items: # Should be caught, but defensive.
-                 self.last_error_message = "CSV Error: 'items' list is empty."
-                 self.logger.error(self.last_error_message)
-                 return None
-            keys = items[0].keys()
 
+        try:
             if return_content_as_string:
-                string_io = io.StringIO()
-                writer = csv.DictWriter(string_io, fieldnames=keys, quoting=csv.QUOTE_MINIMAL)
-                writer.writeheader()
-                writer.writerows(items)
-                csv_content = '\ufeff' + string_io.getvalue()
-                string_io.close()
+                csv_content = result.to_csv_string()
                 self.logger.info(f"✅ CSV content generated in memory for {self.vendor_code}.")
                 return csv_content
             else: # Write to file (CLI mode)
+                if snapshot is not None and not snapshot["created"]:
+                    previous_csv = store.snapshot_csv(snapshot["snapshot_id"])
+                    if previous_csv is not None and previous_csv.is_file():
+                        self.logger.info(f"✅ Menu unchanged since last run; reusing {previous_csv.resolve()}")
+                        return previous_csv
                 out_path = self.output_dir / out_filename
-                self.logger.info(f"Writing {len(items)} items to CSV: {out_path}")
-                with open(out_path, "w", newline="", encoding="utf-8-sig") as f:
-                    writer = csv.DictWriter(f, fieldnames=keys, quoting=csv.QUOTE_MINIMAL)
-                    writer.writeheader()
-                    writer.writerows(items)
+                self.logger.info(f"Writing {len(result)} items to CSV: {out_path}")
+                result.write_csv(out_path)
+                if snapshot is not None:
+                    store.attach_csv(snapshot["snapshot_id"], out_path)
                 self.logger.info(f"✅ Successfully wrote CSV to {out_path.resolve()}")
                 return out_path
         except Exception as e: # Catch more general errors during CSV generation/writing
@@ -252,6 +494,187 @@ class VendorMenuFastScraper:
             self.logger.error(self.last_error_message, exc_info=True)
             return None
 
+
+class ScrapeResult:
+    """Structured output of one vendor scrape.
+
+    vendor_info is the dict built by parse_vendor_info and item_rows hold only
+    the per-item columns, so vendor columns are stored once rather than copied
+    into every row. Full rows and the CSV form are only built when asked for.
+
+    topping_groups holds each distinct topping group once (content-hash ID ->
+    JSON text) and topping_refs the group IDs of each item; with toppings=
+    TOPPINGS_CATALOG the product_toppings column carries those IDs instead of
+    the full groups.
+    """
+
+    def __init__(self, vendor_code: str, vendor_info: dict, item_rows: list[dict],
+                 topping_groups: dict[str, str] | None = None, topping_refs: list[tuple] | None = None):
+        self.vendor_code = vendor_code
+        self.vendor_info = vendor_info
+        self.item_rows = item_rows
+        self.topping_groups = topping_groups or {}
+        self.topping_refs = topping_refs # None: group IDs not tracked, catalog mode falls back to inline
+        self._items = None
+        self._topping_catalog = None
+        self._csv_content = {} # Toppings mode -> CSV text
+        self._csv_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.item_rows)
+
+    @property
+    def items(self) -> list[dict]:
+        """Full rows (vendor + item columns), materialized on first use."""
+        if self._items is None:
+            self._items = [{**self.vendor_info, **item} for item in self.item_rows]
+        return self._items
+
+    @property
+    def fieldnames(self) -> list[str]:
+        # Same order as {**vendor_info, **item}: item columns that are also vendor columns (rating) keep the vendor slot
+        if not self.item_rows:
+            return list(self.vendor_info.keys())
+        return list(self.vendor_info.keys()) + [col for col in self.item_rows[0] if col not in self.vendor_info]
+
+    def topping_catalog(self) -> dict:
+        """{group ID: group object} for every distinct topping group, decoded on first use."""
+        if self._topping_catalog is None:
+            self._topping_catalog = {group_id: json.loads(body) for group_id, body in self.topping_groups.items()}
+        return self._topping_catalog
+
+    def _topping_ref_texts(self) -> list[str]:
+        """product_toppings for catalog mode: a JSON list of group IDs per item."""
+        memo = {}
+        texts = []
+        for refs in self.topping_refs:
+            text = memo.get(refs)
+            if text is None:
+                text = memo[refs] = json.dumps(list(refs), separators=(',', ':'))
+            texts.append(text)
+        return texts
+
+    def iter_values(self, fieldnames: list[str] | None = None, toppings: str = TOPPINGS_INLINE):
+        """Yields each row as a list of values in fieldnames order (missing columns are None)."""
+        fieldnames = fieldnames or self.fieldnames
+        item_keys = self.item_rows[0].keys() if self.item_rows else ()
+        template = [self.vendor_info.get(col) for col in fieldnames]
+        item_slots = [(pos, col) for pos, col in enumerate(fieldnames) if col in item_keys]
+        ref_texts = None
+        if toppings == TOPPINGS_CATALOG and self.topping_refs is not None and "product_toppings" in fieldnames:
+            ref_pos = fieldnames.index("product_toppings")
+            item_slots = [(pos, col) for pos, col in item_slots if pos != ref_pos]
+            ref_texts = self._topping_ref_texts()
+        for idx, item in enumerate(self.item_rows):
+            values = template.copy()
+            for pos, col in item_slots:
+                values[pos] = item.get(col)
+            if ref_texts is not None:
+                values[ref_pos] = ref_texts[idx]
+            yield values
+
+    def _write_rows(self, f, toppings: str = TOPPINGS_INLINE):
+        fieldnames = self.fieldnames
+        writer = csv.writer(f, quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(fieldnames)
+        writer.writerows(self.iter_values(fieldnames, toppings))
+
+    def to_csv_string(self, toppings: str = TOPPINGS_INLINE) -> str:
+        """Returns the BOM-prefixed CSV for the rows, rendering it on first use (per toppings mode)."""
+        with self._csv_lock:
+            content = self._csv_content.get(toppings)
+            if content is None:
+                with metrics.timed("csv_render", "sf"):
+                    string_io = io.StringIO()
+                    self._write_rows(string_io, toppings)
+                    content = self._csv_content[toppings] = '\ufeff' + string_io.getvalue()
+                    string_io.close()
+            return content
+
+    def write_csv(self, out_path: Path, toppings: str = TOPPINGS_INLINE):
+        with open(out_path, "w", newline="", encoding="utf-8-sig") as f:
+            self._write_rows(f, toppings)
+
+# --- Parse micro-benchmark ---
+def _synthetic_vendor_payload(n_products: int = 5000, n_categories: int = 40, seed: int = 7) -> dict:
+    """A supermarket-sized vendor payload: many products sharing a handful of topping groups."""
+    import random
+    rng = random.Random(seed)
+    groups = [{"id": 9000 + g, "title": f"گروه افزودنی {g}", "maxCount": 3, "minCount": 0,
+               "toppings": [{"id": 90000 + g * 100 + t, "title": f"افزودنی {t}", "description": "توضیح کوتاه",
+                             "price": 5000 * (t + 1)} for t in range(12)]} for g in range(8)]
+    per_category = max(1, n_products // n_categories)
+    menus = [{"categoryId": 100 + c, "category": f"دسته {c}", "products": [
+        {"id": c * 100000 + i, "title": f"محصول {c}-{i}", "productTitle": f"محصول {c}-{i}",
+         "productVariationTitle": "", "description": "توضیحات محصول " * 4, "price": rng.randrange(10000, 900000, 500),
+         "rating": round(rng.uniform(3, 5), 1), "productToppings": rng.sample(groups, rng.randint(0, 4))}
+        for i in range(per_category)]} for c in range(n_categories)]
+    return {"data": {"vendor": {"id": 1234, "title": "سوپرمارکت نمونه", "superTypeAlias": "SUPERMARKET",
+                                "area": "ونک", "rating": 4.3, "commentCount": 1200}, "menus": menus}}
+
+
+def _reference_csv(scraper: "VendorMenuFastScraper", body: bytes, vendor_code: str) -> str:
+    """The pre-optimization path: stdlib decode, a full row dict and a toppings json.dumps per product."""
+    data = json.loads(body)
+    vendor_info = scraper.parse_vendor_info(data, vendor_code)
+    rows = []
+    for cat in data["data"]["menus"]:
+        for p in cat["products"]:
+            toppings = [{"group_index": gi, "id": g.get("id"), "title": g.get("title", ""), "maxCount": g.get("maxCount", 1),
+                         "minCount": g.get("minCount", 0), "toppings": [
+                             {"id": t.get("id"), "title": t.get("title", ""), "description": t.get("description", ""),
+                              "price": t.get("price", 0)} for t in g.get("toppings", [])]}
+                        for gi, g in enumerate(p.get("productToppings", []))]
+            rows.append({**vendor_info, "category_id": cat.get("categoryId"), "category_name": cat.get("category"),
+                         "item_id": p.get("id"), "item_title": p.get("title", ""), "product_title": p.get("productTitle", ""),
+                         "item_variation": p.get("productVariationTitle", ""), "description": p.get("description", ""),
+                         "price": p.get("price", 0), "rating": p.get("rating", 0),
+                         "product_toppings": json.dumps(toppings, ensure_ascii=False, indent=None, separators=(',', ':'))})
+    string_io = io.StringIO()
+    writer = csv.DictWriter(string_io, fieldnames=list(rows[0].keys()), quoting=csv.QUOTE_MINIMAL)
+    writer.writeheader()
+    writer.writerows(rows)
+    return '\ufeff' + string_io.getvalue()
+
+
+def benchmark_parse(fixture_path: Path | None = None, n_products: int = 5000, repeat: int = 5) -> dict:
+    """Times decode + parse + CSV render of one large vendor payload, old path vs current.
+
+    fixture_path is a saved vendor JSON response (e.g. curl of the details endpoint);
+    without it a synthetic supermarket-sized payload is used.
+    """
+    if fixture_path:
+        body = Path(fixture_path).read_bytes()
+    else:
+        body = json.dumps(_synthetic_vendor_payload(n_products), ensure_ascii=False).encode("utf-8")
+    vendor_code = "bench"
+    scraper = VendorMenuFastScraper(vendor_code, session=requests.Session(), use_cache=False)
+    scraper.logger.setLevel(logging.WARNING)
+
+    def current():
+        return scraper.parse_menu(decode_json(body), vendor_code).to_csv_string()
+
+    def best_of(fn):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            output = fn()
+            timings.append(time.perf_counter() - started)
+        return min(timings), output
+
+    reference_sec, reference_csv = best_of(lambda: _reference_csv(scraper, body, vendor_code))
+    current_sec, current_csv = best_of(current)
+    return {
+        "payload_mb": round(len(body) / 1e6, 2),
+        "items": len(scraper.parse_menu(decode_json(body), vendor_code)),
+        "json_backend": "orjson" if orjson is not None and config.SF_JSON_BACKEND != "json" else "json",
+        "reference_ms": round(reference_sec * 1000, 1),
+        "current_ms": round(current_sec * 1000, 1),
+        "speedup": round(reference_sec / current_sec, 2) if current_sec else None,
+        "identical_csv": reference_csv == current_csv,
+    }
+
+
 def open_file_or_directory(path_str: str):
     path = Path(path_str).resolve()
     logger = configure_logging() # Get main logger instance
@@ -271,6 +694,16 @@ def open_file_or_directory(path_str: str):
 if __name__ == "__main__":
     cli_logger = configure_logging() # Ensure logger is set up for CLI use
 
+    # Bulk mode: `python vendor_scrape.py --bulk [bulk_crawl options]` crawls every sf_code in matched_vendors.csv
+    if len(sys.argv) > 1 and sys.argv[1] == "--bulk":
+        from bulk_crawl import main as bulk_main
+        sys.exit(bulk_main(sys.argv[2:]))
+
+    # Parse benchmark: `python vendor_scrape.py --bench-parse [fixture.json]`
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench-parse":
+        print(json.dumps(benchmark_parse(sys.argv[2] if len(sys.argv) > 2 else None), indent=2))
+        sys.exit(0)
+
     vendor_code_input = input("Enter Snappfood vendor_code (e.g., 442rr5): ").strip()
     if not vendor_code_input:
         cli_logger.error("No vendor_code entered. Exiting.")
@@ -284,8 +717,12 @@ if __name__ == "__main__":
     print(f"\n▶︎ Snappfood vendor page (for reference): {page_url}\n")
 
     cli_logger.info(f"Initializing scraper for Snappfood vendor: {sf_code_to_use}")
-    scraper = VendorMenuFastScraper(vendor_code=sf_code_to_use)
+    from menu_sinks import build_sinks
+    sinks = build_sinks(config.MENU_SINKS) # MENU_SINKS=parquet,sqlite also writes the analytics outputs
+    scraper = VendorMenuFastScraper(vendor_code=sf_code_to_use, sinks=sinks)
     scraped_csv_path = scraper.run() # Returns Path object or None
+    for sink in sinks:
+        sink.close()
 
     if scraped_csv_path:
         cli_logger.info(f"Scraping complete. CSV saved at: {scraped_csv_path}")
@@ -0,0 +1,131 @@
+# vendor_search.py
+import bisect
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from persian_text import normalize_persian, normalize_persian_text
+
+FILTER_FIELDS = ("city_id", "marketing_area", "business_line")
+ENTRY_FIELDS = ("sf_code", "sf_name", "tf_code", "tf_name") + FILTER_FIELDS
+
+MIN_TRIGRAM_SCORE = 0.25  # Dice coefficient below which trigram-only hits are dropped
+
+
+def _trigrams(text: str) -> set[str]:
+    padded = f" {text} " # Pad so word starts/ends get their own trigrams and short names still index
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class VendorSearchIndex:
+    """In-memory typeahead index over matched vendor names and codes.
+
+    sf_name / tf_name are normalized (persian_text) and indexed as trigram
+    postings for fuzzy matches and as sorted word / full-name lists for prefix
+    matches (a bisect range each); codes are looked up exactly or by prefix.
+    Scores live in one numpy array per query, filters are boolean masks, so a
+    query costs a few vector ops over the entries instead of a DataFrame scan.
+    """
+
+    def __init__(self, df: pd.DataFrame | None = None):
+        self.entries = []
+        self._gram_counts = np.zeros(0)       # Distinct trigrams per entry (Dice denominator)
+        self._postings = {}                   # trigram -> entry ids
+        self._word_keys, self._word_ids = [], np.zeros(0, dtype=np.int32) # Sorted name words and codes
+        self._name_keys, self._name_ids = [], np.zeros(0, dtype=np.int32) # Sorted full normalized names
+        self._codes = {}
+        self._filters = {field: {} for field in FILTER_FIELDS} # field -> normalized value -> entry ids
+        if df is not None and not df.empty:
+            self._build(df)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _build(self, df: pd.DataFrame):
+        columns = {field: (df[field].fillna("").astype(str).str.strip() if field in df.columns
+                           else pd.Series("", index=df.index)) for field in ENTRY_FIELDS}
+        sf_norm = normalize_persian(columns["sf_name"]).tolist()
+        tf_norm = normalize_persian(columns["tf_name"]).tolist()
+        filter_norm = {field: normalize_persian(columns[field]).tolist() for field in FILTER_FIELDS}
+        postings, codes, gram_counts, words, names = defaultdict(list), defaultdict(list), [], [], []
+        filters = {field: defaultdict(list) for field in FILTER_FIELDS}
+        for entry_id, values in enumerate(zip(*(columns[field].tolist() for field in ENTRY_FIELDS))):
+            entry = dict(zip(ENTRY_FIELDS, values))
+            self.entries.append(entry)
+            entry_names = {name for name in (sf_norm[entry_id], tf_norm[entry_id]) if name}
+            grams = set().union(*(_trigrams(name) for name in entry_names))
+            gram_counts.append(len(grams))
+            for gram in grams:
+                postings[gram].append(entry_id)
+            entry_words = {word for name in entry_names for word in name.split()}
+            for code in (entry["sf_code"], entry["tf_code"]):
+                if code:
+                    codes[code.lower()].append(entry_id)
+                    entry_words.add(code.lower())
+            words.extend((word, entry_id) for word in entry_words)
+            names.extend((name, entry_id) for name in entry_names)
+            for field in FILTER_FIELDS:
+                if filter_norm[field][entry_id]:
+                    filters[field][filter_norm[field][entry_id]].append(entry_id)
+
+        as_ids = lambda ids: np.asarray(ids, dtype=np.int32)
+        self._gram_counts = np.asarray(gram_counts, dtype=np.float64)
+        self._postings = {gram: as_ids(ids) for gram, ids in postings.items()}
+        self._codes = {code: as_ids(ids) for code, ids in codes.items()}
+        self._filters = {field: {value: as_ids(ids) for value, ids in values.items()} for field, values in filters.items()}
+        words.sort()
+        names.sort()
+        self._word_keys, self._word_ids = [word for word, _ in words], as_ids([i for _, i in words])
+        self._name_keys, self._name_ids = [name for name, _ in names], as_ids([i for _, i in names])
+
+    @staticmethod
+    def _prefix_ids(keys: list[str], ids: np.ndarray, prefix: str) -> np.ndarray:
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + "\U0010ffff", start)
+        return ids[start:end]
+
+    def _allowed_mask(self, filters: dict) -> np.ndarray | None:
+        """Boolean mask of entries passing every given filter, or None when no filter is set."""
+        mask = None
+        for field in FILTER_FIELDS:
+            value = normalize_persian_text(str(filters.get(field) or ""))
+            if not value:
+                continue
+            field_mask = np.zeros(len(self.entries), dtype=bool)
+            field_mask[self._filters[field].get(value, [])] = True
+            mask = field_mask if mask is None else mask & field_mask
+        return mask
+
+    def search(self, query: str, limit: int = 10, **filters) -> list[dict]:
+        """Top-`limit` entries for query, best first, each with a "score".
+
+        Exact code hits rank first, then names starting with the query, then
+        names with a word starting with the last query word, then trigram
+        (Dice) similarity. filters: city_id / marketing_area / business_line
+        (normalized equality).
+        """
+        normalized = normalize_persian_text(query)
+        if not normalized or limit <= 0 or not self.entries:
+            return []
+        scores = np.zeros(len(self.entries))
+        scores[self._codes.get(query.strip().lower(), [])] += 3.0
+        scores[self._prefix_ids(self._name_keys, self._name_ids, normalized)] += 1.0
+        # Typeahead: the last word is usually incomplete, so treat it as a prefix
+        scores[self._prefix_ids(self._word_keys, self._word_ids, normalized.split()[-1])] += 0.5
+
+        query_grams = _trigrams(normalized)
+        hits = [self._postings[gram] for gram in query_grams if gram in self._postings]
+        if hits:
+            shared = np.bincount(np.concatenate(hits), minlength=len(self.entries))
+            dice = 2 * shared / (len(query_grams) + self._gram_counts)
+            scores += np.where((dice >= MIN_TRIGRAM_SCORE) | (scores > 0), dice, 0.0)
+
+        allowed = self._allowed_mask(filters)
+        if allowed is not None:
+            scores[~allowed] = 0.0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))] # Score desc, then file order
+        return [{**self.entries[entry_id], "score": round(float(scores[entry_id]), 3)} for entry_id in candidates]